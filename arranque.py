@@ -0,0 +1,54 @@
+import json
+import os
+import subprocess
+import sys
+
+# Presupuesto de arranque en frío: lo que paga cada worker de gunicorn y cada comando al importar
+# la app y crearla. Se mide en un intérprete nuevo para no contar módulos ya cargados.
+ARRANQUE_REPETICIONES = 3
+ARRANQUE_LENTOS = 10
+# Se inicializan con su primer uso; si aparecen al arrancar es que alguien los importó de nuevo arriba
+MODULOS_DIFERIDOS = ("flask_mail", "flask_bcrypt", "flask_migrate", "alembic", "flask_script", "PIL", "openpyxl")
+
+_SCRIPT = """
+import json, sys, time
+inicio = time.perf_counter()
+from app import create_app
+importado = time.perf_counter()
+create_app()
+creado = time.perf_counter()
+print(json.dumps({"importar": importado - inicio, "crear": creado - importado,
+                  "cargados": [modulo for modulo in %r if modulo in sys.modules]}))
+"""
+
+
+def _modulos_lentos(importtime):
+    # Líneas de -X importtime: "import time: self [us] | cumulative | imported package". Se agrupan
+    # por paquete raíz (sqlalchemy, flask, models...) con el mayor tiempo acumulado de cada uno.
+    paquetes = {}
+    for linea in importtime.splitlines():
+        partes = linea.split("|")
+        if len(partes) != 3:
+            continue
+        try:
+            acumulado = int(partes[1]) / 1e6
+        except ValueError:
+            continue
+        raiz = partes[2].strip().split(".")[0]
+        if raiz != "app":
+            paquetes[raiz] = max(paquetes.get(raiz, 0), acumulado)
+    return sorted(paquetes.items(), key=lambda paquete: paquete[1], reverse=True)[:ARRANQUE_LENTOS]
+
+
+def medir_arranque(repeticiones=ARRANQUE_REPETICIONES):
+    # Devuelve la mejor de varias mediciones, con los módulos que más tardan en importarse
+    carpeta = os.path.dirname(os.path.abspath(__file__))
+    mejor = None
+    for _ in range(repeticiones):
+        proceso = subprocess.run([sys.executable, "-X", "importtime", "-c", _SCRIPT % (MODULOS_DIFERIDOS,)],
+                                 cwd=carpeta, capture_output=True, text=True, check=True)
+        medicion = json.loads(proceso.stdout.strip().splitlines()[-1])
+        if mejor is None or medicion["importar"] + medicion["crear"] < mejor["importar"] + mejor["crear"]:
+            medicion["lentos"] = _modulos_lentos(proceso.stderr)
+            mejor = medicion
+    return mejor
@@ -0,0 +1,43 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRU:
+    # Caché en memoria del proceso, acotada a 'maximo' elementos y opcionalmente con vencimiento en segundos
+    def __init__(self, maximo, ttl=None):
+        self.maximo = maximo
+        self.ttl = ttl
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, llave, defecto=None):
+        with self._lock:
+            elemento = self._datos.get(llave)
+            if elemento is None:
+                return defecto
+            valor, vence = elemento
+            if vence is not None and vence < time.monotonic():
+                del self._datos[llave]
+                return defecto
+            self._datos.move_to_end(llave)
+            return valor
+
+    def put(self, llave, valor):
+        vence = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._datos[llave] = (valor, vence)
+            self._datos.move_to_end(llave)
+            while len(self._datos) > self.maximo:
+                self._datos.popitem(last=False)
+
+    def pop(self, llave):
+        with self._lock:
+            self._datos.pop(llave, None)
+
+    def clear(self):
+        with self._lock:
+            self._datos.clear()
+
+    def __len__(self):
+        return len(self._datos)
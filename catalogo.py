@@ -0,0 +1,62 @@
+from flask import current_app
+from sqlalchemy import or_
+
+from cache import LRU
+from models import Producto
+from versiones import version
+
+CACHE_CODIGOS = 5000
+NINGUNO = object()  # marca en la caché un código que no corresponde a ningún producto
+
+_cache = None
+_version_cache = None
+
+
+def _cache_codigos():
+    # Se descarta completa cuando cambia la versión de productos (ver versiones.py), así una
+    # escritura en cualquier worker invalida la caché de todos.
+    global _cache, _version_cache
+    if _cache is None:
+        _cache = LRU(current_app.config.get("CACHE_CODIGOS", CACHE_CODIGOS))
+    vigente = version("productos")
+    if vigente != _version_cache:
+        _cache.clear()
+        _version_cache = vigente
+    return _cache
+
+
+def _resolver(cache, codigo):
+    # El código de barra tiene prioridad sobre el SKU. Devuelve el producto, NINGUNO si se sabe que no
+    # existe, o None si falta información en la caché.
+    por_barra = cache.get(("barra", codigo))
+    if por_barra is not NINGUNO:
+        return por_barra
+    return cache.get(("sku", codigo))
+
+
+def buscar_por_codigo(codigos):
+    # Resuelve códigos de barra o SKU a productos serializados; los que no existen no vienen en el resultado.
+    # Barras y SKU van en llaves distintas de la caché: un código de barra puede ser el SKU de otro producto.
+    cache = _cache_codigos()
+    encontrados = {}
+    faltantes = set()
+    for codigo in codigos:
+        producto = _resolver(cache, codigo)
+        if producto is None:
+            faltantes.add(codigo)
+        elif producto is not NINGUNO:
+            encontrados[codigo] = producto
+
+    if faltantes:
+        productos = Producto.query.filter(or_(Producto.codigo_barra.in_(faltantes), Producto.sku.in_(faltantes))).all()
+        datos = [(producto, producto.serialize()) for producto in productos]
+        por_barra = {producto.codigo_barra: serializado for producto, serializado in datos}
+        por_sku = {producto.sku: serializado for producto, serializado in datos}
+        for codigo in faltantes:
+            # Los códigos sin producto también se guardan, hasta la próxima escritura en productos
+            cache.put(("barra", codigo), por_barra.get(codigo, NINGUNO))
+            cache.put(("sku", codigo), por_sku.get(codigo, NINGUNO))
+            producto = por_barra.get(codigo) or por_sku.get(codigo)
+            if producto:
+                encontrados[codigo] = producto
+    return encontrados
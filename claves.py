@@ -0,0 +1,127 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as TiempoAgotado
+
+from flask import current_app
+
+# bcrypt libera el GIL mientras calcula, así que un grupo acotado de hilos limita cuántos hashes
+# corren a la vez sin dejar sin CPU al resto de las solicitudes.
+HASH_WORKERS = 4
+HASH_COLA = 32
+HASH_TIMEOUT = 5  # segundos
+
+_bcrypt = None
+_pool = None
+_cupos = None
+_lock = threading.Lock()
+_metricas = {"operaciones": 0, "segundos_calculo": 0.0, "segundos_total": 0.0, "maximo_total": 0.0,
+             "rechazadas": 0, "timeouts": 0, "rehash": 0}
+
+
+class ServicioOcupado(Exception):
+    # Se responde con 503 para que el cliente reintente
+    pass
+
+
+def _obtener_bcrypt():
+    # flask_bcrypt se carga con el primer hash, no al crear la app
+    global _bcrypt
+    if _bcrypt is None:
+        with _lock:
+            if _bcrypt is None:
+                from flask_bcrypt import Bcrypt
+                _bcrypt = Bcrypt(current_app)
+    return _bcrypt
+
+
+def _obtener_pool():
+    global _pool, _cupos
+    if _pool is None:
+        with _lock:
+            if _pool is None:
+                workers = current_app.config.get("HASH_WORKERS", HASH_WORKERS)
+                _cupos = threading.BoundedSemaphore(workers + current_app.config.get("HASH_COLA", HASH_COLA))
+                _pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+    return _pool
+
+
+def _medir(funcion, *args):
+    inicio = time.perf_counter()
+    resultado = funcion(*args)
+    return resultado, time.perf_counter() - inicio
+
+
+def _ejecutar(funcion, *args):
+    pool = _obtener_pool()
+    timeout = current_app.config.get("HASH_TIMEOUT", HASH_TIMEOUT)
+    inicio = time.perf_counter()
+
+    if not _cupos.acquire(timeout=timeout):
+        _registrar(rechazada=True)
+        raise ServicioOcupado("Servidor ocupado, intente nuevamente")
+    futuro = pool.submit(_medir, funcion, *args)
+    futuro.add_done_callback(lambda _: _cupos.release())
+
+    try:
+        resultado, calculo = futuro.result(timeout=max(timeout - (time.perf_counter() - inicio), 0.1))
+    except TiempoAgotado:
+        _registrar(timeout=True)
+        raise ServicioOcupado("Servidor ocupado, intente nuevamente")
+    _registrar(calculo=calculo, total=time.perf_counter() - inicio)
+    return resultado
+
+
+def _registrar(calculo=0.0, total=0.0, rechazada=False, timeout=False, rehash=False):
+    with _lock:
+        if rechazada:
+            _metricas["rechazadas"] += 1
+        elif timeout:
+            _metricas["timeouts"] += 1
+        elif rehash:
+            _metricas["rehash"] += 1
+        else:
+            _metricas["operaciones"] += 1
+            _metricas["segundos_calculo"] += calculo
+            _metricas["segundos_total"] += total
+            _metricas["maximo_total"] = max(_metricas["maximo_total"], total)
+
+
+def costo_configurado():
+    return current_app.config.get("BCRYPT_LOG_ROUNDS", 12)
+
+
+def generar_hash(password):
+    return _ejecutar(_obtener_bcrypt().generate_password_hash, password, costo_configurado()).decode("utf-8")
+
+
+def verificar(hash_guardado, password):
+    return _ejecutar(_obtener_bcrypt().check_password_hash, hash_guardado, password)
+
+
+def requiere_rehash(hash_guardado):
+    # Formato $2b$12$...: el segundo campo es el costo con que se generó
+    try:
+        return int(hash_guardado.split("$")[2]) != costo_configurado()
+    except (IndexError, ValueError):
+        return False
+
+
+def rehash_si_corresponde(usuario, password):
+    # Llamar solo después de verificar la contraseña
+    if requiere_rehash(usuario.password):
+        usuario.password = generar_hash(password)
+        usuario.update()
+        _registrar(rehash=True)
+
+
+def metricas():
+    with _lock:
+        datos = dict(_metricas)
+    operaciones = datos["operaciones"] or 1
+    datos["promedio_ms_calculo"] = round(datos["segundos_calculo"] / operaciones * 1000, 2)
+    datos["promedio_ms_total"] = round(datos["segundos_total"] / operaciones * 1000, 2)
+    datos["maximo_ms_total"] = round(datos.pop("maximo_total") * 1000, 2)
+    datos.pop("segundos_calculo")
+    datos.pop("segundos_total")
+    datos["costo"] = costo_configurado()
+    return datos
@@ -0,0 +1,137 @@
+import datetime
+import sys
+
+from flask import current_app
+from flask_migrate import Migrate, MigrateCommand
+from flask_script import Manager
+
+from app import create_app
+from arranque import medir_arranque
+from correo import procesar_cola
+from idempotencia import purgar_claves
+from imagenes import limpiar_imagenes
+from importacion import importar_productos, leer_filas
+from models import db, Usuario, Entrada_Inventario, Stock_Producto, Stock_Diario, Venta_Diaria
+
+# Comandos de mantenimiento: python app.py <comando>. Migrate y flask_script solo se cargan aquí,
+# no en los workers web.
+
+
+def crear_app_comandos():
+    app = create_app()
+    Migrate(app, db)
+    return app
+
+
+manager = Manager(crear_app_comandos)
+manager.add_command('db', MigrateCommand)
+
+
+@manager.command
+def reconstruir_ventas_diarias():
+    "Recalcula ventas_diarias desde las salidas de inventario (carga inicial)"
+    filas = Venta_Diaria.reconstruir()
+    print(f"{filas} filas de ventas diarias.")
+
+
+@manager.command
+def recalcular_costos():
+    "Recalcula el costo de cada producto y de sus salidas (y las capas fifo, si corresponde)"
+    productos = {producto_id for (producto_id,) in db.session.query(Entrada_Inventario.producto_id).distinct()}
+    Stock_Producto.recalcular_costo(productos)
+    db.session.commit()
+    print(f"Costos recalculados para {len(productos)} productos.")
+
+
+@manager.command
+def verificar_stock(reparar=False):
+    "Compara stock_productos con las entradas y salidas de inventario"
+    diferencias = Stock_Producto.verificar(reparar=reparar)
+    for diferencia in diferencias:
+        print(f"Producto {diferencia['producto_id']}: registrado {diferencia['registrado']}, "
+              f"esperado {diferencia['esperado']}")
+    if not diferencias:
+        print("Stock cuadrado.")
+    elif reparar:
+        print(f"{len(diferencias)} saldos reparados.")
+
+
+@manager.option("-f", "--fecha", dest="fecha", default=None, help="Día a cerrar (YYYY-MM-DD), por defecto ayer")
+def cerrar_stock(fecha=None):
+    "Guarda las fotos diarias de stock pendientes hasta la fecha indicada (para cron)"
+    if fecha:
+        hasta = datetime.datetime.strptime(fecha, "%Y-%m-%d").date()
+    else:
+        hasta = datetime.date.today() - datetime.timedelta(days=1)
+
+    # Cierra cada día pendiente para que cada foto solo sume un día de movimientos
+    ultima = Stock_Diario.ultima_fecha(hasta=hasta)
+    dia = ultima + datetime.timedelta(days=1) if ultima and ultima < hasta else hasta
+    while dia <= hasta:
+        productos = Stock_Diario.cerrar(dia)
+        print(f"Stock al {dia}: {productos} productos")
+        dia += datetime.timedelta(days=1)
+
+
+@manager.option("-a", "--archivo", dest="archivo", required=True, help="Catálogo .csv o .xlsx")
+def importar_catalogo_productos(archivo):
+    "Importa o actualiza productos desde un archivo, en lotes"
+    def progreso(resumen):
+        print(f"{resumen['procesadas']} filas: {resumen['insertados']} insertados, "
+              f"{resumen['actualizados']} actualizados, {resumen['con_error']} con error")
+
+    with open(archivo, "rb") as contenido:
+        resumen = importar_productos(leer_filas(contenido, archivo), progreso=progreso)
+    for error in resumen["errores"]:
+        print(f"Fila {error['fila']}: {error['msg']}")
+
+
+@manager.option("-c", "--continuo", dest="continuo", action="store_true", default=False,
+                help="Sigue revisando la cola en vez de terminar cuando está vacía")
+def enviar_correos(continuo=False):
+    "Despacha la bandeja de salida de correos con reintentos"
+    for resumen in procesar_cola(continuo=continuo):
+        if resumen["enviados"] or resumen["reintentos"] or resumen["fallidos"]:
+            print(f"{resumen['enviados']} enviados, {resumen['reintentos']} para reintentar, "
+                  f"{resumen['fallidos']} fallidos")
+
+
+@manager.option("-s", "--simular", dest="simular", action="store_true", default=False,
+                help="Solo lista los archivos que se borrarían")
+def limpiar_imagenes_huerfanas(simular=False):
+    "Borra las imágenes subidas que ya no usa ningún usuario"
+    referenciadas = [foto for (foto,) in db.session.query(Usuario.foto).distinct()]
+    huerfanas = limpiar_imagenes(referenciadas, eliminar=not simular)
+    for nombre in huerfanas:
+        print(nombre)
+    print(f"{len(huerfanas)} imágenes {'sin uso' if simular else 'eliminadas'}.")
+
+
+@manager.command
+def purgar_claves_idempotencia():
+    "Borra las claves de idempotencia vencidas y sus respuestas guardadas"
+    print(f"{purgar_claves()} claves de idempotencia eliminadas.")
+
+
+@manager.option("-m", "--maximo", dest="maximo", type=float, default=None,
+                help="Segundos permitidos para importar y crear la app, por defecto ARRANQUE_MAXIMO")
+def verificar_arranque(maximo=None):
+    "Mide el arranque en frío de la app en un intérprete nuevo y falla si supera el presupuesto"
+    maximo = maximo or current_app.config["ARRANQUE_MAXIMO"]
+    medicion = medir_arranque()
+    print(f"Importar: {medicion['importar']:.3f}s, crear app: {medicion['crear']:.3f}s (máximo {maximo}s)")
+    for modulo, segundos in medicion["lentos"]:
+        print(f"  {segundos:.3f}s  {modulo}")
+    errores = []
+    if medicion["importar"] + medicion["crear"] > maximo:
+        errores.append("El arranque supera el presupuesto")
+    if medicion["cargados"]:
+        errores.append(f"Se cargan al arrancar módulos que deben ser diferidos: {', '.join(medicion['cargados'])}")
+    for error in errores:
+        print(error)
+    if errores:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    manager.run()
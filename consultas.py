@@ -0,0 +1,188 @@
+import base64
+import datetime
+import json
+from urllib.parse import urlencode
+
+from flask import Response, current_app, jsonify, request, stream_with_context
+from flask import json as json_flask
+from sqlalchemy import and_, or_
+
+from models import db
+
+PAGINA_DEFECTO = 100
+PAGINA_MAXIMA = 500
+STREAM_LOTE = 1000
+
+
+class ErrorConsulta(Exception):
+    # Parámetros de consulta inválidos, se responde con 400 y el mensaje
+    pass
+
+
+class Pagina:
+    def __init__(self, filas, siguiente=None):
+        self.filas = filas
+        self.siguiente = siguiente
+
+
+def leer_limite():
+    maximo = current_app.config.get("PAGINA_MAXIMA", PAGINA_MAXIMA)
+    limite = request.args.get("limit", None)
+    if limite is None:
+        return min(current_app.config.get("PAGINA_DEFECTO", PAGINA_DEFECTO), maximo)
+    try:
+        limite = int(limite)
+    except ValueError:
+        raise ErrorConsulta("limit debe ser un número entero")
+    if limite <= 0:
+        raise ErrorConsulta("limit debe ser mayor a 0")
+    return min(limite, maximo)
+
+
+def leer_campos(modelo):
+    # ?fields=id,sku limita las columnas y ?expand=entradas_inventario.producto agrega relaciones.
+    # Sin ninguno de los dos se mantiene la forma por defecto de serialize().
+    fields = request.args.get("fields", None)
+    expand = request.args.get("expand", None)
+    if fields is None and expand is None:
+        return None, None
+
+    campos = list(modelo.CAMPOS)
+    if fields:
+        campos = [campo.strip() for campo in fields.split(",") if campo.strip()]
+        no_permitidos = [campo for campo in campos if campo not in modelo.CAMPOS]
+        if no_permitidos:
+            raise ErrorConsulta(f"Campos no permitidos: {', '.join(no_permitidos)}")
+
+    expandir = {}
+    for ruta in (expand or "").split(","):
+        if ruta.strip():
+            _agregar_expansion(modelo, expandir, ruta.strip().split("."))
+    return campos, expandir
+
+
+def _agregar_expansion(modelo, expandir, ruta):
+    expansiones = getattr(modelo, "EXPANSIONES", {})
+    clave = ruta[0]
+    if clave not in expansiones:
+        raise ErrorConsulta(f"No se puede expandir {clave}")
+    anidados = expandir.setdefault(clave, {})
+    if len(ruta) > 1:
+        hijo = getattr(modelo, expansiones[clave]).property.mapper.class_
+        _agregar_expansion(hijo, anidados, ruta[1:])
+
+
+def filtrar_campos(datos, campos):
+    # Para respuestas que no salen de serialize(), como /api/stock
+    if campos is None:
+        return datos
+    no_permitidos = [campo for campo in campos if campo not in datos]
+    if no_permitidos:
+        raise ErrorConsulta(f"Campos no permitidos: {', '.join(no_permitidos)}")
+    return {campo: datos[campo] for campo in campos}
+
+
+def codificar_cursor(valores):
+    valores = [valor.isoformat() if isinstance(valor, (datetime.date, datetime.datetime)) else valor
+               for valor in valores]
+    return base64.urlsafe_b64encode(json.dumps(valores).encode("utf-8")).decode("ascii")
+
+
+def decodificar_cursor(cursor, columnas):
+    try:
+        valores = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        if len(valores) != len(columnas):
+            raise ValueError
+        resultado = []
+        for columna, valor in zip(columnas, valores):
+            tipo = getattr(columna.type, "python_type", None)
+            if tipo is datetime.datetime:
+                valor = datetime.datetime.fromisoformat(valor)
+            elif tipo is datetime.date:
+                valor = datetime.date.fromisoformat(valor)
+            resultado.append(valor)
+        return resultado
+    except (ValueError, TypeError, NotImplementedError):
+        raise ErrorConsulta("Cursor after inválido")
+
+
+def despues_de(columnas, valores):
+    # (a, b, c) > (x, y, z) expandido, para no depender de comparaciones de tuplas en la base de datos
+    condiciones = []
+    for posicion, columna in enumerate(columnas):
+        iguales = [anterior == valor for anterior, valor in zip(columnas[:posicion], valores[:posicion])]
+        condiciones.append(and_(*iguales, columna > valores[posicion]))
+    return or_(*condiciones)
+
+
+def paginar(consulta, *columnas, limite=None, cursor=None):
+    # Paginación por llave (keyset). La última columna debe ser única, normalmente el id.
+    limite = limite or leer_limite()
+    cursor = cursor if cursor is not None else request.args.get("after", None)
+
+    consulta = consulta.order_by(*columnas)
+    if cursor:
+        consulta = consulta.filter(despues_de(columnas, decodificar_cursor(cursor, columnas)))
+
+    filas = consulta.limit(limite + 1).all()
+    siguiente = None
+    if len(filas) > limite:
+        filas = filas[:limite]
+        siguiente = codificar_cursor([getattr(filas[-1], columna.key) for columna in columnas])
+    return Pagina(filas, siguiente)
+
+
+def respuesta_paginada(pagina, serializar):
+    respuesta = jsonify(list(map(serializar, pagina.filas)))
+    if pagina.siguiente:
+        argumentos = request.args.to_dict()
+        argumentos["after"] = pagina.siguiente
+        argumentos["limit"] = leer_limite()
+        url = request.base_url + "?" + urlencode(argumentos)
+        respuesta.headers["X-Next-Cursor"] = pagina.siguiente
+        respuesta.headers["Link"] = f'<{url}>; rel="next"'
+    return respuesta
+
+
+def quiere_stream():
+    # ?stream=1 devuelve la colección completa como arreglo JSON en trozos,
+    # Accept: application/x-ndjson la devuelve como un objeto JSON por línea
+    return request.args.get("stream") in ("1", "true") or _quiere_ndjson()
+
+
+def _quiere_ndjson():
+    return request.accept_mimetypes.best_match(["application/json", "application/x-ndjson"]) == "application/x-ndjson"
+
+
+def recorrer(consulta, *columnas, lote=None):
+    # Recorre la consulta completa en lotes por llave, sin mantener más de un lote en memoria
+    lote = lote or current_app.config.get("STREAM_LOTE", STREAM_LOTE)
+    cursor = None
+    while True:
+        pagina = paginar(consulta, *columnas, limite=lote, cursor=cursor)
+        for fila in pagina.filas:
+            yield fila
+        if not pagina.siguiente:
+            return
+        cursor = pagina.siguiente
+        db.session.expunge_all()
+
+
+def respuesta_stream(consulta, serializar, *columnas):
+    ndjson = _quiere_ndjson()
+
+    def generar():
+        if not ndjson:
+            yield "["
+        separador = ""
+        for fila in recorrer(consulta, *columnas):
+            if ndjson:
+                yield json_flask.dumps(serializar(fila)) + "\n"
+            else:
+                yield separador + json_flask.dumps(serializar(fila))
+                separador = ","
+        if not ndjson:
+            yield "]"
+
+    mimetype = "application/x-ndjson" if ndjson else "application/json"
+    return Response(stream_with_context(generar()), mimetype=mimetype)
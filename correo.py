@@ -0,0 +1,141 @@
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from models import db, Correo_Saliente
+
+CORREO_LOTE = 50
+CORREO_MAX_INTENTOS = 6
+CORREO_REINTENTO_BASE = 30  # segundos, se duplica en cada intento
+CORREO_REINTENTO_MAXIMO = 3600
+CORREO_ESPERA = 5  # segundos entre revisiones de la cola en modo continuo
+CORREO_RECLAMO = 600  # segundos tras los cuales un lote 'enviando' de un worker caído se vuelve a tomar
+
+
+def obtener_mail():
+    # flask_mail se importa y configura con el primer envío, no al crear la app
+    estado = current_app.extensions.get("mail")
+    if estado is None:
+        from flask_mail import Mail
+        estado = Mail().init_app(current_app)
+    return estado
+
+
+def encolar_correo(asunto, destinatarios, cuerpo=None, html=None):
+    # Deja el correo en la bandeja de salida; no abre conexión SMTP
+    correo = Correo_Saliente()
+    correo.asunto = asunto
+    correo.destinatarios = ",".join(destinatario for destinatario in destinatarios if destinatario)
+    correo.cuerpo = cuerpo
+    correo.html = html
+    correo.save()
+    return correo
+
+
+def _espera_reintento(intentos):
+    base = current_app.config.get("CORREO_REINTENTO_BASE", CORREO_REINTENTO_BASE)
+    maximo = current_app.config.get("CORREO_REINTENTO_MAXIMO", CORREO_REINTENTO_MAXIMO)
+    return timedelta(seconds=min(base * 2 ** (intentos - 1), maximo))
+
+
+def _registrar_error(correo, error):
+    correo.ultimo_error = str(error)[:1000]
+    if correo.intentos >= current_app.config.get("CORREO_MAX_INTENTOS", CORREO_MAX_INTENTOS):
+        correo.estado = "fallido"
+    else:
+        correo.proximo_intento = datetime.now() + _espera_reintento(correo.intentos)
+
+
+def _reclamar(lote):
+    # Marca como 'enviando' un lote de correos vencidos a nombre de este proceso y hace commit. Sin
+    # SELECT ... FOR UPDATE SKIP LOCKED (no existe en MySQL 5.7): el UPDATE repite la condición, así
+    # dos workers que eligen las mismas filas no se las quedan ambos.
+    ahora = datetime.now()
+    reclamo = ahora - timedelta(seconds=current_app.config.get("CORREO_RECLAMO", CORREO_RECLAMO))
+    disponible = db.or_(
+        db.and_(Correo_Saliente.estado == "pendiente", Correo_Saliente.proximo_intento <= ahora),
+        db.and_(Correo_Saliente.estado == "enviando", Correo_Saliente.fecha_reclamo <= reclamo))
+    ids = [id for (id,) in db.session.query(Correo_Saliente.id)
+           .filter(disponible)
+           .order_by(Correo_Saliente.proximo_intento, Correo_Saliente.id)
+           .limit(lote)]
+    if not ids:
+        db.session.commit()
+        return None, []
+
+    dueno = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+    Correo_Saliente.query \
+        .filter(Correo_Saliente.id.in_(ids), disponible) \
+        .update({"estado": "enviando", "reclamado_por": dueno, "fecha_reclamo": ahora}, synchronize_session=False)
+    db.session.commit()
+    correos = db.session.query(Correo_Saliente.id, Correo_Saliente.asunto, Correo_Saliente.destinatarios,
+                               Correo_Saliente.cuerpo, Correo_Saliente.html) \
+        .filter_by(reclamado_por=dueno, estado="enviando") \
+        .order_by(Correo_Saliente.proximo_intento, Correo_Saliente.id) \
+        .all()
+    db.session.commit()  # no se deja una transacción abierta mientras se habla con el servidor SMTP
+    return dueno, correos
+
+
+def enviar_pendientes(mail=None, lote=None):
+    # Envía un lote de correos vencidos por una sola conexión SMTP, fuera de toda transacción: primero
+    # los reclama, después los envía y al final anota el resultado. Se pueden correr varios workers.
+    from flask_mail import Message
+    mail = mail or obtener_mail()
+    lote = lote or current_app.config.get("CORREO_LOTE", CORREO_LOTE)
+    resumen = {"enviados": 0, "reintentos": 0, "fallidos": 0}
+    dueno, correos = _reclamar(lote)
+    if not correos:
+        return resumen
+
+    errores = {}
+    enviados = {}
+    try:
+        with mail.connect() as conexion:
+            for correo in correos:
+                try:
+                    # Dentro del try: un correo que no se puede armar también cuenta como intento
+                    mensaje = Message(correo.asunto, recipients=correo.destinatarios.split(","),
+                                      body=correo.cuerpo, html=correo.html)
+                    conexion.send(mensaje)
+                except Exception as error:
+                    errores[correo.id] = error
+                    continue
+                enviados[correo.id] = datetime.now()
+    except Exception as error:
+        # No se pudo conectar (o se cortó la conexión): reintentan los que no alcanzaron a salir
+        for correo in correos:
+            if correo.id not in enviados:
+                errores.setdefault(correo.id, error)
+
+    # Solo las filas que siguen a nombre de este proceso: pasado CORREO_RECLAMO otro worker pudo tomarlas
+    for correo in Correo_Saliente.query.filter_by(reclamado_por=dueno, estado="enviando"):
+        correo.intentos += 1
+        if correo.id in enviados:
+            correo.estado = "enviado"
+            correo.fecha_envio = enviados[correo.id]
+            resumen["enviados"] += 1
+            continue
+        _registrar_error(correo, errores[correo.id])
+        if correo.estado == "fallido":
+            resumen["fallidos"] += 1
+        else:
+            correo.estado = "pendiente"
+            resumen["reintentos"] += 1
+    db.session.commit()
+    return resumen
+
+
+def procesar_cola(mail=None, continuo=False):
+    # Vacía la cola; en modo continuo sigue revisando cada CORREO_ESPERA segundos
+    while True:
+        resumen = enviar_pendientes(mail)
+        yield resumen
+        if resumen["enviados"] + resumen["reintentos"] + resumen["fallidos"] == 0:
+            if not continuo:
+                return
+            time.sleep(current_app.config.get("CORREO_ESPERA", CORREO_ESPERA))
@@ -0,0 +1,34 @@
+# Servidor de producción: gunicorn -c gunicorn.conf.py wsgi:app  (pipenv run serve)
+# Recarga sin cortar solicitudes: kill -HUP <pid del master>
+import os
+
+from servidor import cantidad_workers, clase_worker, concurrencia_worker
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+workers = cantidad_workers()
+worker_class = clase_worker()
+if worker_class == "gevent":
+    worker_connections = concurrencia_worker()
+else:
+    threads = concurrencia_worker()
+
+# Reciclar cada proceso tras N solicitudes (con variación para que no se reinicien todos juntos)
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 1000))
+max_requests_jitter = int(os.environ.get("GUNICORN_MAX_REQUESTS_JITTER", 100))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 60))
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", 30))
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", 5))
+
+# La app se carga en cada worker, así cada proceso crea su propio engine y pool de conexiones
+preload_app = os.environ.get("GUNICORN_PRELOAD", "false").lower() == "true"
+accesslog = "-"
+errorlog = "-"
+
+
+def post_fork(server, worker):
+    # Con preload_app el master ya importó la app: las conexiones heredadas no se comparten entre procesos
+    if preload_app:
+        from wsgi import app
+        from models import db
+        with app.app_context():
+            db.engine.dispose()
@@ -0,0 +1,135 @@
+import functools
+import hashlib
+from datetime import datetime, timedelta
+
+from flask import current_app, jsonify, make_response, request
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy.exc import IntegrityError
+
+from models import db, Clave_Idempotencia
+
+# Un POST con cabecera Idempotency-Key se ejecuta una sola vez por usuario y clave: los reintentos
+# reciben la respuesta guardada con una sola consulta por el índice único (usuario, clave).
+IDEMPOTENCIA_TTL = 86400  # segundos que se guarda cada respuesta
+# Segundos que dura la reserva de una solicitud en curso; debe superar el timeout de gunicorn. Si el
+# worker muere sin liberarla, el reintento del cliente la retoma pasado este plazo.
+IDEMPOTENCIA_RESERVA = 120
+IDEMPOTENCIA_LOTE = 1000
+LARGO_CLAVE = 100
+
+
+def _repetir(registro, ruta, huella):
+    if registro.ruta != ruta or registro.huella != huella:
+        return jsonify({"msg": "Idempotency-Key ya fue usada con otra solicitud"}), 422
+    if registro.estado_http is None:
+        return jsonify({"msg": "La solicitud con esta Idempotency-Key aún se está procesando"}), 409
+    respuesta = make_response(registro.respuesta, registro.estado_http)
+    respuesta.headers["Content-Type"] = registro.tipo_contenido
+    respuesta.headers["Idempotent-Replayed"] = "true"
+    return respuesta
+
+
+def _liberar(id, fecha_registro):
+    # Sin respuesta que guardar (error 5xx o excepción): se borra la reserva para que el reintento se ejecute.
+    # Solo si sigue siendo nuestra: pasado IDEMPOTENCIA_RESERVA otro reintento pudo retomarla.
+    db.session.rollback()
+    Clave_Idempotencia.query.filter_by(id=id, fecha_registro=fecha_registro).delete()
+    db.session.commit()
+
+
+def _abandonada(registro, ruta, huella, ahora):
+    # Reserva de la misma solicitud cuyo worker no alcanzó a responder ni a liberarla
+    reserva = timedelta(seconds=current_app.config.get("IDEMPOTENCIA_RESERVA", IDEMPOTENCIA_RESERVA))
+    return registro.estado_http is None and registro.ruta == ruta and registro.huella == huella and \
+        registro.fecha_registro <= ahora - reserva
+
+
+def idempotente(vista):
+    # Va debajo de @jwt_required; solo actúa en POST y cuando viene la cabecera
+    @functools.wraps(vista)
+    def envoltura(*args, **kwargs):
+        clave = request.headers.get("Idempotency-Key")
+        if request.method != "POST" or not clave:
+            return vista(*args, **kwargs)
+        if len(clave) > LARGO_CLAVE:
+            return jsonify({"msg": f"Idempotency-Key no puede tener más de {LARGO_CLAVE} caracteres"}), 400
+
+        usuario = get_jwt_identity()
+        huella = hashlib.sha256(request.get_data()).hexdigest()
+        ahora = datetime.now().replace(microsecond=0)  # DATETIME de MySQL no guarda fracciones
+        registro = Clave_Idempotencia.query.filter_by(usuario=usuario, clave=clave).first()
+        if registro and registro.fecha_expiracion > ahora and not _abandonada(registro, request.path, huella, ahora):
+            return _repetir(registro, request.path, huella)
+
+        # Se reserva la clave antes de ejecutar la vista, así un reintento simultáneo no la ejecuta de nuevo
+        reserva = {
+            "ruta": request.path,
+            "huella": huella,
+            "estado_http": None,
+            "tipo_contenido": None,
+            "respuesta": None,
+            "fecha_registro": ahora,
+            "fecha_expiracion": ahora + timedelta(seconds=current_app.config.get("IDEMPOTENCIA_TTL", IDEMPOTENCIA_TTL)),
+        }
+        if registro:
+            # Clave vencida que aún no se purga o reserva abandonada: se retoma solo si nadie la tomó entremedio
+            id = registro.id
+            if registro.fecha_expiracion <= ahora:
+                condicion = Clave_Idempotencia.fecha_expiracion <= ahora
+            else:
+                condicion = db.and_(Clave_Idempotencia.estado_http.is_(None),
+                                    Clave_Idempotencia.fecha_registro == registro.fecha_registro)
+            tomada = Clave_Idempotencia.query \
+                .filter(Clave_Idempotencia.id == id, condicion) \
+                .update(reserva, synchronize_session=False)
+            db.session.commit()
+            if not tomada:
+                return jsonify({"msg": "La solicitud con esta Idempotency-Key aún se está procesando"}), 409
+        else:
+            registro = Clave_Idempotencia(usuario=usuario, clave=clave, **reserva)
+            db.session.add(registro)
+            try:
+                db.session.commit()
+            except IntegrityError:
+                db.session.rollback()
+                registro = Clave_Idempotencia.query.filter_by(usuario=usuario, clave=clave).first()
+                if registro is None:
+                    return jsonify({"msg": "La solicitud con esta Idempotency-Key aún se está procesando"}), 409
+                return _repetir(registro, request.path, huella)
+            id = registro.id
+
+        try:
+            respuesta = make_response(vista(*args, **kwargs))
+        except Exception:
+            _liberar(id, ahora)
+            raise
+        if respuesta.status_code >= 500 or respuesta.is_streamed:
+            _liberar(id, ahora)
+            return respuesta
+
+        # Lo que la vista no alcanzó a confirmar no se guarda junto con la respuesta
+        db.session.rollback()
+        Clave_Idempotencia.query.filter_by(id=id, fecha_registro=ahora).update({
+            "estado_http": respuesta.status_code,
+            "tipo_contenido": respuesta.headers.get("Content-Type"),
+            "respuesta": respuesta.get_data(as_text=True),
+        }, synchronize_session=False)
+        db.session.commit()
+        return respuesta
+    return envoltura
+
+
+def purgar_claves(lote=None):
+    # Borra las claves vencidas por lotes, para no bloquear la tabla en una sola transacción larga
+    lote = lote or current_app.config.get("IDEMPOTENCIA_LOTE", IDEMPOTENCIA_LOTE)
+    total = 0
+    while True:
+        ids = [id for (id,) in db.session.query(Clave_Idempotencia.id)
+               .filter(Clave_Idempotencia.fecha_expiracion <= datetime.now())
+               .order_by(Clave_Idempotencia.fecha_expiracion)
+               .limit(lote)]
+        if not ids:
+            return total
+        Clave_Idempotencia.query.filter(Clave_Idempotencia.id.in_(ids)).delete(synchronize_session=False)
+        db.session.commit()
+        total += len(ids)
@@ -0,0 +1,185 @@
+import hashlib
+import io
+import mimetypes
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import abort, current_app, make_response, request, send_file
+from werkzeug.security import safe_join
+
+# Cada foto se guarda una sola vez con el sha256 de su contenido como nombre, más sus variantes:
+#   <hash>.jpg         original normalizado (sin metadatos, lado mayor acotado)
+#   <hash>-medium.jpg  para vistas de detalle
+#   <hash>-thumb.jpg   para avatares en listados
+VARIANTES = {"": 1600, "-medium": 480, "-thumb": 96}
+CALIDAD_JPEG = 85
+IMAGENES_WORKERS = 2
+IMAGENES_GRACIA = 3600  # segundos antes de que limpiar_imagenes borre un archivo sin referencias
+IMAGENES_PROTEGIDAS = {"without-photo.png"}
+NOMBRE_HASH = re.compile(r"^([0-9a-f]{64})(-medium|-thumb)?\.jpg$")
+CACHE_INMUTABLE = "public, max-age=31536000, immutable"
+CACHE_REVALIDAR = "public, no-cache"
+
+_pool = None
+_lock = threading.Lock()
+
+
+class ErrorImagen(Exception):
+    pass
+
+
+def carpeta_imagenes():
+    return os.path.join(current_app.config["UPLOAD_FOLDER"], "images")
+
+
+def nombre_variante(nombre, variante):
+    # nombre_variante("abc.jpg", "-thumb") -> "abc-thumb.jpg"
+    base, extension = os.path.splitext(nombre)
+    return f"{base}{variante}{extension}"
+
+
+def _obtener_pool():
+    global _pool
+    if _pool is None:
+        with _lock:
+            if _pool is None:
+                workers = current_app.config.get("IMAGENES_WORKERS", IMAGENES_WORKERS)
+                _pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="imagenes")
+    return _pool
+
+
+def guardar_imagen(archivo):
+    # Valida el archivo subido y devuelve el nombre con que quedará guardado. Si la misma imagen
+    # ya existe no se vuelve a procesar; si no, las variantes se generan en segundo plano.
+    from PIL import Image, UnidentifiedImageError  # Pillow se carga con la primera foto, no al arrancar
+
+    contenido = archivo.read()
+    try:
+        Image.open(io.BytesIO(contenido)).verify()  # solo revisa la estructura, no decodifica
+        ancho, alto = Image.open(io.BytesIO(contenido)).size  # verify() deja la imagen inutilizable
+    except (UnidentifiedImageError, OSError, SyntaxError, Image.DecompressionBombError):
+        raise ErrorImagen("Archivo no es una imagen válida")
+    if Image.MAX_IMAGE_PIXELS and ancho * alto > Image.MAX_IMAGE_PIXELS:
+        # Se rechaza aquí y no en segundo plano, donde Pillow solo lo toma como advertencia
+        raise ErrorImagen("Imagen demasiado grande")
+
+    nombre = hashlib.sha256(contenido).hexdigest() + ".jpg"
+    carpeta = carpeta_imagenes()
+    if not all(os.path.exists(os.path.join(carpeta, nombre_variante(nombre, variante))) for variante in VARIANTES):
+        logger = current_app.logger
+        try:
+            futuro = _obtener_pool().submit(_procesar, contenido, carpeta, nombre)
+        except RuntimeError:
+            # El pool ya se cerró (el worker se está apagando): se procesa en esta misma solicitud
+            try:
+                _procesar(contenido, carpeta, nombre)
+            except Exception:
+                logger.exception("No se pudieron generar las variantes de %s", nombre)
+                _descartar(carpeta, nombre, logger)
+                raise ErrorImagen("No se pudo procesar la imagen")
+        else:
+            futuro.add_done_callback(lambda futuro: _revisar(futuro, carpeta, nombre, logger))
+    return nombre
+
+
+def _revisar(futuro, carpeta, nombre, logger):
+    # El archivo subido nunca se guarda tal cual (conserva EXIF/GPS y puede no ser JPEG): si las
+    # variantes no se pudieron generar la foto queda sin archivo y se puede volver a subir.
+    error = futuro.exception()
+    if error is not None:
+        logger.error("No se pudieron generar las variantes de %s", nombre, exc_info=error)
+        _descartar(carpeta, nombre, logger)
+
+
+def _descartar(carpeta, nombre, logger):
+    # Borra las variantes que alcanzaron a escribirse, para que guardar_imagen vuelva a procesarla
+    for variante in VARIANTES:
+        try:
+            os.remove(os.path.join(carpeta, nombre_variante(nombre, variante)))
+        except FileNotFoundError:
+            pass
+        except OSError:
+            logger.exception("No se pudo borrar la variante %s de %s", variante, nombre)
+
+
+def _procesar(contenido, carpeta, nombre):
+    from PIL import Image, ImageOps
+
+    imagen = Image.open(io.BytesIO(contenido))
+    imagen = ImageOps.exif_transpose(imagen)  # aplica la rotación antes de perder el EXIF
+    if imagen.mode in ("RGBA", "LA", "P"):
+        imagen = imagen.convert("RGBA")
+        fondo = Image.new("RGB", imagen.size, (255, 255, 255))
+        fondo.paste(imagen, mask=imagen.split()[-1])
+        imagen = fondo
+    elif imagen.mode != "RGB":
+        imagen = imagen.convert("RGB")
+
+    os.makedirs(carpeta, exist_ok=True)
+    for variante, lado in VARIANTES.items():
+        copia = imagen.copy()
+        copia.thumbnail((lado, lado), Image.LANCZOS)
+        destino = os.path.join(carpeta, nombre_variante(nombre, variante))
+        temporal = f"{destino}.{threading.get_ident()}.tmp"
+        # Se guarda sin exif ni icc, y se renombra al final para que nunca se sirva a medio escribir
+        copia.save(temporal, "JPEG", quality=CALIDAD_JPEG, optimize=True, progressive=True)
+        os.replace(temporal, destino)
+
+
+def limpiar_imagenes(referenciadas, gracia=None, eliminar=True):
+    # Borra los archivos de la carpeta que no corresponden a ninguna foto referenciada (ni a sus
+    # variantes). Los más nuevos que 'gracia' segundos se respetan por si su registro aún no se guarda.
+    gracia = gracia if gracia is not None else current_app.config.get("IMAGENES_GRACIA", IMAGENES_GRACIA)
+    vigentes = set(IMAGENES_PROTEGIDAS)
+    for nombre in referenciadas:
+        if nombre:
+            vigentes.update(nombre_variante(nombre, variante) for variante in VARIANTES)
+
+    carpeta = carpeta_imagenes()
+    limite = time.time() - gracia
+    huerfanas = []
+    for entrada in os.scandir(carpeta):
+        if entrada.is_file() and entrada.name not in vigentes and entrada.stat().st_mtime < limite:
+            huerfanas.append(entrada.name)
+            if eliminar:
+                os.remove(entrada.path)
+    return huerfanas
+
+
+def respuesta_imagen(nombre):
+    # Los nombres por hash nunca cambian de contenido: se sirven como inmutables y con el hash como
+    # ETag fuerte. El resto (foto por defecto y fotos antiguas) se revalida en cada uso.
+    ruta = safe_join(carpeta_imagenes(), nombre)
+    if ruta is None or not os.path.isfile(ruta):
+        abort(404)
+
+    inmutable = NOMBRE_HASH.match(nombre) is not None
+    estado = os.stat(ruta)
+    etag = nombre if inmutable else f"{int(estado.st_mtime)}-{estado.st_size}"
+    cache_control = CACHE_INMUTABLE if inmutable else CACHE_REVALIDAR
+
+    prefijo = current_app.config.get("IMAGENES_ACCEL_REDIRECT")
+    if prefijo:
+        # nginx entrega el archivo (y atiende Range) desde la ubicación interna indicada
+        respuesta = make_response("")
+        respuesta.headers["X-Accel-Redirect"] = prefijo.rstrip("/") + "/" + nombre
+        respuesta.mimetype = mimetypes.guess_type(nombre)[0] or "application/octet-stream"
+    else:
+        # Con USE_X_SENDFILE, send_file deja el envío al servidor web con la cabecera X-Sendfile
+        respuesta = send_file(ruta, add_etags=False, conditional=False)
+        respuesta.last_modified = estado.st_mtime
+        respuesta.headers["Accept-Ranges"] = "bytes"  # Werkzeug 1.0 solo lo agrega en las respuestas 206
+        del respuesta.headers["Expires"]
+
+    respuesta.set_etag(etag)
+    respuesta.headers["Cache-Control"] = cache_control
+    if prefijo or current_app.use_x_sendfile:
+        if etag in request.if_none_match:
+            respuesta = make_response("", 304)
+            respuesta.set_etag(etag)
+            respuesta.headers["Cache-Control"] = cache_control
+        return respuesta
+    return respuesta.make_conditional(request, accept_ranges=True, complete_length=estado.st_size)
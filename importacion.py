@@ -0,0 +1,218 @@
+import csv
+import io
+import shutil
+import tempfile
+
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+
+from models import db, Producto, Categoria
+from versiones import incrementar_version
+
+LOTE_IMPORTACION = 1000
+MAXIMO_ERRORES = 100
+UNICOS = (("codigo_barra", "Código de barra"), ("descripcion", "Descripción"))
+COLUMNAS = ("sku", "descripcion", "codigo_barra", "unidad_entrega", "categoria_id", "precio_venta_unitario")
+
+
+class ErrorImportacion(Exception):
+    pass
+
+
+def leer_filas(archivo, nombre):
+    # Devuelve las filas del archivo de a una como diccionarios, sin cargarlo completo en memoria
+    extension = nombre.rsplit(".", 1)[-1].lower() if "." in nombre else ""
+    if extension == "csv":
+        return _leer_csv(archivo)
+    if extension == "xlsx":
+        return _leer_xlsx(archivo)
+    raise ErrorImportacion("El archivo debe ser .csv o .xlsx")
+
+
+def _archivo_binario(archivo):
+    # Las subidas grandes llegan como SpooledTemporaryFile, que antes de Python 3.11 no implementa
+    # readable()/seekable() y no sirve para TextIOWrapper ni zipfile: se copia a un archivo temporal
+    # real por bloques, sin cargarlo en memoria.
+    if all(hasattr(archivo, metodo) for metodo in ("readable", "seekable")):
+        return archivo
+    copia = tempfile.TemporaryFile()
+    shutil.copyfileobj(archivo, copia)
+    copia.seek(0)
+    return copia
+
+
+def _leer_csv(archivo):
+    binario = _archivo_binario(archivo)
+    texto = io.TextIOWrapper(binario, encoding="utf-8-sig", newline="")
+    try:
+        primera = texto.readline()
+        try:
+            dialecto = csv.Sniffer().sniff(primera, delimiters=",;\t")
+        except csv.Error:
+            dialecto = csv.excel
+        lector = csv.reader(texto, dialecto)
+        encabezado = [columna.strip().lower() for columna in next(csv.reader([primera], dialecto), [])]
+        for valores in lector:
+            yield dict(zip(encabezado, valores))
+    finally:
+        texto.detach()  # el archivo subido lo cierra werkzeug
+        if binario is not archivo:
+            binario.close()
+
+
+def _leer_xlsx(archivo):
+    try:
+        import openpyxl
+    except ImportError:
+        raise ErrorImportacion("Para importar .xlsx se debe instalar openpyxl")
+
+    binario = _archivo_binario(archivo)
+    libro = openpyxl.load_workbook(binario, read_only=True, data_only=True)
+    try:
+        filas = libro.active.iter_rows(values_only=True)
+        encabezado = [str(columna or "").strip().lower() for columna in next(filas, ())]
+        for valores in filas:
+            yield dict(zip(encabezado, valores))
+    finally:
+        libro.close()
+        if binario is not archivo:
+            binario.close()
+
+
+def importar_productos(filas, lote=None, progreso=None):
+    # Inserta o actualiza (por SKU) en lotes. La unicidad de código de barra y descripción se revisa
+    # contra las llaves precargadas en memoria, sin una consulta por fila.
+    lote = lote or current_app.config.get("LOTE_IMPORTACION", LOTE_IMPORTACION)
+
+    id_por_sku = {}
+    llaves = {campo: ({}, {}) for campo, nombre in UNICOS}  # por campo: valor de cada SKU y SKU de cada valor
+    for id, sku, codigo_barra, descripcion in db.session.query(Producto.id, Producto.sku, Producto.codigo_barra,
+                                                               Producto.descripcion):
+        id_por_sku[sku] = id
+        _asignar(llaves, sku, {"codigo_barra": codigo_barra, "descripcion": descripcion})
+    categorias = {id for (id,) in db.session.query(Categoria.id)}
+
+    resumen = {"procesadas": 0, "insertados": 0, "actualizados": 0, "con_error": 0, "errores": []}
+    vistos = set()
+    pendientes = []
+
+    for numero, fila in enumerate(filas, start=2):
+        resumen["procesadas"] += 1
+        datos, error = _validar_fila(fila, categorias)
+        if not error and datos["sku"] in vistos:
+            error = f"SKU {datos['sku']} repetido en el archivo"
+        if error:
+            _registrar_error(resumen, numero, error)
+            continue
+
+        vistos.add(datos["sku"])
+        if datos["sku"] in id_por_sku:
+            datos["id"] = id_por_sku[datos["sku"]]
+        pendientes.append((numero, datos))
+        if len(pendientes) >= lote:
+            _guardar_lote(pendientes, llaves, resumen, progreso)
+
+    _guardar_lote(pendientes, llaves, resumen, progreso)
+    resumen["errores"].sort(key=lambda error: error["fila"])
+    if resumen["insertados"] or resumen["actualizados"]:
+        incrementar_version("productos")
+    return resumen
+
+
+def _asignar(llaves, sku, datos):
+    for campo, (valor_por_sku, sku_por_valor) in llaves.items():
+        anterior = valor_por_sku.get(sku)
+        if sku_por_valor.get(anterior) == sku:
+            del sku_por_valor[anterior]
+        valor_por_sku[sku] = datos[campo]
+        sku_por_valor[datos[campo]] = sku
+
+
+def _resolver(pendientes, llaves, resumen):
+    # Revisa la unicidad contra el catálogo como quedaría con el lote guardado, así dos productos del
+    # lote pueden intercambiar sus códigos. Una fila rechazada conserva sus valores anteriores, que
+    # pueden chocar con otra fila: se repite hasta que no haya rechazos. Devuelve las filas aceptadas.
+    aceptadas = list(pendientes)
+    while True:
+        por_sku = {datos["sku"]: datos for numero, datos in aceptadas}
+        rechazadas = {}
+        for campo, nombre in UNICOS:
+            valor_por_sku, sku_por_valor = llaves[campo]
+            tomados = {}
+            for numero, datos in aceptadas:
+                valor = datos[campo]
+                dueno = sku_por_valor.get(valor)
+                if dueno is None or dueno == datos["sku"] or \
+                        (por_sku[dueno][campo] if dueno in por_sku else valor_por_sku[dueno]) != valor:
+                    dueno = tomados.setdefault(valor, datos["sku"])  # otra fila del lote con el mismo valor
+                if dueno != datos["sku"]:
+                    rechazadas.setdefault(numero, f"{nombre} {valor} ya existe en SKU {dueno}")
+        if not rechazadas:
+            return aceptadas
+        for numero, error in rechazadas.items():
+            _registrar_error(resumen, numero, error)
+        aceptadas = [(numero, datos) for numero, datos in aceptadas if numero not in rechazadas]
+
+
+def _registrar_error(resumen, numero, error):
+    resumen["con_error"] += 1
+    if len(resumen["errores"]) < MAXIMO_ERRORES:
+        resumen["errores"].append({"fila": numero, "msg": error})
+
+
+def _validar_fila(fila, categorias):
+    datos = {columna: fila.get(columna) for columna in COLUMNAS}
+    for columna in ("sku", "descripcion", "codigo_barra", "unidad_entrega", "categoria_id"):
+        if datos[columna] is None or not str(datos[columna]).strip():
+            return None, f"Columna {columna} no puede estar vacía"
+
+    try:
+        datos["categoria_id"] = int(datos["categoria_id"])
+        precio = datos.pop("precio_venta_unitario")
+        # Sin precio en el archivo se conserva el que tenga el producto
+        if precio is not None and str(precio).strip():
+            datos["precio_venta_unitario"] = float(precio)
+    except (TypeError, ValueError):
+        return None, "categoria_id y precio_venta_unitario deben ser numéricos"
+    if datos["categoria_id"] not in categorias:
+        return None, f"Categoría {datos['categoria_id']} no existe"
+
+    datos["sku"] = str(datos["sku"]).strip()
+    datos["codigo_barra"] = str(datos["codigo_barra"]).strip()
+    datos["descripcion"] = str(datos["descripcion"]).strip().capitalize()
+    datos["unidad_entrega"] = str(datos["unidad_entrega"]).strip()
+    return datos, None
+
+
+def _guardar_lote(pendientes, llaves, resumen, progreso):
+    # Primero las actualizaciones, así un código de barra que pasa de un producto existente a uno nuevo
+    # ya está libre al insertar. Los códigos que cambian pasan por un valor temporal para que dos
+    # productos puedan intercambiarlos (el índice único se revisa fila a fila).
+    aceptadas = _resolver(pendientes, llaves, resumen)
+    actualizar = [datos for numero, datos in aceptadas if "id" in datos]
+    insertar = [datos for numero, datos in aceptadas if "id" not in datos]
+    codigo_por_sku = llaves["codigo_barra"][0]
+    temporales = [{"id": datos["id"], "codigo_barra": f"~{datos['id']}"} for datos in actualizar
+                  if codigo_por_sku.get(datos["sku"]) != datos["codigo_barra"]]
+    try:
+        if temporales:
+            db.session.bulk_update_mappings(Producto, temporales)
+        if actualizar:
+            db.session.bulk_update_mappings(Producto, actualizar)
+        if insertar:
+            db.session.bulk_insert_mappings(Producto, insertar)
+        db.session.commit()
+    except IntegrityError as error:
+        # Otro proceso cambió el catálogo mientras tanto: el lote completo queda sin guardar y las llaves
+        # en memoria siguen como en la base, porque solo se actualizan después del commit
+        db.session.rollback()
+        for numero, datos in aceptadas:
+            _registrar_error(resumen, numero, f"Lote no guardado por un conflicto de llaves únicas: {error.orig}")
+    else:
+        resumen["insertados"] += len(insertar)
+        resumen["actualizados"] += len(actualizar)
+        for numero, datos in aceptadas:
+            _asignar(llaves, datos["sku"], datos)
+    pendientes.clear()
+    if progreso:
+        progreso(resumen)
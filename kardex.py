@@ -0,0 +1,124 @@
+import sqlite3
+from datetime import datetime, timedelta
+
+from flask import current_app, request
+from sqlalchemy import and_, literal, or_, select, union_all
+
+from consultas import ErrorConsulta, Pagina, codificar_cursor, decodificar_cursor, leer_limite
+from models import db, Entrada_Inventario, Salida_Inventario, Stock_Diario
+
+# Movimientos de un producto en orden (fecha_registro, tipo, id), con saldo acumulado. Cada página
+# lee a lo más limit + 1 filas de cada tabla por los índices ix_*_kardex; el saldo inicial de la
+# página viaja en el cursor, así que no se recorre la historia anterior.
+MOVIMIENTOS = (
+    ("entrada", Entrada_Inventario, Entrada_Inventario.factura_compra_id),
+    ("salida", Salida_Inventario, Salida_Inventario.documento_venta_id),
+)
+
+
+def soporta_ventanas():
+    # SUM() OVER existe desde MySQL 8, MariaDB 10.2 y SQLite 3.25
+    configurado = current_app.config.get("KARDEX_VENTANAS")
+    if configurado is not None:
+        return configurado
+    dialecto = db.engine.dialect
+    version = dialecto.server_version_info or ()
+    if dialecto.name == "sqlite":
+        return sqlite3.sqlite_version_info >= (3, 25)
+    if dialecto.name == "mysql":
+        return version >= ((10, 2) if getattr(dialecto, "is_mariadb", False) else (8, 0))
+    return True
+
+
+def leer_rango():
+    try:
+        desde = request.args.get("desde", None)
+        desde = datetime.strptime(desde, "%Y-%m-%d") if desde else None
+        hasta = request.args.get("hasta", None)
+        hasta = datetime.strptime(hasta, "%Y-%m-%d") + timedelta(days=1) if hasta else None
+    except ValueError:
+        raise ErrorConsulta("Fechas desde y hasta deben tener formato YYYY-MM-DD")
+    return desde, hasta
+
+
+def _rama(tipo, modelo, documento, producto_id, desde, hasta, cursor, limite):
+    signo = modelo.SIGNO_STOCK
+    consulta = select([
+        modelo.fecha_registro.label("fecha_registro"),
+        literal(tipo).label("tipo"),
+        modelo.id.label("id"),
+        documento.label("documento_id"),
+        modelo.cantidad.label("cantidad"),
+        modelo.precio_costo_unitario.label("costo_unitario"),
+        modelo.costo_total.label("costo_total"),
+        (modelo.cantidad * signo).label("variacion_cantidad"),
+        (modelo.costo_total * signo).label("variacion_valor"),
+    ]).where(modelo.producto_id == producto_id)
+
+    if desde is not None:
+        consulta = consulta.where(modelo.fecha_registro >= desde)
+    if hasta is not None:
+        consulta = consulta.where(modelo.fecha_registro < hasta)
+    if cursor is not None:
+        # (fecha_registro, tipo, id) > cursor, con tipo fijo en cada tabla
+        fecha, tipo_cursor, id = cursor
+        if tipo > tipo_cursor:
+            consulta = consulta.where(modelo.fecha_registro >= fecha)
+        elif tipo == tipo_cursor:
+            consulta = consulta.where(or_(modelo.fecha_registro > fecha,
+                                          and_(modelo.fecha_registro == fecha, modelo.id > id)))
+        else:
+            consulta = consulta.where(modelo.fecha_registro > fecha)
+    return select([consulta.order_by(modelo.fecha_registro, modelo.id).limit(limite).alias()])
+
+
+def kardex(producto_id, desde=None, hasta=None, cursor=None, limite=None):
+    limite = limite or leer_limite()
+    if cursor:
+        # El cursor lleva la posición (fecha_registro, tipo, id) y el saldo acumulado hasta ella
+        valores = decodificar_cursor(cursor, [Entrada_Inventario.fecha_registro, literal(""), Entrada_Inventario.id,
+                                              Stock_Diario.cantidad, Stock_Diario.valor])
+        posicion, (saldo_cantidad, saldo_valor) = valores[:3], valores[3:]
+    else:
+        posicion = None
+        saldo_cantidad, saldo_valor = Stock_Diario.saldo_producto(producto_id, desde) if desde else (0, 0)
+
+    movimientos = union_all(*[_rama(tipo, modelo, documento, producto_id, desde, hasta, posicion, limite + 1)
+                              for tipo, modelo, documento in MOVIMIENTOS]).alias("movimientos")
+    orden = [movimientos.c.fecha_registro, movimientos.c.tipo, movimientos.c.id]
+
+    ventanas = soporta_ventanas()
+    columnas = [movimientos]
+    if ventanas:
+        columnas += [
+            db.func.sum(movimientos.c.variacion_cantidad).over(order_by=orden).label("acumulado_cantidad"),
+            db.func.sum(movimientos.c.variacion_valor).over(order_by=orden).label("acumulado_valor"),
+        ]
+    filas = db.session.execute(select(columnas).order_by(*orden).limit(limite + 1)).fetchall()
+
+    resultado = []
+    acumulado_cantidad, acumulado_valor = 0, 0
+    for fila in filas[:limite]:
+        if ventanas:
+            acumulado_cantidad, acumulado_valor = fila.acumulado_cantidad, fila.acumulado_valor
+        else:
+            acumulado_cantidad += fila.variacion_cantidad
+            acumulado_valor += fila.variacion_valor
+        resultado.append({
+            "tipo": fila.tipo,
+            "id": fila.id,
+            "fecha_registro": fila.fecha_registro,
+            "documento_id": fila.documento_id,
+            "cantidad": fila.cantidad,
+            "costo_unitario": fila.costo_unitario,
+            "costo_total": fila.costo_total,
+            "saldo_cantidad": saldo_cantidad + acumulado_cantidad,
+            "saldo_valor": saldo_valor + acumulado_valor,
+        })
+
+    siguiente = None
+    if len(filas) > limite:
+        ultima = resultado[-1]
+        siguiente = codificar_cursor([ultima["fecha_registro"], ultima["tipo"], ultima["id"],
+                                      ultima["saldo_cantidad"], ultima["saldo_valor"]])
+    return Pagina(resultado, siguiente)
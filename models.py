@@ -1,28 +1,103 @@
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from flask import current_app, has_app_context
 from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime
+from sqlalchemy import event, inspect
+
+from versiones import incrementar_version
+
 db = SQLAlchemy()
 
+# Con CARGA_ESTRICTA=1 (tests) cualquier relación no declarada en el plan de carga de la ruta
+# lanza error en vez de hacer un SELECT por fila (N+1).
+CARGA_PEREZOSA = "raise_on_sql" if os.environ.get("CARGA_ESTRICTA") else "select"
+
+# Costeo de las salidas: "promedio" (promedio ponderado) o "fifo" (capas de costo, ver Capa_Costo)
+VALORIZACION_INVENTARIO = "promedio"
+
+
+def valorizacion():
+    if has_app_context():
+        return current_app.config.get("VALORIZACION_INVENTARIO", VALORIZACION_INVENTARIO)
+    return VALORIZACION_INVENTARIO
+
+
+def serializar(objeto, campos=None, expandir=None):
+    # campos: columnas de CAMPOS a incluir (None = todas).
+    # expandir: {"relacion": {...anidadas}} de EXPANSIONES a incluir (None = las que el modelo incluye por defecto,
+    # que son todas las de EXPANSIONES).
+    formatos = getattr(objeto, "FORMATOS", {})
+    datos = {}
+    for campo in (objeto.CAMPOS if campos is None else campos):
+        valor = getattr(objeto, campo)
+        if valor is not None and campo in formatos:
+            valor = formatos[campo](valor)
+        datos[campo] = valor
+
+    expansiones = getattr(objeto, "EXPANSIONES", {})
+    if expandir is None:
+        expandir = dict.fromkeys(expansiones)
+    for clave, anidados in expandir.items():
+        relacionado = getattr(objeto, expansiones[clave])
+        if isinstance(relacionado, list):
+            datos[clave] = list(map(lambda hijo: hijo.serialize(expandir=anidados), relacionado))
+        else:
+            datos[clave] = relacionado.serialize(expandir=anidados) if relacionado is not None else None
+    return datos
+
+
+def opciones_carga(modelo, campos=None, expandir=None):
+    # Plan de carga que corresponde a serializar(): columnas pedidas y relaciones a expandir.
+    opciones = []
+    expansiones = getattr(modelo, "EXPANSIONES", {})
+    if expandir is None:
+        expandir = dict.fromkeys(expansiones)
+
+    if campos is not None:
+        columnas = set(campos) | {llave.key for llave in modelo.__mapper__.primary_key}
+        for clave in expandir:
+            relacion = getattr(modelo, expansiones[clave]).property
+            columnas |= {columna.key for columna in relacion.local_columns}
+        opciones.append(db.load_only(*columnas))
+
+    for ruta in _rutas_expansion(modelo, expandir):
+        opcion = None
+        for atributo in ruta:
+            if atributo.property.uselist:
+                opcion = db.selectinload(atributo) if opcion is None else opcion.selectinload(atributo)
+            else:
+                opcion = db.joinedload(atributo) if opcion is None else opcion.joinedload(atributo)
+        opciones.append(opcion)
+    return opciones
+
+
+def _rutas_expansion(modelo, expandir):
+    expansiones = getattr(modelo, "EXPANSIONES", {})
+    if expandir is None:
+        expandir = dict.fromkeys(expansiones)
+    rutas = []
+    for clave, anidados in expandir.items():
+        atributo = getattr(modelo, expansiones[clave])
+        hijas = _rutas_expansion(atributo.property.mapper.class_, anidados)
+        rutas.extend([[atributo] + hija for hija in hijas] or [[atributo]])
+    return rutas
+
 
 class Empresa(db.Model):
     __tablename__ = "empresas"
+    CAMPOS = ("id", "nombre", "rut", "razon_social", "rubro")
+    EXPANSIONES = {"usuarios": "usuarios"}
     id = db.Column(db.Integer, primary_key=True)
     nombre = db.Column(db.String(100), nullable=False)
     rut = db.Column(db.String(13), nullable=False, unique=True)
     razon_social = db.Column(db.String(100), nullable=False, unique=True)
     rubro = db.Column(db.String(100), nullable=False)
-    usuarios = db.relationship('Usuario', backref='empresa', lazy=True)
+    usuarios = db.relationship('Usuario', backref=db.backref('empresa', lazy=CARGA_PEREZOSA), lazy=CARGA_PEREZOSA, passive_deletes=True)
 
-    def serialize(self):
-        usuarios = self.usuarios
-        usuarios = list(map(lambda usuario: usuario.serialize(), usuarios))
-        return {
-            "id": self.id,
-            "nombre": self.nombre,
-            "rut": self.rut,
-            "razon_social": self.razon_social,
-            "rubro": self.rubro,
-            "usuarios": usuarios
-        }
+    def serialize(self, campos=None, expandir=None):
+        return serializar(self, campos, expandir)
 
     def save(self):
         db.session.add(self)
@@ -38,6 +113,9 @@ class Empresa(db.Model):
 
 class Usuario(db.Model):
     __tablename__ = "usuarios"
+    CAMPOS = ("id", "nombre", "apellido", "codigo", "rut", "rol", "email", "status", "fecha_registro",
+              "foto", "empresa_id")
+    FORMATOS = {"fecha_registro": lambda fecha: fecha.strftime("%Y-%m-%d")}
     id = db.Column(db.Integer, primary_key=True)
     nombre = db.Column(db.String(100), nullable=False)
     apellido = db.Column(db.String(100), nullable=False)
@@ -50,26 +128,13 @@ class Usuario(db.Model):
     fecha_registro = db.Column(db.DateTime, nullable=False, default=datetime.now)  # hora local
     foto = db.Column(db.String(100), default='without-photo.png')
     empresa_id = db.Column(db.Integer, db.ForeignKey("empresas.id"), nullable=False)
-    entradas = db.relationship('Entrada_Inventario', backref='usuario', lazy=True)
-    salidas = db.relationship('Salida_Inventario', backref='usuario', lazy=True)
-    cuadratura_usuario = db.relationship('Cuadratura_Caja', foreign_keys="[Cuadratura_Caja.usuario_id]", backref='usuario', lazy=True)
-    cuadratura_admin = db.relationship('Cuadratura_Caja', foreign_keys="[Cuadratura_Caja.admin_id]", backref='admin', lazy=True)
+    entradas = db.relationship('Entrada_Inventario', backref=db.backref('usuario', lazy=CARGA_PEREZOSA), lazy=CARGA_PEREZOSA, passive_deletes=True)
+    salidas = db.relationship('Salida_Inventario', backref=db.backref('usuario', lazy=CARGA_PEREZOSA), lazy=CARGA_PEREZOSA, passive_deletes=True)
+    cuadratura_usuario = db.relationship('Cuadratura_Caja', foreign_keys="[Cuadratura_Caja.usuario_id]", backref=db.backref('usuario', lazy=CARGA_PEREZOSA), lazy=CARGA_PEREZOSA, passive_deletes=True)
+    cuadratura_admin = db.relationship('Cuadratura_Caja', foreign_keys="[Cuadratura_Caja.admin_id]", backref=db.backref('admin', lazy=CARGA_PEREZOSA), lazy=CARGA_PEREZOSA, passive_deletes=True)
 
-    def serialize(self):
-        return {
-            "id": self.id,
-            "nombre": self.nombre,
-            "apellido": self.apellido,
-            "codigo": self.codigo,
-            "rut": self.rut,
-            "rol": self.rol,
-            "email": self.email,
-            "status": self.status,
-            "fecha_registro": self.fecha_registro.strftime("%Y-%m-%d"),
-            "foto": self.foto,
-            "empresa_id": self.empresa_id,
-            
-        }
+    def serialize(self, campos=None, expandir=None):
+        return serializar(self, campos, expandir)
 
     def save(self):
         db.session.add(self)
@@ -77,10 +142,12 @@ class Usuario(db.Model):
 
     def update(self):
         db.session.commit()
+        incrementar_version("usuarios")
 
     def delete(self):
         db.session.delete(self)
         db.session.commit()
+        incrementar_version("usuarios")
 
     def generaCodigo(self):
         return f"usr{self.id}"
@@ -88,29 +155,24 @@ class Usuario(db.Model):
 
 class Entrada_Inventario(db.Model):
     __tablename__ = "entradas_inventario"
+    __table_args__ = (db.Index("ix_entradas_inventario_kardex", "producto_id", "fecha_registro", "id"),)
+    SIGNO_STOCK = 1
+    CAMPOS = ("id", "cantidad", "precio_costo_unitario", "costo_total", "fecha_registro", "usuario_id",
+              "factura_compra_id", "producto_id")
+    EXPANSIONES = {"producto": "producto"}
     id = db.Column(db.Integer, primary_key=True)
     cantidad = db.Column(db.Float, nullable=False)
     precio_costo_unitario = db.Column(db.Float, nullable=False)
     costo_total = db.Column(db.Float, nullable=False)
-    fecha_registro = db.Column(db.DateTime, nullable=False, default=datetime.now)  # hora local
-    usuario_id = db.Column(db.Integer, db.ForeignKey("usuarios.id"), nullable=False)
-    factura_compra_id = db.Column(db.Integer, db.ForeignKey("facturas_compras.id"), nullable=False)
-    producto_id = db.Column(db.Integer, db.ForeignKey("productos.id"), nullable=False)
+    fecha_registro = db.Column(db.DateTime, nullable=False, default=datetime.now, index=True)  # hora local
+    usuario_id = db.Column(db.Integer, db.ForeignKey("usuarios.id"), nullable=False, index=True)
+    factura_compra_id = db.Column(db.Integer, db.ForeignKey("facturas_compras.id"), nullable=False, index=True)
+    producto_id = db.Column(db.Integer, db.ForeignKey("productos.id"), nullable=False)  # ver ix_*_kardex
     # producto_e = db.relationship("Producto", backref="entrada", lazy = True)
     # facturaC = db.relationship("Factura_Compra", backref= "entradas", lazy = True)
 
-    def serialize(self):
-        return{
-            "id": self.id,
-            "cantidad": self.cantidad,
-            "precio_costo_unitario": self.precio_costo_unitario,
-            "costo_total": self.costo_total,
-            "fecha_registro": self.fecha_registro,
-            "usuario_id": self.usuario_id,
-            "factura_compra_id": self.factura_compra_id,
-            "producto_id": self.producto_id,
-            "producto": self.producto.serialize()
-        }
+    def serialize(self, campos=None, expandir=None):
+        return serializar(self, campos, expandir)
 
     def save(self):
         db.session.add(self)
@@ -128,29 +190,23 @@ class Entrada_Inventario(db.Model):
 
 class Salida_Inventario(db.Model):
     __tablename__ = "salidas_inventario"
+    __table_args__ = (db.Index("ix_salidas_inventario_kardex", "producto_id", "fecha_registro", "id"),)
+    SIGNO_STOCK = -1
+    CAMPOS = ("id", "cantidad", "precio_costo_unitario", "precio_venta_unitario", "costo_total",
+              "fecha_registro", "usuario_id", "documento_venta_id", "producto_id")
     id = db.Column(db.Integer, primary_key=True)
     cantidad = db.Column(db.Float, nullable=False)
     precio_costo_unitario = db.Column(db.Float, nullable=False)
     precio_venta_unitario = db.Column(db.Float, nullable=False)
     costo_total = db.Column(db.Float, nullable=False)
     venta_total = db.Column(db.Float, nullable=False)
-    fecha_registro = db.Column(db.DateTime, nullable=False, default=datetime.now)  # hora local
-    usuario_id = db.Column(db.Integer, db.ForeignKey("usuarios.id"), nullable=False)
-    documento_venta_id = db.Column(db.Integer, db.ForeignKey("documentos_ventas.id"), nullable=False)
-    producto_id = db.Column(db.Integer, db.ForeignKey("productos.id"), nullable=False)
+    fecha_registro = db.Column(db.DateTime, nullable=False, default=datetime.now, index=True)  # hora local
+    usuario_id = db.Column(db.Integer, db.ForeignKey("usuarios.id"), nullable=False, index=True)
+    documento_venta_id = db.Column(db.Integer, db.ForeignKey("documentos_ventas.id"), nullable=False, index=True)
+    producto_id = db.Column(db.Integer, db.ForeignKey("productos.id"), nullable=False)  # ver ix_*_kardex
 
-    def serialize(self):
-        return {
-            "id": self.id,
-            "cantidad": self.cantidad,
-            "precio_costo_unitario": self.precio_costo_unitario,
-            "precio_venta_unitario": self.precio_venta_unitario,
-            "costo_total": self.costo_total,
-            "fecha_registro": self.fecha_registro,
-            "usuario_id": self.usuario_id,
-            "documento_venta_id": self.documento_venta_id,
-            "producto_id": self.producto_id
-        }
+    def serialize(self, campos=None, expandir=None):
+        return serializar(self, campos, expandir)
 
     def save(self):
         db.session.add(self)
@@ -169,30 +225,23 @@ class Salida_Inventario(db.Model):
 
 class Factura_Compra(db.Model):
     __tablename__ = "facturas_compras"
+    __table_args__ = (db.UniqueConstraint("folio", "proveedor_id"),)
+    CAMPOS = ("id", "folio", "fecha_emision", "fecha_recepcion", "monto_neto", "monto_iva",
+              "monto_otros_impuestos", "monto_total", "proveedor_id")
+    EXPANSIONES = {"entradas_inventario": "entradas_I"}
     id = db.Column(db.Integer, primary_key=True)
     folio = db.Column(db.Integer, nullable=False)
-    fecha_emision = db.Column(db.DateTime, nullable=False)
-    fecha_recepcion = db.Column(db.DateTime, nullable=False)
+    fecha_emision = db.Column(db.DateTime, nullable=False, index=True)
+    fecha_recepcion = db.Column(db.DateTime, nullable=False, index=True)
     monto_neto = db.Column(db.Float, nullable=False)
     monto_iva = db.Column(db.Float, nullable=False)
     monto_otros_impuestos = db.Column(db.Float, nullable=False)
     monto_total = db.Column(db.Float, nullable=False)
     proveedor_id = db.Column(db.Integer, nullable=False)
-    entradas_I = db.relationship("Entrada_Inventario", backref="factura", lazy=True)
+    entradas_I = db.relationship("Entrada_Inventario", backref=db.backref("factura", lazy=CARGA_PEREZOSA), lazy=CARGA_PEREZOSA)
 
-    def serialize(self):
-        return {
-            "id": self.id,
-            "folio": self.folio,
-            "fecha_emision": self.fecha_emision,
-            "fecha_recepcion": self.fecha_recepcion,
-            "monto_neto": self.monto_neto,
-            "monto_iva": self.monto_iva,
-            "monto_otros_impuestos": self.monto_otros_impuestos,
-            "monto_total": self.monto_total,
-            "proveedor_id": self.proveedor_id,
-            "entradas_inventario": list(map(lambda entrada_I: entrada_I.serialize(), self.entradas_I))
-        }
+    def serialize(self, campos=None, expandir=None):
+        return serializar(self, campos, expandir)
 
     def save(self):
         db.session.add(self)
@@ -208,6 +257,8 @@ class Factura_Compra(db.Model):
 
 class Producto(db.Model):
     __tablename__ = "productos"
+    CAMPOS = ("id", "sku", "descripcion", "codigo_barra", "unidad_entrega", "categoria_id",
+              "precio_venta_unitario", "margen_contribucion")
     id = db.Column(db.Integer, primary_key=True)
     sku = db.Column(db.String(100), nullable=False, unique=True)
     descripcion = db.Column(db.String(100), nullable=False)
@@ -216,89 +267,76 @@ class Producto(db.Model):
     categoria_id = db.Column(db.Integer, db.ForeignKey("categorias.id"), nullable=False)
     precio_venta_unitario = db.Column(db.Float, nullable=True)
     margen_contribucion = db.Column(db.Float, nullable=True)
-    entradasI = db.relationship("Entrada_Inventario", foreign_keys="[Entrada_Inventario.producto_id]", backref="producto", lazy=True)
-    salidasI = db.relationship("Salida_Inventario", foreign_keys="[Salida_Inventario.producto_id]", backref="producto", lazy=True)
-    
-    def serialize(self):
-        return {
-            "id": self.id,
-            "sku": self.sku,
-            "descripcion": self.descripcion,
-            "codigo_barra": self.codigo_barra,
-            "unidad_entrega": self.unidad_entrega,
-            "categoria_id": self.categoria_id,
-            "precio_venta_unitario": self.precio_venta_unitario,
-            "margen_contribucion": self.margen_contribucion,
-        }
+    entradasI = db.relationship("Entrada_Inventario", foreign_keys="[Entrada_Inventario.producto_id]", backref=db.backref("producto", lazy=CARGA_PEREZOSA), lazy=CARGA_PEREZOSA, passive_deletes=True)
+    salidasI = db.relationship("Salida_Inventario", foreign_keys="[Salida_Inventario.producto_id]", backref=db.backref("producto", lazy=CARGA_PEREZOSA), lazy=CARGA_PEREZOSA, passive_deletes=True)
+    stock = db.relationship("Stock_Producto", backref=db.backref("producto", lazy=CARGA_PEREZOSA), lazy=CARGA_PEREZOSA, uselist=False, cascade="all, delete-orphan")
+
+    def serialize(self, campos=None, expandir=None):
+        return serializar(self, campos, expandir)
 
-    def serialize_stock(self):
-        # entradas = list(map(lambda entrada: entrada.serialize(), self.entradasI))
-        # salidas = list(map(lambda salida: salida.serialize(), self.salidasI))
-        total_entrada = 0
-        total_salida = 0
+    def serialize_stock(self, saldo=None):
+        # El saldo actual se mantiene en Stock_Producto, ver actualizar_stock().
+        # saldo permite entregar un saldo histórico (cantidad, valor), ver Stock_Diario.saldos_al()
         # costo_neto_unitario = 0
         # costo_neto_total = 0
+        if saldo is None:
+            cantidad = self.stock.cantidad if self.stock else 0
+        else:
+            cantidad = saldo[0]
 
-        for entrada in self.entradasI:
-            total_entrada = total_entrada + entrada.cantidad
-        
-        for salida in self.salidasI:
-            total_salida = total_salida + salida.cantidad
-
-        return {
+        datos = {
             "id": self.id,
             "sku": self.sku,
             "descripcion": self.descripcion,
             "codigo_barra": self.codigo_barra,
-            "inventario_disponible": (total_entrada - total_salida),
+            "inventario_disponible": cantidad,
             "unidad_entrega": self.unidad_entrega,
             # "costo_neto_unitario": (costo_neto_unitario / total_entrada if total_entrada > 0 else 0),
             # "costo_neto_total":((costo_neto_unitario / total_entrada) * (total_entrada - total_salida) if total_entrada > 0 else 0),
             "categoria_id": self.categoria_id,
             "precio_venta_unitario": self.precio_venta_unitario,
             # "margen_contribucion": self.margen_contribucion,
-            # "entradas": entradas,
-            # "salidas": salidas
         }
+        if saldo is not None:
+            datos["valor_inventario"] = saldo[1]
+        return datos
 
     def save(self):
         db.session.add(self)
         db.session.commit()
+        incrementar_version("productos")
 
     def update(self):
         db.session.commit()
+        incrementar_version("productos")
 
     def delete(self):
         db.session.delete(self)
         db.session.commit()
+        incrementar_version("productos")
 
 
 class Documento_Venta(db.Model):
     __tablename__ = "documentos_ventas"
+    __table_args__ = (db.UniqueConstraint("tipo_documento", "numero_documento"),
+                      db.Index("ix_documentos_ventas_cajero", "usuario_id", "fecha_emision"))
+    CAMPOS = ("id", "tipo_documento", "numero_documento", "fecha_emision", "monto_neto", "monto_iva",
+              "monto_otros_impuestos", "monto_total", "forma_pago", "usuario_id")
+    EXPANSIONES = {"salidas_inventario": "salidas_I"}
     id = db.Column(db.Integer, primary_key=True)
     tipo_documento = db.Column(db.String(100), nullable=False)
     numero_documento = db.Column(db.Integer, nullable=False)
-    fecha_emision = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    fecha_emision = db.Column(db.DateTime, nullable=False, default=datetime.now, index=True)
     monto_neto = db.Column(db.Float, nullable=False)
     monto_iva = db.Column(db.Float, nullable=False)
     monto_otros_impuestos = db.Column(db.Float, nullable=True)
     monto_total = db.Column(db.Float, nullable=False)
     forma_pago = db.Column(db.String(100), nullable=False)
-    salidas_I = db.relationship("Salida_Inventario", backref="documento_venta", lazy=True)
+    usuario_id = db.Column(db.Integer, db.ForeignKey("usuarios.id"), nullable=True)  # cajero que emitió
+    salidas_I = db.relationship("Salida_Inventario", backref=db.backref("documento_venta", lazy=CARGA_PEREZOSA), lazy=CARGA_PEREZOSA)
 
-    def serialize(self):
-        return {
-            "id": self.id,
-            "tipo_documento": self.tipo_documento,
-            "numero_documento": self.numero_documento,
-            "fecha_emision": self.fecha_emision,
-            "monto_neto": self.monto_neto,
-            "monto_iva": self.monto_iva,
-            "monto_otros_impuestos": self.monto_otros_impuestos,
-            "monto_total": self.monto_total,
-            "forma_pago": self.forma_pago,
-            "salidas_inventario": list(map(lambda salida_I : salida_I.serialize(), self.salidas_I))
-        }
+    def serialize(self, campos=None, expandir=None):
+        return serializar(self, campos, expandir)
 
     def save(self):
         db.session.add(self)
@@ -313,6 +351,7 @@ class Documento_Venta(db.Model):
 
 class Proveedor(db.Model):
     __tablename__ = "proveedores"
+    CAMPOS = ("id", "nombre", "rut", "razon_social", "rubro", "direccion", "cuenta_corriente", "banco")
     id = db.Column(db.Integer, primary_key=True)
     nombre = db.Column(db.String(100), nullable=False)
     rut = db.Column(db.String(13), nullable=False, unique=True)
@@ -323,48 +362,42 @@ class Proveedor(db.Model):
     banco = db.Column(db.String(100), nullable=True)
     # facturaC = db.relationship("Factura_Compra", foreign_keys="[Factura_Compra.proveedor_id]", backref = "proveedor", lazy = True, uselist = False)
 
-    def serialize(self):
-        return {
-            "id": self.id,
-            "nombre": self.nombre,
-            "rut": self.rut,
-            "razon_social": self.razon_social,
-            "rubro": self.rubro,
-            "direccion": self.direccion,
-            "cuenta_corriente": self.cuenta_corriente,
-            "banco": self.banco
-        }
-        
+    def serialize(self, campos=None, expandir=None):
+        return serializar(self, campos, expandir)
+
     def save(self):
         db.session.add(self)
         db.session.commit()
+        incrementar_version("proveedores")
 
     def update(self):
         db.session.commit()
+        incrementar_version("proveedores")
 
     def delete(self):
         db.session.delete(self)
         db.session.commit()
+        incrementar_version("proveedores")
 
 
 class Categoria(db.Model):
     __tablename__ = "categorias"
+    CAMPOS = ("id", "nombre")
     id = db.Column(db.Integer, primary_key=True)
     nombre = db.Column(db.String(100), nullable=False, unique=True)
-    productos = db.relationship("Producto", backref="categoria", lazy=True)
+    productos = db.relationship("Producto", backref=db.backref("categoria", lazy=CARGA_PEREZOSA), lazy=CARGA_PEREZOSA)
 
-    def serialize(self):
-        return {
-            "id": self.id,
-            "nombre": self.nombre
-        }
+    def serialize(self, campos=None, expandir=None):
+        return serializar(self, campos, expandir)
 
     def save(self):
         db.session.add(self)
         db.session.commit()
+        incrementar_version("categorias")
 
     def update(self):
         db.session.commit()
+        incrementar_version("categorias")
 
     def delete(self):
         pass
@@ -372,11 +405,14 @@ class Categoria(db.Model):
 
 class Cuadratura_Caja(db.Model):
     __tablename__ = "cuadraturas_cajas"
+    CAMPOS = ("id", "usuario_id", "admin_id", "fecha_apertura", "fecha_cierre", "monto_apertura",
+              "monto_transferencia", "monto_efectivo", "monto_tarjeta", "monto_cierre",
+              "diferencia_en_caja")
     id = db.Column(db.Integer, primary_key=True)
-    usuario_id = db.Column(db.Integer, db.ForeignKey("usuarios.id"), nullable=False)
-    admin_id = db.Column(db.Integer, db.ForeignKey("usuarios.id"), nullable=False)
-    fecha_apertura = db.Column(db.DateTime, nullable=False, default=datetime.now)  # hora local
-    fecha_cierre = db.Column(db.DateTime, nullable=False, default=datetime.now)  # hora local
+    usuario_id = db.Column(db.Integer, db.ForeignKey("usuarios.id"), nullable=False, index=True)
+    admin_id = db.Column(db.Integer, db.ForeignKey("usuarios.id"), nullable=False, index=True)
+    fecha_apertura = db.Column(db.DateTime, nullable=False, default=datetime.now, index=True)  # hora local
+    fecha_cierre = db.Column(db.DateTime, nullable=False, default=datetime.now, index=True)  # hora local
     monto_apertura = db.Column(db.Float, nullable=False)
     monto_transferencia = db.Column(db.Float, nullable=False)
     monto_efectivo = db.Column(db.Float, nullable=False)
@@ -384,27 +420,742 @@ class Cuadratura_Caja(db.Model):
     monto_cierre = db.Column(db.Float, nullable=False)
     diferencia_en_caja = db.Column(db.Float, nullable=False)
 
+    def serialize(self, campos=None, expandir=None):
+        return serializar(self, campos, expandir)
+
+    def save(self):
+        db.session.add(self)
+        db.session.commit()
+
+    def update(self):
+        pass
+
+    def delete(self):
+        pass
+
+
+class Sesion_Caja(db.Model):
+    # Turno de un cajero desde la apertura validada por un administrador hasta la cuadratura.
+    # Los montos por forma de pago se acumulan con cada venta, ver actualizar_sesion_caja().
+    __tablename__ = "sesiones_caja"
+    __table_args__ = (db.Index("ix_sesiones_caja_abiertas", "usuario_id", "estado"),)
+    FORMAS_PAGO = {"efectivo": "monto_efectivo", "tarjeta": "monto_tarjeta", "transferencia": "monto_transferencia"}
+    id = db.Column(db.Integer, primary_key=True)
+    usuario_id = db.Column(db.Integer, db.ForeignKey("usuarios.id"), nullable=False)
+    admin_id = db.Column(db.Integer, db.ForeignKey("usuarios.id"), nullable=False)
+    estado = db.Column(db.String(20), nullable=False, default="abierta")  # abierta o cerrada
+    fecha_apertura = db.Column(db.DateTime, nullable=False, default=datetime.now)  # hora local
+    fecha_cierre = db.Column(db.DateTime)
+    monto_apertura = db.Column(db.Float, nullable=False, default=0)
+    monto_efectivo = db.Column(db.Float, nullable=False, default=0)
+    monto_tarjeta = db.Column(db.Float, nullable=False, default=0)
+    monto_transferencia = db.Column(db.Float, nullable=False, default=0)
+    monto_otros = db.Column(db.Float, nullable=False, default=0)
+    cantidad_ventas = db.Column(db.Integer, nullable=False, default=0)
+    cuadratura_caja_id = db.Column(db.Integer, db.ForeignKey("cuadraturas_cajas.id"))
+
     def serialize(self):
         return {
             "id": self.id,
             "usuario_id": self.usuario_id,
             "admin_id": self.admin_id,
+            "estado": self.estado,
             "fecha_apertura": self.fecha_apertura,
             "fecha_cierre": self.fecha_cierre,
             "monto_apertura": self.monto_apertura,
-            "monto_transferencia": self.monto_transferencia,
-            "monto_efectivo": self.monto_efectivo,
-            "monto_tarjeta": self.monto_tarjeta,
-            "monto_cierre": self.monto_cierre,
-            "diferencia_en_caja": self.diferencia_en_caja
+            "cuadratura_caja_id": self.cuadratura_caja_id
         }
-    
+
     def save(self):
         db.session.add(self)
         db.session.commit()
 
     def update(self):
-        pass
+        db.session.commit()
 
-    def delete(self):
-        pass
+    @staticmethod
+    def abierta(usuario_id):
+        return Sesion_Caja.query.filter_by(usuario_id=usuario_id, estado="abierta").first()
+
+    @staticmethod
+    def columna_forma_pago(forma_pago):
+        return Sesion_Caja.FORMAS_PAGO.get((forma_pago or "").strip().lower(), "monto_otros")
+
+    def esperado(self):
+        # Desde los contadores: no depende de cuántas ventas tuvo el turno
+        return Sesion_Caja._totales(self.monto_efectivo, self.monto_tarjeta, self.monto_transferencia,
+                                    self.monto_otros, self.cantidad_ventas, self.monto_apertura)
+
+    def esperado_por_consulta(self, hasta=None):
+        # Respaldo: suma los documentos del cajero desde la apertura (índice usuario_id, fecha_emision)
+        return Sesion_Caja.totales_entre(self.usuario_id, self.fecha_apertura, hasta or datetime.now(),
+                                         self.monto_apertura)
+
+    @staticmethod
+    def totales_entre(usuario_id, desde, hasta, monto_apertura=0):
+        montos = dict.fromkeys(("monto_efectivo", "monto_tarjeta", "monto_transferencia", "monto_otros"), 0)
+        cantidad = 0
+        filas = db.session.query(Documento_Venta.forma_pago, db.func.sum(Documento_Venta.monto_total),
+                                 db.func.count(Documento_Venta.id)) \
+            .filter(Documento_Venta.usuario_id == usuario_id,
+                    Documento_Venta.fecha_emision >= desde, Documento_Venta.fecha_emision <= hasta) \
+            .group_by(Documento_Venta.forma_pago)
+        for forma_pago, total, documentos in filas:
+            montos[Sesion_Caja.columna_forma_pago(forma_pago)] += total or 0
+            cantidad += documentos
+        return Sesion_Caja._totales(montos["monto_efectivo"], montos["monto_tarjeta"], montos["monto_transferencia"],
+                                    montos["monto_otros"], cantidad, monto_apertura)
+
+    @staticmethod
+    def _totales(efectivo, tarjeta, transferencia, otros, cantidad_ventas, monto_apertura):
+        return {
+            "monto_efectivo": efectivo,
+            "monto_tarjeta": tarjeta,
+            "monto_transferencia": transferencia,
+            "monto_otros": otros,
+            "monto_total": efectivo + tarjeta + transferencia + otros,
+            "cantidad_ventas": cantidad_ventas,
+            "efectivo_en_caja": (monto_apertura or 0) + efectivo
+        }
+
+
+class Stock_Producto(db.Model):
+    __tablename__ = "stock_productos"
+    producto_id = db.Column(db.Integer, db.ForeignKey("productos.id"), primary_key=True)
+    cantidad = db.Column(db.Float, nullable=False, default=0)
+    costo_promedio = db.Column(db.Float, nullable=False, default=0)  # costo unitario promedio ponderado
+    fecha_actualizacion = db.Column(db.DateTime, nullable=False, default=datetime.now, onupdate=datetime.now)  # hora local
+
+    def serialize(self):
+        return {
+            "producto_id": self.producto_id,
+            "cantidad": self.cantidad,
+            "costo_promedio": self.costo_promedio,
+            "fecha_actualizacion": self.fecha_actualizacion
+        }
+
+    @staticmethod
+    def promediar(existencia, promedio, cantidad, costo_unitario):
+        # Nuevo promedio al ingresar 'cantidad' a 'costo_unitario'. Un saldo negativo no pondera.
+        existencia = max(existencia, 0)
+        if existencia + cantidad <= 0:
+            return promedio
+        return (existencia * promedio + cantidad * costo_unitario) / (existencia + cantidad)
+
+    @staticmethod
+    def recalcular_costo(productos):
+        # Repite los movimientos de cada producto en orden para corregir el promedio y el costo de
+        # cada salida, después de editar una compra ya registrada. En modo fifo también rearma
+        # las capas de costo. No hace commit.
+        fifo = valorizacion() == "fifo"
+        for producto_id in productos:
+            movimientos = Entrada_Inventario.query.filter_by(producto_id=producto_id).all() + \
+                Salida_Inventario.query.filter_by(producto_id=producto_id).all()
+            movimientos.sort(key=lambda movimiento: (movimiento.fecha_registro or datetime.now(),
+                                                     -movimiento.SIGNO_STOCK, movimiento.id or 0))
+            if fifo:
+                Capa_Costo.query.filter_by(producto_id=producto_id).delete(synchronize_session="fetch")
+                capas = Cola_Capas()
+
+            existencia, promedio = 0, 0
+            for movimiento in movimientos:
+                if movimiento.SIGNO_STOCK > 0:
+                    promedio = Stock_Producto.promediar(existencia, promedio, movimiento.cantidad,
+                                                        movimiento.precio_costo_unitario)
+                    if fifo:
+                        capa = Capa_Costo.desde_entrada(movimiento)
+                        db.session.add(capa)
+                        capas.agregar(capa)
+                else:
+                    costo = capas.consumir(movimiento.cantidad, promedio) if fifo else promedio
+                    if movimiento.precio_costo_unitario != costo:
+                        movimiento.precio_costo_unitario = costo
+                        movimiento.costo_total = movimiento.genera_costo_total()
+                existencia += movimiento.SIGNO_STOCK * movimiento.cantidad
+
+            stock = Stock_Producto.query.get(producto_id)
+            if stock is None:
+                stock = Stock_Producto(producto_id=producto_id, cantidad=existencia)
+                db.session.add(stock)
+            stock.costo_promedio = promedio
+
+    @staticmethod
+    def verificar(reparar=False):
+        # Compara el saldo guardado con la suma de las entradas y salidas de inventario.
+        # Con reparar=True sobreescribe los saldos que no cuadren.
+        entradas = dict(db.session.query(Entrada_Inventario.producto_id, db.func.sum(Entrada_Inventario.cantidad))
+                        .group_by(Entrada_Inventario.producto_id))
+        salidas = dict(db.session.query(Salida_Inventario.producto_id, db.func.sum(Salida_Inventario.cantidad))
+                       .group_by(Salida_Inventario.producto_id))
+        stocks = {stock.producto_id: stock for stock in Stock_Producto.query.all()}
+
+        diferencias = []
+        for producto_id in set(entradas) | set(salidas) | set(stocks):
+            esperado = (entradas.get(producto_id) or 0) - (salidas.get(producto_id) or 0)
+            stock = stocks.get(producto_id)
+            registrado = stock.cantidad if stock else None
+            if registrado is not None and abs(registrado - esperado) < 1e-6:
+                continue
+            diferencias.append({"producto_id": producto_id, "registrado": registrado, "esperado": esperado})
+            if reparar:
+                if stock is None:
+                    stock = Stock_Producto(producto_id=producto_id)
+                    db.session.add(stock)
+                stock.cantidad = esperado
+
+        if reparar and diferencias:
+            db.session.commit()
+        return diferencias
+
+
+class Capa_Costo(db.Model):
+    # Una capa por entrada de inventario con lo que queda sin vender; las salidas en modo fifo
+    # consumen las capas abiertas de la más antigua a la más nueva
+    __tablename__ = "capas_costo"
+    __table_args__ = (db.Index("ix_capas_costo_abiertas", "producto_id", "fecha", "id"),)
+    id = db.Column(db.Integer, primary_key=True)
+    producto_id = db.Column(db.Integer, db.ForeignKey("productos.id"), nullable=False)
+    entrada_id = db.Column(db.Integer, db.ForeignKey("entradas_inventario.id", ondelete="CASCADE"), nullable=False,
+                           unique=True)
+    fecha = db.Column(db.DateTime, nullable=False)  # fecha_registro de la entrada
+    costo_unitario = db.Column(db.Float, nullable=False)
+    cantidad_inicial = db.Column(db.Float, nullable=False)
+    cantidad_restante = db.Column(db.Float, nullable=False)
+    entrada = db.relationship("Entrada_Inventario", backref=db.backref("capa", uselist=False, lazy=CARGA_PEREZOSA, passive_deletes=True), lazy=CARGA_PEREZOSA)
+
+    def serialize(self):
+        return {
+            "id": self.id,
+            "producto_id": self.producto_id,
+            "entrada_id": self.entrada_id,
+            "fecha": self.fecha,
+            "costo_unitario": self.costo_unitario,
+            "cantidad_inicial": self.cantidad_inicial,
+            "cantidad_restante": self.cantidad_restante
+        }
+
+    @staticmethod
+    def desde_entrada(entrada):
+        capa = Capa_Costo(producto_id=entrada.producto_id, fecha=entrada.fecha_registro or datetime.now(),
+                          costo_unitario=entrada.precio_costo_unitario,
+                          cantidad_inicial=entrada.cantidad, cantidad_restante=entrada.cantidad)
+        if entrada.id is None:
+            capa.entrada = entrada  # entrada_id se asigna al insertar la entrada en el mismo flush
+        else:
+            capa.entrada_id = entrada.id
+        return capa
+
+    @staticmethod
+    def abiertas(session, producto_id, lote=20):
+        # Capas con saldo en orden FIFO, leídas y bloqueadas de a 'lote' a medida que se necesitan
+        ultima = None
+        while True:
+            consulta = session.query(Capa_Costo) \
+                .filter(Capa_Costo.producto_id == producto_id, Capa_Costo.cantidad_restante > 0)
+            if ultima is not None:
+                consulta = consulta.filter(db.or_(Capa_Costo.fecha > ultima.fecha,
+                                                  db.and_(Capa_Costo.fecha == ultima.fecha, Capa_Costo.id > ultima.id)))
+            capas = consulta.order_by(Capa_Costo.fecha, Capa_Costo.id).limit(lote).with_for_update().all()
+            yield from capas
+            if len(capas) < lote:
+                return
+            ultima = capas[-1]
+
+
+class Cola_Capas:
+    # Capas de un producto en orden FIFO: las guardadas se leen a demanda y las nuevas de la misma
+    # transacción van al final
+    def __init__(self, guardadas=()):
+        self.guardadas = iter(guardadas)
+        self.nuevas = []
+        self.actual = None
+        self.ultimo_costo = None
+
+    def agregar(self, capa):
+        self.nuevas.append(capa)
+
+    def _siguiente(self):
+        capa = next(self.guardadas, None)
+        if capa is None and self.nuevas:
+            capa = self.nuevas.pop(0)
+        return capa
+
+    def consumir(self, cantidad, respaldo):
+        # Devuelve el costo unitario de sacar 'cantidad'. Lo que falte por falta de capas (stock
+        # negativo) se costea al costo de la última capa o, si no hay ninguna, a 'respaldo'.
+        pendiente, costo = cantidad, 0
+        while pendiente > 1e-9:
+            if self.actual is None or self.actual.cantidad_restante <= 1e-9:
+                self.actual = self._siguiente()
+                if self.actual is None:
+                    break
+                self.ultimo_costo = self.actual.costo_unitario
+            tomado = min(pendiente, self.actual.cantidad_restante)
+            self.actual.cantidad_restante = self.actual.cantidad_restante - tomado
+            costo += tomado * self.actual.costo_unitario
+            pendiente -= tomado
+        if pendiente > 1e-9:
+            costo += pendiente * (self.ultimo_costo if self.ultimo_costo is not None else respaldo)
+        return costo / cantidad if cantidad else 0
+
+
+class Stock_Diario(db.Model):
+    __tablename__ = "stock_diario"
+    __table_args__ = (db.UniqueConstraint("fecha", "producto_id"),)
+    id = db.Column(db.Integer, primary_key=True)
+    fecha = db.Column(db.Date, nullable=False, index=True)  # saldo al cierre del día
+    producto_id = db.Column(db.Integer, db.ForeignKey("productos.id"), nullable=False)
+    cantidad = db.Column(db.Float, nullable=False)
+    valor = db.Column(db.Float, nullable=False)
+
+    def serialize(self):
+        return {
+            "id": self.id,
+            "fecha": self.fecha.strftime("%Y-%m-%d"),
+            "producto_id": self.producto_id,
+            "cantidad": self.cantidad,
+            "valor": self.valor
+        }
+
+    @staticmethod
+    def ultima_fecha(hasta=None):
+        consulta = db.session.query(db.func.max(Stock_Diario.fecha))
+        if hasta is not None:
+            consulta = consulta.filter(Stock_Diario.fecha <= hasta)
+        return consulta.scalar()
+
+    @staticmethod
+    def saldos_al(fecha):
+        # Saldo (cantidad, valor) por producto al cierre de 'fecha': parte de la foto diaria más
+        # cercana y solo suma los movimientos registrados después de ella.
+        fecha_foto = Stock_Diario.ultima_fecha(hasta=fecha)
+        saldos = {}
+        desde = None
+        if fecha_foto is not None:
+            fotos = Stock_Diario.query.filter_by(fecha=fecha_foto).all()
+            saldos = {foto.producto_id: [foto.cantidad, foto.valor] for foto in fotos}
+            desde = datetime.combine(fecha_foto + timedelta(days=1), datetime.min.time())
+
+        hasta = datetime.combine(fecha + timedelta(days=1), datetime.min.time())
+        for producto_id, (cantidad, valor) in _movimientos_entre(desde, hasta).items():
+            saldo = saldos.setdefault(producto_id, [0, 0])
+            saldo[0] += cantidad
+            saldo[1] += valor
+        return saldos
+
+    @staticmethod
+    def saldo_producto(producto_id, antes_de):
+        # Saldo (cantidad, valor) de un producto con los movimientos anteriores a 'antes_de' (datetime)
+        fecha_foto = Stock_Diario.ultima_fecha(hasta=antes_de.date() - timedelta(days=1))
+        cantidad, valor, desde = 0, 0, None
+        if fecha_foto is not None:
+            foto = Stock_Diario.query.filter_by(fecha=fecha_foto, producto_id=producto_id).first()
+            if foto:
+                cantidad, valor = foto.cantidad, foto.valor
+            desde = datetime.combine(fecha_foto + timedelta(days=1), datetime.min.time())
+
+        movimiento_cantidad, movimiento_valor = _movimientos_producto(producto_id, desde, antes_de)
+        return cantidad + movimiento_cantidad, valor + movimiento_valor
+
+    @staticmethod
+    def corregir(productos, desde):
+        # Rehace las fotos desde 'desde' (inclusive) de los productos indicados, después de editar
+        # movimientos que ya estaban incluidos en ellas. Avanza día a día apoyándose en la foto
+        # anterior ya corregida. No hace commit.
+        fechas = [fecha for (fecha,) in db.session.query(Stock_Diario.fecha)
+                  .filter(Stock_Diario.fecha >= desde).distinct().order_by(Stock_Diario.fecha)]
+        for fecha in fechas:
+            inicio = datetime.combine(fecha, datetime.min.time())
+            saldos = {}
+            for producto_id in productos:
+                cantidad, valor = Stock_Diario.saldo_producto(producto_id, inicio)
+                movimiento_cantidad, movimiento_valor = \
+                    _movimientos_producto(producto_id, inicio, inicio + timedelta(days=1))
+                saldos[producto_id] = (cantidad + movimiento_cantidad, valor + movimiento_valor)
+            Stock_Diario.query.filter(Stock_Diario.fecha == fecha, Stock_Diario.producto_id.in_(productos)) \
+                .delete(synchronize_session=False)
+            for producto_id, (cantidad, valor) in saldos.items():
+                if abs(cantidad) < 1e-9 and abs(valor) < 1e-9:
+                    continue
+                db.session.add(Stock_Diario(fecha=fecha, producto_id=producto_id, cantidad=cantidad, valor=valor))
+
+    @staticmethod
+    def cerrar(fecha):
+        # Guarda la foto de cierre de 'fecha'. Se puede volver a ejecutar para el mismo día.
+        saldos = Stock_Diario.saldos_al(fecha)
+        Stock_Diario.query.filter_by(fecha=fecha).delete()
+        for producto_id, (cantidad, valor) in saldos.items():
+            if abs(cantidad) < 1e-9 and abs(valor) < 1e-9:
+                continue  # sin fila equivale a saldo cero
+            db.session.add(Stock_Diario(fecha=fecha, producto_id=producto_id, cantidad=cantidad, valor=valor))
+        db.session.commit()
+        return len(saldos)
+
+
+class Venta_Diaria(db.Model):
+    # Ventas acumuladas por día, producto, categoría y forma de pago, ver actualizar_ventas_diarias()
+    __tablename__ = "ventas_diarias"
+    __table_args__ = (db.UniqueConstraint("fecha", "producto_id", "categoria_id", "forma_pago"),)
+    AGRUPACIONES = ("fecha", "producto_id", "categoria_id", "forma_pago")
+    id = db.Column(db.Integer, primary_key=True)
+    fecha = db.Column(db.Date, nullable=False, index=True)
+    producto_id = db.Column(db.Integer, db.ForeignKey("productos.id"), nullable=False)
+    categoria_id = db.Column(db.Integer, db.ForeignKey("categorias.id"), nullable=False)
+    forma_pago = db.Column(db.String(100), nullable=False)
+    cantidad = db.Column(db.Float, nullable=False, default=0)
+    venta_neta = db.Column(db.Float, nullable=False, default=0)
+    costo = db.Column(db.Float, nullable=False, default=0)
+
+    @staticmethod
+    def resumen(desde, hasta, agrupar, filtros=None):
+        # Totales entre desde y hasta (ambos inclusive) agrupados por las columnas de 'agrupar'
+        columnas = [getattr(Venta_Diaria, columna) for columna in agrupar]
+        consulta = db.session.query(*columnas,
+                                    db.func.sum(Venta_Diaria.cantidad),
+                                    db.func.sum(Venta_Diaria.venta_neta),
+                                    db.func.sum(Venta_Diaria.costo)) \
+            .filter(Venta_Diaria.fecha >= desde, Venta_Diaria.fecha <= hasta)
+        for columna, valor in (filtros or {}).items():
+            consulta = consulta.filter(getattr(Venta_Diaria, columna) == valor)
+
+        resultado = []
+        for fila in consulta.group_by(*columnas).order_by(*columnas):
+            datos = dict(zip(agrupar, fila))
+            if "fecha" in datos:
+                datos["fecha"] = datos["fecha"].strftime("%Y-%m-%d")
+            cantidad, venta_neta, costo = fila[len(agrupar):]
+            datos.update({"cantidad": cantidad or 0, "venta_neta": venta_neta or 0, "costo": costo or 0,
+                          "margen": (venta_neta or 0) - (costo or 0)})
+            resultado.append(datos)
+        return resultado
+
+    @staticmethod
+    def reconstruir():
+        # Vuelve a calcular la tabla completa desde las salidas de inventario (carga inicial o reparación)
+        fecha = db.func.date(Salida_Inventario.fecha_registro)
+        totales = db.session.query(fecha, Salida_Inventario.producto_id, Producto.categoria_id,
+                                   Documento_Venta.forma_pago,
+                                   db.func.sum(Salida_Inventario.cantidad),
+                                   db.func.sum(Salida_Inventario.venta_total),
+                                   db.func.sum(Salida_Inventario.costo_total)) \
+            .join(Producto, Producto.id == Salida_Inventario.producto_id) \
+            .join(Documento_Venta, Documento_Venta.id == Salida_Inventario.documento_venta_id) \
+            .group_by(fecha, Salida_Inventario.producto_id, Producto.categoria_id, Documento_Venta.forma_pago) \
+            .all()
+
+        Venta_Diaria.query.delete()
+        filas = []
+        for dia, producto_id, categoria_id, forma_pago, cantidad, venta_neta, costo in totales:
+            if isinstance(dia, str):
+                dia = datetime.strptime(dia, "%Y-%m-%d").date()  # SQLite devuelve texto
+            filas.append({"fecha": dia, "producto_id": producto_id, "categoria_id": categoria_id,
+                          "forma_pago": forma_pago, "cantidad": cantidad or 0, "venta_neta": venta_neta or 0,
+                          "costo": costo or 0})
+        db.session.bulk_insert_mappings(Venta_Diaria, filas)
+        db.session.commit()
+        return len(filas)
+
+
+class Correo_Saliente(db.Model):
+    # Bandeja de salida: los endpoints solo insertan aquí y el comando enviar_correos los despacha
+    __tablename__ = "correos_salientes"
+    __table_args__ = (db.Index("ix_correos_salientes_cola", "estado", "proximo_intento"),)
+    id = db.Column(db.Integer, primary_key=True)
+    asunto = db.Column(db.String(200), nullable=False)
+    destinatarios = db.Column(db.Text, nullable=False)  # separados por coma
+    cuerpo = db.Column(db.Text)
+    html = db.Column(db.Text)
+    estado = db.Column(db.String(20), nullable=False, default="pendiente")  # pendiente, enviando, enviado o fallido
+    intentos = db.Column(db.Integer, nullable=False, default=0)
+    proximo_intento = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    ultimo_error = db.Column(db.Text)
+    fecha_registro = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    fecha_envio = db.Column(db.DateTime)
+    reclamado_por = db.Column(db.String(100))  # worker que tomó el correo para enviarlo, ver correo._reclamar
+    fecha_reclamo = db.Column(db.DateTime)
+
+    def serialize(self):
+        return {
+            "id": self.id,
+            "asunto": self.asunto,
+            "destinatarios": self.destinatarios.split(","),
+            "estado": self.estado,
+            "intentos": self.intentos,
+            "proximo_intento": self.proximo_intento,
+            "ultimo_error": self.ultimo_error,
+            "fecha_registro": self.fecha_registro,
+            "fecha_envio": self.fecha_envio
+        }
+
+    def save(self):
+        db.session.add(self)
+        db.session.commit()
+
+
+class Clave_Idempotencia(db.Model):
+    # Respuesta guardada de un POST con cabecera Idempotency-Key, para repetirla si el cliente reintenta
+    # (ver idempotencia.py). Mientras la solicitud original se procesa, estado_http es NULL.
+    __tablename__ = "claves_idempotencia"
+    __table_args__ = (db.UniqueConstraint("usuario", "clave"),)
+    id = db.Column(db.Integer, primary_key=True)
+    usuario = db.Column(db.String(100), nullable=False)  # identidad del token
+    clave = db.Column(db.String(100), nullable=False)
+    ruta = db.Column(db.String(200), nullable=False)
+    huella = db.Column(db.String(64), nullable=False)  # sha256 del cuerpo de la solicitud
+    estado_http = db.Column(db.Integer)
+    tipo_contenido = db.Column(db.String(100))
+    respuesta = db.Column(db.Text)
+    fecha_registro = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    fecha_expiracion = db.Column(db.DateTime, nullable=False, index=True)
+
+
+def _movimientos_entre(desde, hasta):
+    # Suma de entradas menos salidas por producto con fecha_registro en [desde, hasta)
+    movimientos = defaultdict(lambda: [0, 0])
+    for modelo in (Entrada_Inventario, Salida_Inventario):
+        consulta = db.session.query(modelo.producto_id,
+                                    db.func.sum(modelo.cantidad),
+                                    db.func.sum(modelo.costo_total)) \
+            .filter(modelo.fecha_registro < hasta)
+        if desde is not None:
+            consulta = consulta.filter(modelo.fecha_registro >= desde)
+        for producto_id, cantidad, valor in consulta.group_by(modelo.producto_id):
+            movimientos[producto_id][0] += modelo.SIGNO_STOCK * (cantidad or 0)
+            movimientos[producto_id][1] += modelo.SIGNO_STOCK * (valor or 0)
+    return movimientos
+
+
+def _movimientos_producto(producto_id, desde, hasta):
+    # Entradas menos salidas (cantidad, valor) de un producto con fecha_registro en [desde, hasta)
+    cantidad, valor = 0, 0
+    for modelo in (Entrada_Inventario, Salida_Inventario):
+        consulta = db.session.query(db.func.sum(modelo.cantidad), db.func.sum(modelo.costo_total)) \
+            .filter(modelo.producto_id == producto_id, modelo.fecha_registro < hasta)
+        if desde is not None:
+            consulta = consulta.filter(modelo.fecha_registro >= desde)
+        suma_cantidad, suma_valor = consulta.one()
+        cantidad += modelo.SIGNO_STOCK * (suma_cantidad or 0)
+        valor += modelo.SIGNO_STOCK * (suma_valor or 0)
+    return cantidad, valor
+
+
+def _valor_anterior(objeto, atributo):
+    # Valor que tenía el atributo en la base de datos antes de los cambios pendientes
+    historial = inspect(objeto).attrs[atributo].history
+    if historial.deleted:
+        return historial.deleted[0]
+    return getattr(objeto, atributo)
+
+
+def _variaciones_stock(session):
+    variaciones = defaultdict(float)
+    movimientos = (Entrada_Inventario, Salida_Inventario)
+
+    for movimiento in session.new:
+        if isinstance(movimiento, movimientos):
+            variaciones[movimiento.producto_id] += movimiento.SIGNO_STOCK * (movimiento.cantidad or 0)
+
+    for movimiento in session.dirty:
+        if isinstance(movimiento, movimientos) and session.is_modified(movimiento):
+            variaciones[_valor_anterior(movimiento, "producto_id")] -= \
+                movimiento.SIGNO_STOCK * (_valor_anterior(movimiento, "cantidad") or 0)
+            variaciones[movimiento.producto_id] += movimiento.SIGNO_STOCK * (movimiento.cantidad or 0)
+
+    for movimiento in session.deleted:
+        if isinstance(movimiento, movimientos):
+            variaciones[_valor_anterior(movimiento, "producto_id")] -= \
+                movimiento.SIGNO_STOCK * (_valor_anterior(movimiento, "cantidad") or 0)
+
+    return {producto_id: variacion for producto_id, variacion in variaciones.items()
+            if producto_id is not None and variacion}
+
+
+def _nuevos(session, modelo):
+    return [movimiento for movimiento in session.new
+            if isinstance(movimiento, modelo) and movimiento.producto_id is not None]
+
+
+def _crear_si_faltan(session, modelo, filas, columna):
+    # Inserta las filas derivadas que aún no existen sin fallar si otra transacción las crea al
+    # mismo tiempo, así el SELECT ... FOR UPDATE siguiente siempre encuentra la fila que bloquear.
+    # En MySQL ON DUPLICATE KEY UPDATE toma el bloqueo exclusivo de la fila existente de inmediato
+    # (INSERT IGNORE toma uno compartido y dos cajas que esperan lo mismo terminan en deadlock).
+    if not filas:
+        return
+    tabla = modelo.__table__
+    if session.get_bind().dialect.name == "mysql":
+        from sqlalchemy.dialects.mysql import insert
+        sentencia = insert(tabla).on_duplicate_key_update({columna: tabla.c[columna]})  # no cambia la fila
+    else:
+        sentencia = tabla.insert().prefix_with("OR IGNORE")  # SQLite en desarrollo
+    session.execute(sentencia, filas)
+
+
+@event.listens_for(db.session, "before_flush")
+def actualizar_stock(session, flush_context, instances):
+    # Mantiene Stock_Producto en la misma transacción que las entradas y salidas de inventario,
+    # sin importar si se guardan por save(), por la factura / documento de venta o con db.session.
+    # También costea: cada entrada nueva ajusta el costo promedio y cada salida nueva sin costo
+    # toma el promedio vigente.
+    variaciones = _variaciones_stock(session)
+    entradas = sorted(_nuevos(session, Entrada_Inventario), key=lambda entrada: entrada.fecha_registro or datetime.now())
+    salidas = [salida for salida in _nuevos(session, Salida_Inventario) if salida.precio_costo_unitario is None]
+    productos = set(variaciones) | {movimiento.producto_id for movimiento in entradas + salidas}
+    if not productos:
+        return
+
+    with session.no_autoflush:
+        existentes = {producto_id for (producto_id,) in session.query(Stock_Producto.producto_id)
+                      .filter(Stock_Producto.producto_id.in_(productos))}
+        _crear_si_faltan(session, Stock_Producto,
+                         [{"producto_id": producto_id, "cantidad": 0, "costo_promedio": 0,
+                           "fecha_actualizacion": datetime.now()}
+                          for producto_id in productos - existentes], "cantidad")
+        stocks = session.query(Stock_Producto) \
+            .filter(Stock_Producto.producto_id.in_(productos)) \
+            .populate_existing() \
+            .with_for_update() \
+            .all()
+        stocks = {stock.producto_id: stock for stock in stocks}
+        for producto_id in productos:
+            if producto_id not in stocks:
+                stocks[producto_id] = Stock_Producto(producto_id=producto_id, cantidad=0, costo_promedio=0)
+                session.add(stocks[producto_id])
+
+        fifo = valorizacion() == "fifo"
+        colas = {}
+        existencias = {producto_id: stock.cantidad for producto_id, stock in stocks.items()}
+        for entrada in entradas:
+            stock = stocks[entrada.producto_id]
+            stock.costo_promedio = Stock_Producto.promediar(existencias[entrada.producto_id], stock.costo_promedio,
+                                                            entrada.cantidad, entrada.precio_costo_unitario)
+            existencias[entrada.producto_id] += entrada.cantidad
+            if fifo:
+                capa = Capa_Costo.desde_entrada(entrada)
+                session.add(capa)
+                if entrada.producto_id not in colas:
+                    colas[entrada.producto_id] = Cola_Capas(Capa_Costo.abiertas(session, entrada.producto_id))
+                colas[entrada.producto_id].agregar(capa)
+        for salida in salidas:
+            costo = stocks[salida.producto_id].costo_promedio
+            if fifo:
+                if salida.producto_id not in colas:
+                    colas[salida.producto_id] = Cola_Capas(Capa_Costo.abiertas(session, salida.producto_id))
+                costo = colas[salida.producto_id].consumir(salida.cantidad, costo)
+            salida.precio_costo_unitario = costo
+            salida.costo_total = salida.genera_costo_total()
+
+        for producto_id, variacion in variaciones.items():
+            stock = stocks[producto_id]
+            stock.cantidad = stock.cantidad + variacion
+
+
+def _aportes_ventas(session):
+    # (salida, signo, anterior): las salidas nuevas suman, las eliminadas restan con sus valores
+    # guardados y las modificadas restan lo anterior y suman lo nuevo
+    aportes = []
+    for salida in session.new:
+        if isinstance(salida, Salida_Inventario):
+            aportes.append((salida, 1, False))
+    for salida in session.dirty:
+        if isinstance(salida, Salida_Inventario) and session.is_modified(salida):
+            aportes.append((salida, -1, True))
+            aportes.append((salida, 1, False))
+    for salida in session.deleted:
+        if isinstance(salida, Salida_Inventario):
+            aportes.append((salida, -1, True))
+    return aportes
+
+
+def _valores_venta(salida, anterior):
+    campos = ("fecha_registro", "producto_id", "documento_venta_id", "cantidad", "venta_total", "costo_total")
+    valores = {campo: _valor_anterior(salida, campo) if anterior else getattr(salida, campo) for campo in campos}
+    valores["fecha"] = (valores.pop("fecha_registro") or datetime.now()).date()
+    documento = None if anterior else salida.__dict__.get("documento_venta")
+    valores["forma_pago"] = documento.forma_pago if documento is not None else None
+    return valores
+
+
+@event.listens_for(db.session, "before_flush")
+def actualizar_ventas_diarias(session, flush_context, instances):
+    # Igual que actualizar_stock(): Venta_Diaria se actualiza en la misma transacción que la venta
+    aportes = [(signo, _valores_venta(salida, anterior)) for salida, signo, anterior in _aportes_ventas(session)]
+    aportes = [(signo, valores) for signo, valores in aportes if valores["producto_id"] is not None]
+    if not aportes:
+        return
+
+    with session.no_autoflush:
+        productos = {valores["producto_id"] for signo, valores in aportes}
+        categorias = dict(session.query(Producto.id, Producto.categoria_id).filter(Producto.id.in_(productos)))
+        documentos = {valores["documento_venta_id"] for signo, valores in aportes
+                      if valores["forma_pago"] is None and valores["documento_venta_id"] is not None}
+        formas_pago = dict(session.query(Documento_Venta.id, Documento_Venta.forma_pago)
+                           .filter(Documento_Venta.id.in_(documentos))) if documentos else {}
+
+        variaciones = defaultdict(lambda: [0, 0, 0])
+        for signo, valores in aportes:
+            forma_pago = valores["forma_pago"] or formas_pago.get(valores["documento_venta_id"])
+            categoria_id = categorias.get(valores["producto_id"])
+            if forma_pago is None or categoria_id is None:
+                continue  # se corrige con reconstruir_ventas_diarias
+            variacion = variaciones[(valores["fecha"], valores["producto_id"], categoria_id, forma_pago)]
+            variacion[0] += signo * (valores["cantidad"] or 0)
+            variacion[1] += signo * (valores["venta_total"] or 0)
+            variacion[2] += signo * (valores["costo_total"] or 0)
+        if not variaciones:
+            return
+
+        filtros = (Venta_Diaria.fecha.in_({llave[0] for llave in variaciones}),
+                   Venta_Diaria.producto_id.in_({llave[1] for llave in variaciones}))
+        existentes = set(session.query(*(getattr(Venta_Diaria, columna) for columna in Venta_Diaria.AGRUPACIONES))
+                         .filter(*filtros))
+        _crear_si_faltan(session, Venta_Diaria,
+                         [dict(zip(Venta_Diaria.AGRUPACIONES, llave), cantidad=0, venta_neta=0, costo=0)
+                          for llave in variaciones if llave not in existentes], "cantidad")
+        filas = session.query(Venta_Diaria) \
+            .filter(*filtros) \
+            .populate_existing() \
+            .with_for_update() \
+            .all()
+        filas = {(fila.fecha, fila.producto_id, fila.categoria_id, fila.forma_pago): fila for fila in filas}
+
+        for llave, (cantidad, venta_neta, costo) in variaciones.items():
+            fila = filas.get(llave)
+            if fila is None:
+                fila = Venta_Diaria(fecha=llave[0], producto_id=llave[1], categoria_id=llave[2], forma_pago=llave[3],
+                                    cantidad=0, venta_neta=0, costo=0)
+                session.add(fila)
+            fila.cantidad = fila.cantidad + cantidad
+            fila.venta_neta = fila.venta_neta + venta_neta
+            fila.costo = fila.costo + costo
+
+
+@event.listens_for(db.session, "before_flush")
+def actualizar_sesion_caja(session, flush_context, instances):
+    # Suma cada documento de venta nuevo al turno abierto de su cajero
+    documentos = [documento for documento in session.new
+                  if isinstance(documento, Documento_Venta) and documento.usuario_id is not None]
+    if not documentos:
+        return
+
+    with session.no_autoflush:
+        sesiones = session.query(Sesion_Caja) \
+            .filter(Sesion_Caja.usuario_id.in_({documento.usuario_id for documento in documentos}),
+                    Sesion_Caja.estado == "abierta") \
+            .populate_existing() \
+            .with_for_update() \
+            .all()
+        sesiones = {sesion.usuario_id: sesion for sesion in sesiones}
+        for documento in documentos:
+            sesion = sesiones.get(documento.usuario_id)
+            if sesion is None:
+                continue  # venta sin turno abierto: queda para la consulta por fecha_emision
+            if documento.fecha_emision is not None and documento.fecha_emision < sesion.fecha_apertura:
+                continue  # emitida antes de abrir el turno (caja sin conexión): igual, por fecha_emision
+            columna = Sesion_Caja.columna_forma_pago(documento.forma_pago)
+            setattr(sesion, columna, getattr(sesion, columna) + (documento.monto_total or 0))
+            sesion.cantidad_ventas = sesion.cantidad_ventas + 1
+
+
+# Crea los backref ahora para que app.py pueda declarar sus planes de carga al importar
+db.configure_mappers()
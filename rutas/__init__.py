@@ -0,0 +1,6 @@
+from rutas.caja import caja
+from rutas.cuentas import cuentas
+from rutas.inventario import inventario
+
+# Se registran en create_app (app.py)
+BLUEPRINTS = (cuentas, inventario, caja)
@@ -0,0 +1,282 @@
+import datetime
+
+from flask import Blueprint, current_app, request, jsonify
+from flask_jwt_extended import jwt_required
+from sqlalchemy.exc import IntegrityError
+
+from claves import rehash_si_corresponde, verificar
+from consultas import leer_campos, paginar, quiere_stream, respuesta_paginada, respuesta_stream
+from idempotencia import idempotente
+from sesion import usuario_actual
+from ventas import DOCUMENTO_DUPLICADO, armar_documento, conflicto, corregir_fotos, documento_existe, \
+    error_productos, productos_inexistentes, registrar_lote, validar_documento
+from models import db, opciones_carga, Usuario, Documento_Venta, Cuadratura_Caja, Venta_Diaria, Sesion_Caja
+
+# Apertura y cuadratura de caja, documentos de venta y reportes de ventas
+caja = Blueprint("caja", __name__)
+
+
+@caja.route("/api/valida-Caja", methods=["POST"])
+@jwt_required
+def valida_caja():
+    administrador = request.json.get("administrador", None)
+    password = request.json.get("password", None)
+
+    if not administrador or not password:
+        return jsonify({"msg": "Faltan campos de Administrador"}), 400
+
+    admin_valido = Usuario.query.filter_by(codigo=administrador).first()
+    if not admin_valido:
+        return jsonify({"msg": "Administrador inválido"}), 400
+    if admin_valido.rol != "Admin":
+        return jsonify({"msg": "Dato ingresado no figura como Administrador"}), 400
+    if verificar(admin_valido.password, password):
+        rehash_si_corresponde(admin_valido, password)
+        usuario = usuario_actual()
+        if not usuario:
+            return jsonify({"msg": "Usuario no autorizado"}), 401
+
+        # Abre el turno del cajero; si ya tenía uno abierto se sigue usando el mismo
+        sesion_caja = Sesion_Caja.abierta(usuario["id"])
+        if sesion_caja is None:
+            sesion_caja = Sesion_Caja()
+            sesion_caja.usuario_id = usuario["id"]
+            sesion_caja.admin_id = admin_valido.id
+            sesion_caja.monto_apertura = request.json.get("monto_apertura", None) or 0
+            sesion_caja.save()
+        return jsonify({"msg": "Apertura Exitosa", "sesion_caja": sesion_caja.serialize()}), 200
+    else:
+        return jsonify({"msg": "Validación Administrador incorrecta"}), 400
+
+
+@caja.route("/api/documentos-venta", methods=['GET', 'POST'])
+@caja.route("/api/documentos-venta/<int:id>", methods=['GET'])
+@jwt_required
+@idempotente
+def documentos_venta(id=None):
+
+    if request.method == 'GET':
+        campos, expandir = leer_campos(Documento_Venta)
+        # DEVUELVE LISTADO CON TODOS LOS DOCUMENTOS DE VENTA
+        if not id:
+            consulta = Documento_Venta.query.options(*opciones_carga(Documento_Venta, campos, expandir))
+            if quiere_stream():
+                return respuesta_stream(consulta, lambda documento_venta: documento_venta.serialize(campos, expandir), Documento_Venta.id)
+            documentos_venta = paginar(consulta, Documento_Venta.id)
+            return respuesta_paginada(documentos_venta, lambda documento_venta: documento_venta.serialize(campos, expandir)), 200
+
+        # DEVUELVE DETALLE DE EMPRESA POR ID
+        if id:
+            documento_venta = Documento_Venta.query.options(*opciones_carga(Documento_Venta, campos, expandir)).get(id)
+            if documento_venta:
+                return jsonify(documento_venta.serialize(campos, expandir)), 200
+            else:
+                return jsonify({"msg": "Documento de venta no se encuentra en el sistema"}), 400
+    
+    # PERMITE CREAR NUEVO DOCUMENTO VENTA
+    if request.method == 'POST':
+        data = request.get_json()
+        usuario = usuario_actual()
+        if not usuario:
+            return jsonify({"msg": "Usuario no autorizado"}), 401
+
+        error = validar_documento(data)
+        if error:
+            return jsonify({"msg": error}), 400
+        error = error_productos(data, productos_inexistentes([data]))
+        if error:
+            return jsonify({"msg": error}), 400
+        if documento_existe(data['datosVenta']["tipo_documento"], data['datosVenta']["numero_documento"]):
+            return jsonify({"msg": DOCUMENTO_DUPLICADO}), 400
+
+        documento_venta = armar_documento(data, usuario["id"])
+        tipo_documento = data['datosVenta']["tipo_documento"]
+        try:
+            db.session.add(documento_venta)
+            corregir_fotos([documento_venta])
+            db.session.commit()
+        except IntegrityError as error:
+            db.session.rollback()
+            estado, msg = conflicto(data, error)
+            return jsonify({"msg": msg}), 400
+        return jsonify({"msg": f"{tipo_documento.capitalize()} creada exitosamente."}), 201
+
+
+# PERMITE REGISTRAR VARIOS DOCUMENTOS DE VENTA DE UNA VEZ (CAJAS QUE TRABAJARON SIN CONEXIÓN)
+@caja.route("/api/documentos-venta/lote", methods=['POST'])
+@jwt_required
+@idempotente
+def documentos_venta_lote():
+    data = request.get_json()
+    usuario = usuario_actual()
+    if not usuario:
+        return jsonify({"msg": "Usuario no autorizado"}), 401
+
+    documentos = data.get("documentos") if isinstance(data, dict) else data
+    if not isinstance(documentos, list) or not documentos:
+        return jsonify({"msg": "Debe enviar una lista de documentos"}), 400
+    if len(documentos) > current_app.config['MAXIMO_VENTAS']:
+        return jsonify({"msg": f"No se pueden enviar más de {current_app.config['MAXIMO_VENTAS']} documentos por lote"}), 400
+
+    resultados = registrar_lote(documentos, usuario["id"])
+    creados = sum(1 for resultado in resultados if resultado["estado"] == "creado")
+    return jsonify({"creados": creados, "rechazados": len(resultados) - creados, "resultados": resultados}), 200
+
+
+@caja.route("/api/cuadratura-caja", methods=['GET', 'POST'])
+@caja.route("/api/cuadratura-caja/<int:id>", methods=['GET'])
+@jwt_required
+@idempotente
+def cuadratura_caja(id=None):
+
+    if request.method == 'GET':
+        campos, expandir = leer_campos(Cuadratura_Caja)
+        if not id:
+            consulta = Cuadratura_Caja.query.options(*opciones_carga(Cuadratura_Caja, campos, expandir))
+            if quiere_stream():
+                return respuesta_stream(consulta, lambda cuadratura_caja: cuadratura_caja.serialize(campos, expandir), Cuadratura_Caja.id)
+            cuadraturas_cajas = paginar(consulta, Cuadratura_Caja.id)
+            return respuesta_paginada(cuadraturas_cajas, lambda cuadratura_caja: cuadratura_caja.serialize(campos, expandir)), 200
+
+        if id:
+            cuadratura_caja = Cuadratura_Caja.query.options(*opciones_carga(Cuadratura_Caja, campos, expandir)).get(id)
+            if cuadratura_caja:
+                return jsonify(cuadratura_caja.serialize(campos, expandir)), 200
+            else:
+                return jsonify({"msg": "id asociado a cuadratura de caja no encontrada"}), 400
+
+    if request.method == 'POST':
+        data = request.get_json()
+        if not data["usuario_id"]:
+            return jsonify({"msg": "por favor ingresar user_id"}), 400
+        
+        if not data["admin_id"]:
+            return jsonify({"msg": "por favor ingresar admin_id"}), 400
+        
+        if not data["fecha_apertura"]:
+            return jsonify({"msg": "por favor ingresar fecha apertura"}), 400
+        
+        if not data["fecha_cierre"]:
+            return jsonify({"msg": "por favor ingresar fecha de cierre"}), 400
+        
+        if not data["monto_apertura"]:
+            return jsonify({"msg": "por favor ingresar monto de apertura"}), 400
+
+        if not data["monto_transferencia"]:
+            return jsonify({"msg": "por favor ingresar monto efectuado por transferencia"}), 400
+        
+        if not data["monto_efectivo"]:
+            return jsonify({"msg": "por favor ingresar monto efectuado en efectivo"}), 400
+        
+        if not data["monto_tarjeta"]:
+            return jsonify({"msg": "por favor ingresar monto efectuado por tarjeta"}), 400
+        
+        if not data["monto_cierre"]:
+            return jsonify({"msg": "por favor ingresar monto de cierre"}), 400
+        
+        if not data["diferencia_en_caja"]:
+            return jsonify({"msg": "por favor ingresar diferencia en caja"}), 400
+
+        cuadratura_caja = Cuadratura_Caja()
+        cuadratura_caja.usuario_id = data["usuario_id"]
+        cuadratura_caja.admin_id = data["admin_id"]
+        cuadratura_caja.fecha_apertura = datetime.datetime.strptime(data["fecha_apertura"], '%Y-%m-%d %H:%M:%S')
+        cuadratura_caja.fecha_cierre = datetime.datetime.strptime(data["fecha_cierre"], '%Y-%m-%d %H:%M:%S')
+        cuadratura_caja.monto_apertura = data["monto_apertura"]
+        cuadratura_caja.monto_transferencia = data["monto_transferencia"]
+        cuadratura_caja.monto_efectivo = data["monto_efectivo"]
+        cuadratura_caja.monto_tarjeta = data["monto_tarjeta"]
+        cuadratura_caja.monto_cierre = data["monto_cierre"]
+        cuadratura_caja.diferencia_en_caja = data["diferencia_en_caja"]
+
+        # Cierra el turno del cajero y guarda lo esperado junto a lo declarado
+        sesion_caja = Sesion_Caja.abierta(data["usuario_id"])
+        if sesion_caja:
+            db.session.add(cuadratura_caja)
+            db.session.flush()
+            sesion_caja.estado = "cerrada"
+            sesion_caja.fecha_cierre = cuadratura_caja.fecha_cierre
+            sesion_caja.cuadratura_caja_id = cuadratura_caja.id
+        cuadratura_caja.save()
+
+        respuesta = {"msg": "cuadratura de caja creada exitosamente"}
+        if sesion_caja:
+            esperado = sesion_caja.esperado()
+            respuesta["esperado"] = esperado
+            respuesta["diferencias"] = {
+                "monto_efectivo": cuadratura_caja.monto_efectivo - esperado["monto_efectivo"],
+                "monto_tarjeta": cuadratura_caja.monto_tarjeta - esperado["monto_tarjeta"],
+                "monto_transferencia": cuadratura_caja.monto_transferencia - esperado["monto_transferencia"],
+                "efectivo_en_caja": cuadratura_caja.monto_cierre - esperado["efectivo_en_caja"]
+            }
+        return jsonify(respuesta), 201
+
+
+@caja.route("/api/cuadratura-caja/esperado", methods=['GET'])
+@jwt_required
+def cuadratura_caja_esperado():
+    # Totales por forma de pago que deberían estar en la caja del turno abierto del cajero
+    # (?usuario_id= de otro cajero solo para administradores, por defecto el usuario actual).
+    # ?recalcular=1 los suma desde los documentos de venta; sin turno abierto se puede consultar
+    # desde ?desde=YYYY-MM-DD HH:MM:SS.
+    usuario = usuario_actual()
+    if not usuario:
+        return jsonify({"msg": "Usuario no autorizado"}), 401
+    try:
+        usuario_id = int(request.args.get("usuario_id", usuario["id"]))
+    except ValueError:
+        return jsonify({"msg": "usuario_id debe ser un número entero"}), 400
+    # La caja de otro cajero solo la puede revisar un administrador, igual que en valida_caja()
+    if usuario_id != usuario["id"] and usuario["rol"] != "Admin":
+        return jsonify({"msg": "Usuario no autorizado"}), 403
+
+    sesion_caja = Sesion_Caja.abierta(usuario_id)
+    if sesion_caja is None:
+        desde = request.args.get("desde", None)
+        if not desde:
+            return jsonify({"msg": "El cajero no tiene un turno abierto"}), 400
+        try:
+            desde = datetime.datetime.strptime(desde, '%Y-%m-%d %H:%M:%S')
+        except ValueError:
+            return jsonify({"msg": "Fecha desde debe tener formato YYYY-MM-DD HH:MM:SS"}), 400
+        esperado = Sesion_Caja.totales_entre(usuario_id, desde, datetime.datetime.now())
+        return jsonify({"usuario_id": usuario_id, "sesion_caja": None, "origen": "consulta", "esperado": esperado}), 200
+
+    if request.args.get("recalcular") in ("1", "true"):
+        origen, esperado = "consulta", sesion_caja.esperado_por_consulta()
+    else:
+        origen, esperado = "contadores", sesion_caja.esperado()
+    return jsonify({"usuario_id": usuario_id, "sesion_caja": sesion_caja.serialize(), "origen": origen,
+                    "esperado": esperado}), 200
+
+
+@caja.route('/api/reportes/ventas', methods=['GET'])
+@jwt_required
+def reporte_ventas():
+    # Se responde desde ventas_diarias: un año son ~365 filas por producto, no todas las líneas de venta
+    try:
+        hasta = request.args.get("hasta", None)
+        hasta = datetime.datetime.strptime(hasta, "%Y-%m-%d").date() if hasta else datetime.date.today()
+        desde = request.args.get("desde", None)
+        desde = datetime.datetime.strptime(desde, "%Y-%m-%d").date() if desde else hasta - datetime.timedelta(days=30)
+    except ValueError:
+        return jsonify({"msg": "Fechas desde y hasta deben tener formato YYYY-MM-DD"}), 400
+    if desde > hasta:
+        return jsonify({"msg": "Fecha desde no puede ser posterior a hasta"}), 400
+
+    agrupar = [columna.strip() for columna in request.args.get("agrupar", "fecha").split(",") if columna.strip()]
+    no_permitidas = [columna for columna in agrupar if columna not in Venta_Diaria.AGRUPACIONES]
+    if not agrupar or no_permitidas:
+        return jsonify({"msg": f"agrupar acepta: {', '.join(Venta_Diaria.AGRUPACIONES)}"}), 400
+
+    filtros = {}
+    for columna in ("producto_id", "categoria_id"):
+        if request.args.get(columna):
+            try:
+                filtros[columna] = int(request.args[columna])
+            except ValueError:
+                return jsonify({"msg": f"{columna} debe ser un número entero"}), 400
+    if request.args.get("forma_pago"):
+        filtros["forma_pago"] = request.args["forma_pago"]
+
+    return jsonify(Venta_Diaria.resumen(desde, hasta, agrupar, filtros)), 200
@@ -0,0 +1,422 @@
+import datetime
+import os
+
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import create_access_token, jwt_required
+
+from claves import generar_hash, metricas, rehash_si_corresponde, verificar
+from consultas import leer_campos, paginar, quiere_stream, respuesta_paginada, respuesta_stream
+from correo import encolar_correo
+from imagenes import guardar_imagen, respuesta_imagen
+from sesion import usuario_actual
+from models import opciones_carga, Empresa, Usuario
+
+# Contacto, acceso, contraseñas, empresas y usuarios
+cuentas = Blueprint("cuentas", __name__)
+
+ALLOWED_EXTENSIONS_IMG = {'png', 'jpg', 'jpeg'}
+
+# Planes de carga por defecto: relaciones que recorre serialize() sin ?fields ni ?expand, para evitar
+# un SELECT por fila. Los GET arman su plan con opciones_carga() según lo pedido.
+CARGA_EMPRESAS = opciones_carga(Empresa)
+
+
+def allowed_images_file(filename):
+    return '.' in filename and \
+           filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS_IMG
+
+
+@cuentas.route('/api/email', methods=['POST'])
+def email():
+    nombre = request.json.get('nombre', None)
+    email = request.json.get('email', None)
+    consulta = request.json.get('consulta', None)
+
+    if not nombre:
+        return jsonify({"msg": "Por favor ingresa tu nombre"}), 400
+    if not email:
+        return jsonify({"msg": "Por favor ingresa tu email"}), 400
+    if not consulta:
+        return jsonify({"msg": "Por favor ingresa tu constulta"}), 400
+    
+    encolar_correo('Consulta desde Formulario Landing Page', [os.environ.get('MAIL_DEFAULT_RECIPIENT')],
+                   cuerpo=f"Nombre: {nombre}\nEmail de contacto: {email}\nConsulta: {consulta}")
+    return jsonify({"msg": "Muchas gracias por contactarte con nosotros"}), 200
+
+
+@cuentas.route('/api/recuperar-email', methods=['POST'])
+def recuperar_email():
+    email = request.json.get('email', None)
+
+    if not email:
+        return jsonify({"msg": "Debes ingresar un email"}), 400
+    
+    check_email = Usuario.query.filter_by(email=email).first()
+
+    if not check_email:
+        return jsonify({"msg": "El email ingresado no es correcto"}), 400
+
+    if check_email:
+        expires = datetime.timedelta(hours=1)
+        access_token = create_access_token(identity=check_email.email, expires_delta=expires)
+        url = "http://localhost:3000/nueva-password/"
+        html = f"""<!DOCTYPE html>
+                    <html lang="en">
+                    <head>
+                        <meta charset="UTF-8">
+                        <meta name="viewport" content="width=device-width, initial-scale=1.0">
+                    </head>
+                    <body>
+                        <p>Este correo se autogeneró, debido a que solicitaste un cambio de contraseña</p>
+                        <p>El link para recuperar tu contraseña es el siguiente: <a href="{url}{access_token}">Click aqui</a></p>
+                    </body>
+                    </html>"""
+        encolar_correo('Email de recuperación de contraseña DSHL', [email], html=html)
+
+        return jsonify({"msg": "Se ha enviado un correo para recuperar la contraseña"}), 200
+
+
+@cuentas.route('/api/nueva-password/', methods=['PUT'])
+@jwt_required
+def nueva_password():
+    
+    current_user = usuario_actual()
+    if not current_user:
+        return jsonify({"msg": "Usuario no autorizado"}), 401
+    password = request.json.get('password', None)
+    repassword = request.json.get('repassword', None)
+
+    if not password or not repassword:
+        return jsonify({"msg": "Los campos no pueden estar vacios"}), 400
+    
+    if len(password) < 6:
+        return jsonify({"msg": "Contraseña debe contener más de 5 caracteres"}), 400
+
+    if password != repassword:
+        return jsonify({"msg": "Ambas contraseñas deben ser iguales"}), 400
+    
+    usuario = Usuario.query.get(current_user["id"])
+    usuario.password = generar_hash(password)
+    usuario.update()
+
+    return jsonify({"msg": "Su contraseña ha sido modificada, redireccionando..."}), 200
+
+
+@cuentas.route('/api/images/<filename>')
+def uploaded_file(filename):
+    # Las fotos están en UPLOAD_FOLDER/images, UPLOAD_FOLDER se define en config.py
+    return respuesta_imagen(filename)
+
+
+@cuentas.route("/api/login/", methods=["POST"])
+def login():
+    email = request.json.get("email", None)
+    password = request.json.get("password", None)
+
+    if not email:
+        return jsonify({"msg": "Email no puede estar vacío"}), 400
+    if not password:
+        return jsonify({"msg": "Contraseña no puede estar vacía"}), 400
+
+    user = Usuario.query.filter_by(email=email).first()
+    # Revisa si existe el usuario en DB y compara contraseñas
+    if not user or not verificar(user.password, password):
+        return jsonify({"msg": "Email o contraseña inválidos"}), 401
+    rehash_si_corresponde(user, password)
+
+    expires = datetime.timedelta(days=1)
+    access_token = create_access_token(identity=user.email, expires_delta=expires)
+
+    data = {
+        "access_token": access_token,
+        "user": user.serialize()
+    }
+
+    return jsonify(data), 200
+
+
+@cuentas.route("/api/metricas/claves", methods=["GET"])
+@jwt_required
+def metricas_claves():
+    # Latencia y rechazos del grupo de hilos que calcula los hash de contraseñas, solo para administradores
+    usuario = usuario_actual()
+    if not usuario:
+        return jsonify({"msg": "Usuario no autorizado"}), 401
+    if usuario["rol"] != "Admin":
+        return jsonify({"msg": "Usuario no autorizado"}), 403
+    return jsonify(metricas()), 200
+
+
+@cuentas.route('/api/empresas', methods=['GET', "POST"])
+@cuentas.route('/api/empresas/<int:id>', methods=['GET', "PUT", "DELETE"])
+@jwt_required
+def empresas(id=None):
+
+    # Ver Empresas
+    if request.method == 'GET':
+        campos, expandir = leer_campos(Empresa)
+        if not id:
+            consulta = Empresa.query.options(*opciones_carga(Empresa, campos, expandir))
+            if quiere_stream():
+                return respuesta_stream(consulta, lambda empresa: empresa.serialize(campos, expandir), Empresa.id)
+            empresas = paginar(consulta, Empresa.id)
+            if not empresas.filas and not request.args.get("after"):
+                return jsonify({"msg": "No hay empresas registradas."})
+            return respuesta_paginada(empresas, lambda empresa: empresa.serialize(campos, expandir)), 200
+
+    # Ver Empresa por ID
+        empresa = Empresa.query.options(*opciones_carga(Empresa, campos, expandir)).get(id)
+        if empresa:
+            return jsonify(empresa.serialize(campos, expandir)), 200
+        return jsonify({"msg": "Empresa no se encuentra en el sistema"}), 400
+
+    # Eliminar Empresa por ID
+    if request.method == "DELETE":
+        if id:
+            empresa = Empresa.query.get(id)
+            if empresa:
+                empresa.delete()
+                return jsonify({"msg": f"Empresa <{empresa.nombre}> eliminada exitosamente!"}), 200
+            else:
+                return jsonify({"msg": "Empresa no se encuentra en el sistema"}), 400
+
+    # Ingresar Empresa
+    if request.method == "POST":
+        nombre = request.json.get("nombre", None)
+        rut = request.json.get("rut", None)
+        razon_social = request.json.get("razon_social", None)
+        rubro = request.json.get("rubro", None)
+
+        if not nombre:
+            return jsonify({"msg": "Nombre de empresa no puede estar vacío"}), 400
+        if not rut:
+            return jsonify({"msg": "Rut de empresa no puede estar vacío"}), 400
+        if not razon_social:
+            return jsonify({"msg": "Razon Social de empresa no puede estar vacío"}), 400
+        if not rubro:
+            return jsonify({"msg": "Rubro de empresa no puede estar vacío"}), 400
+        
+        valida_rut_existente = Empresa.query.filter_by(rut=rut).first()
+        if valida_rut_existente:
+            return jsonify({"msg": "Rut de empresa ya se encuentra registrado"}), 400
+
+        valida_razon_social_existente = Empresa.query.filter_by(razon_social=razon_social).first()
+        if valida_razon_social_existente:
+            return jsonify({"msg": "Razon social de empresa ya se encuentra registrado"}), 400
+
+        empresa = Empresa()
+        empresa.nombre = nombre.capitalize()
+        empresa.rut = rut
+        empresa.razon_social = razon_social.capitalize()
+        empresa.rubro = rubro.capitalize()
+        empresa.save()
+        empresa = Empresa.query.options(*CARGA_EMPRESAS).populate_existing().get(empresa.id)
+
+        return jsonify(empresa.serialize()), 200
+
+    # Actualizar Empresa by ID
+    if request.method == "PUT":
+        if id:
+            empresa_actualizar = Empresa.query.options(*CARGA_EMPRESAS).get(id)
+            if not empresa_actualizar:
+                return jsonify({"msg": "Empresa no se encuentra en el sistema"}), 400
+
+            nombre = request.json.get("nombre", None)
+            rut = request.json.get("rut", None)
+            razon_social = request.json.get("razon_social", None)
+            rubro = request.json.get("rubro", None)
+
+            rut_ocupado = Empresa.query.filter_by(rut=rut).first()
+            if rut_ocupado and rut_ocupado.id != id:
+                return jsonify({"msg": "Rut ya se encuentra registrado."}), 400
+
+            razon_social_ocupado = Empresa.query.filter_by(razon_social=razon_social).first()
+            if razon_social_ocupado and razon_social_ocupado.id != id:
+                return jsonify({"msg": "Razon social ya se encuentra registrada."}), 400
+
+            if nombre is not None:
+                if not nombre:
+                    return jsonify({"msg": "Nombre no puede ir vacío"}), 400
+                empresa_actualizar.nombre = nombre
+            
+            if rut is not None:
+                if not rut:
+                    return jsonify({"msg": "Rut no puede ir vacío"}), 400
+                empresa_actualizar.rut = rut
+            
+            if razon_social is not None:
+                if not razon_social:
+                    return jsonify({"msg": "Razon social no puede ir vacío"}), 400
+                empresa_actualizar.razon_social = razon_social
+            
+            if rubro is not None:
+                if not rubro:
+                    return jsonify({"msg": "Rubro no puede ir vacío"}), 400
+                empresa_actualizar.rubro = rubro
+
+            empresa_actualizar.update()
+            return jsonify(empresa_actualizar.serialize()), 200
+
+
+@cuentas.route("/api/usuarios", methods=["GET", "POST"])
+@cuentas.route("/api/usuarios/<int:id>", methods=["GET", "DELETE", "PUT"])
+@jwt_required
+def usuarios(id=None):
+
+    # Ver Usuarios
+    if request.method == "GET":
+        campos, expandir = leer_campos(Usuario)
+        if id is None:
+            consulta = Usuario.query.options(*opciones_carga(Usuario, campos, expandir))
+            if quiere_stream():
+                return respuesta_stream(consulta, lambda usuario: usuario.serialize(campos, expandir), Usuario.id)
+            usuarios = paginar(consulta, Usuario.id)
+            if not usuarios.filas and not request.args.get("after"):
+                return jsonify({"msg": "No hay usuarios"})
+            return respuesta_paginada(usuarios, lambda usuario: usuario.serialize(campos, expandir)), 200
+
+        # Ver Usuario by ID
+        else:
+            usuario = Usuario.query.options(*opciones_carga(Usuario, campos, expandir)).get(id)
+            if not usuario:
+                return jsonify({"msg": "No se encuentra usuario."}), 400
+            return jsonify(usuario.serialize(campos, expandir)), 200
+
+    # Eliminar Usuario
+    if request.method == "DELETE":
+        if id:
+            usuario = Usuario.query.get(id)
+            if usuario:
+                usuario.delete()
+                return jsonify({"msg": f"Usuario <{usuario.nombre}> eliminado exitosamente."}), 200
+            else:
+                return jsonify({"msg": "Usuario no se encuentra registrado."}), 400
+
+    # Insertar Usuario
+    if request.method == "POST":        
+        nombre = request.form.get("nombre", None)
+        apellido = request.form.get("apellido", None)
+        rut = request.form.get("rut", None)
+        rol = request.form.get("rol", None)
+        email = request.form.get("email", None)
+        password = request.form.get("password", None)
+        # foto = request.form.get("foto", None)
+
+        if not nombre:
+            return jsonify({"msg": "Nombre no puede estar vacío"}), 400
+        if not apellido:
+            return jsonify({"msg": "Apellido no puede estar vacío"}), 400
+        if not rut:
+            return jsonify({"msg": "Rut no puede estar vacío"}), 400
+        if not rol:
+            return jsonify({"msg": "Rol no puede estar vacío"}), 400
+        if not email:
+            return jsonify({"msg": "Email no puede estar vacío"}), 400
+        if not password:
+            return jsonify({"msg": "Password no puede estar vacío"}), 400
+        # if not data["empresa_id"]:
+        #    return jsonify({"msg":"Empresa_id no puede estar vacío"}),400
+        
+        rut_ocupado = Usuario.query.filter_by(rut=rut).first()
+        if rut_ocupado:
+            return jsonify({"msg": "Rut ya se encuentra registrado."}), 400
+        email_ocupado = Usuario.query.filter_by(email=email).first()
+        if email_ocupado:
+            return jsonify({"msg": "Email ya se encuentra registrado."}), 400
+
+        filename = "without-photo.png"
+        if 'foto' in request.files:
+            file = request.files['foto']    
+            if file and allowed_images_file(file.filename):
+                filename = guardar_imagen(file)
+            else:
+                return jsonify({"msg": "File Not Allowed!"}), 400 
+
+        usuario = Usuario()
+        usuario.nombre = nombre.capitalize()
+        usuario.apellido = apellido.capitalize()
+        usuario.rut = rut
+        usuario.rol = rol.capitalize()
+        usuario.email = email
+        usuario.password = generar_hash(password)
+        usuario.empresa_id = 1 
+        usuario.foto = filename
+        usuario.save()
+        usuario.codigo = usuario.generaCodigo()
+        usuario.update()
+
+        return jsonify(usuario.serialize()), 200
+
+    # Actualizar Usuario
+    if request.method == "PUT":
+        if id:
+            usuario_actualizar = Usuario.query.get(id)
+            if not usuario_actualizar:
+                return jsonify({"msg": "Usuario no se encuentra registrado"}), 400
+            
+            nombre = request.form.get("nombre", None)
+            apellido = request.form.get("apellido", None)
+            rut = request.form.get("rut", None)
+            rol = request.form.get("rol", None)
+            email = request.form.get("email", None)
+            password = request.form.get("password", None)
+            status = request.form.get("status", None)
+        
+            if status == "true":
+                status = True
+            elif status == "false":
+                status = False
+
+            rut_ocupado = Usuario.query.filter_by(rut=rut).first()
+            if rut_ocupado and rut_ocupado.id != id:
+                return jsonify({"msg": "Rut ya se encuentra registrado."}), 400
+
+            email_ocupado = Usuario.query.filter_by(email=email).first()
+            if email_ocupado and email_ocupado.id != id:
+                return jsonify({"msg": "Correo ya se encuentra registrado."}), 400
+
+            if nombre is not None:
+                if nombre == "":
+                    return jsonify({"msg": "Nombre no puede ir vacío."}), 400
+                usuario_actualizar.nombre = nombre.capitalize()
+
+            if apellido is not None:
+                if apellido == "":
+                    return jsonify({"msg": "Apellido no puede ir vacío."}), 400
+                usuario_actualizar.apellido = apellido.capitalize()
+                
+            if rut is not None:
+                if rut == "":
+                    return jsonify({"msg": "Rut no puede ir vacío."}), 400
+                usuario_actualizar.rut = rut
+
+            if rol is not None:
+                if rol == "":
+                    return jsonify({"msg": "Rol no puede ir vacío."}), 400
+                usuario_actualizar.rol = rol.capitalize()
+
+            if email is not None:
+                if email == "":
+                    return jsonify({"msg": "Email no puede ir vacío"}), 400
+                usuario_actualizar.email = email
+
+            if password is not None:
+                if password == "":
+                    return jsonify({"msg": "Password no puede ir vacío."}), 400
+                usuario_actualizar.password = generar_hash(password)
+            if status is not None:
+                if status != False and status != True:
+                    return jsonify("Status debe ser true o false"), 400
+                usuario_actualizar.status = status
+
+            # filename = "without-photo.png"
+            if 'foto' in request.files:
+                file = request.files['foto']    
+                if file and allowed_images_file(file.filename):
+                    usuario_actualizar.foto = guardar_imagen(file)
+                else:
+                    return jsonify({"msg": "File Not Allowed!"}), 400
+            
+            usuario_actualizar.update()
+            
+            return jsonify(usuario_actualizar.serialize()), 200
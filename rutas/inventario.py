@@ -0,0 +1,801 @@
+import datetime
+import time
+
+from flask import Blueprint, current_app, request, jsonify
+from flask_jwt_extended import jwt_required
+from sqlalchemy.exc import IntegrityError
+
+from catalogo import buscar_por_codigo
+from consultas import filtrar_campos, leer_campos, paginar, quiere_stream, respuesta_paginada, respuesta_stream
+from idempotencia import idempotente
+from importacion import ErrorImportacion, importar_productos, leer_filas
+from kardex import kardex, leer_rango
+from sesion import usuario_actual
+from versiones import etag_catalogo, incrementar_version
+from models import db, opciones_carga, Producto, Categoria, Proveedor, Factura_Compra, Entrada_Inventario, \
+    Salida_Inventario, Stock_Producto, Stock_Diario
+
+# Catálogo, compras, movimientos y stock
+inventario = Blueprint("inventario", __name__)
+
+# Stock de cada producto en el mismo SELECT: lo leen serialize_stock() en /api/stock y la cascada
+# delete-orphan al eliminar un producto (serialize() no lo usa)
+CARGA_STOCK = (db.joinedload(Producto.stock),)
+
+
+@inventario.route("/api/entradas-inventario", methods=["GET", "POST"])
+@inventario.route("/api/entradas-inventario/<int:id>", methods=["GET", "PUT"])
+@jwt_required
+def entrada_inventario(id=None):
+
+    # VER TODAS LAS ENTRADAS DE INVENTARIO
+    if request.method == "GET":
+        campos, expandir = leer_campos(Entrada_Inventario)
+        if id is None:
+            consulta = Entrada_Inventario.query.options(*opciones_carga(Entrada_Inventario, campos, expandir))
+            if quiere_stream():
+                return respuesta_stream(consulta, lambda entrada: entrada.serialize(campos, expandir), Entrada_Inventario.id)
+            entradas = paginar(consulta, Entrada_Inventario.id)
+            if entradas.filas or request.args.get("after"):
+                return respuesta_paginada(entradas, lambda entrada: entrada.serialize(campos, expandir)), 200
+            else:
+                return jsonify({"msg": "No hay entradas disponibles."}), 400
+
+    # VER UNA ENTRADA DE INVENTARIO POR ID
+        entrada = Entrada_Inventario.query.options(*opciones_carga(Entrada_Inventario, campos, expandir)).get(id)
+        if entrada:
+            return jsonify(entrada.serialize(campos, expandir)), 200
+        else:
+            return jsonify({"msg": "No existe registro asociado."}), 400
+    
+    # INSERTAR UNA ENTRADA DE INVENTARIO POR ID
+    if request.method == "POST":
+        data = request.get_json()
+        usuario = usuario_actual()
+        if not usuario:
+            return jsonify({"msg": "Usuario no autorizado"}), 401
+
+        if data["cantidad"] <= 0:
+            return jsonify({"msg": "Cantidad debe ser mayor a 0"}), 400
+        if data["precio_costo_unitario"] <= 0:
+            return jsonify({"msg": "Precio costo debe ser mayor a 0"}), 400
+
+        entrada_inventario = Entrada_Inventario()
+        entrada_inventario.cantidad = data["cantidad"]
+        entrada_inventario.precio_costo_unitario = data["precio_costo_unitario"]
+        entrada_inventario.costo_total = entrada_inventario.genera_costo_total()
+        entrada_inventario.usuario_id = usuario["id"]
+        entrada_inventario.producto_id = 1  # Cambiar
+        entrada_inventario.factura_compra_id = 1  # Cambiar
+        entrada_inventario.save()
+        return jsonify({"msg": "Entrada guardada exitosamente."}), 200
+
+    # ACTUALIZAR UNA ENTRADA DE INVENTARIO POR ID
+    if request.method == "PUT":
+        entrada_actualizar = Entrada_Inventario.query.get(id)
+        if not entrada_actualizar:
+            return jsonify({"msg": "No existe registro."})
+        
+        cantidad = request.json.get("cantidad", None)
+        precio_costo_unitario = request.json.get("precio_costo_unitario", None)
+
+        if cantidad is not None:
+            if cantidad < 0:
+                return jsonify({"msg": "Cantidad no puede ser menor a 0"}), 400
+            entrada_actualizar.cantidad = cantidad
+        if precio_costo_unitario is not None:
+            if precio_costo_unitario <= 0:
+                return jsonify({"msg": "Precio costo unitario no puede ser menor a 0"}), 400
+            entrada_actualizar.precio_costo_unitario = precio_costo_unitario
+            
+        entrada_actualizar.costo_total = entrada_actualizar.genera_costo_total() 
+        Stock_Producto.recalcular_costo([entrada_actualizar.producto_id])
+        # La entrada puede estar incluida en fotos de Stock_Diario ya cerradas
+        Stock_Diario.corregir([entrada_actualizar.producto_id], entrada_actualizar.fecha_registro.date())
+        entrada_actualizar.update() 
+        return jsonify({"msg": "Producto modificado."}), 200
+
+
+@inventario.route('/api/salidas-inventario', methods=['GET', "POST"])
+@inventario.route("/api/salidas-inventario/<int:id>", methods=["GET", "PUT"])
+@jwt_required
+def salidas_inventario(id=None):
+
+    # Devuelve listado de todas las salidas de inventario por ventas
+    if request.method == 'GET':
+        campos, expandir = leer_campos(Salida_Inventario)
+        if id is None:
+            consulta = Salida_Inventario.query.options(*opciones_carga(Salida_Inventario, campos, expandir))
+            if quiere_stream():
+                return respuesta_stream(consulta, lambda salida_inventario: salida_inventario.serialize(campos, expandir), Salida_Inventario.id)
+            salidas_inventario = paginar(consulta, Salida_Inventario.id)
+            if salidas_inventario.filas or request.args.get("after"):
+                return respuesta_paginada(salidas_inventario, lambda salida_inventario: salida_inventario.serialize(campos, expandir)), 200
+            else:
+                return jsonify({"msg": "No hay registro de ventas"}), 400
+        if id is not None:
+            salida_inventario = Salida_Inventario.query.options(*opciones_carga(Salida_Inventario, campos, expandir)).get(id)
+            if salida_inventario:
+                return jsonify(salida_inventario.serialize(campos, expandir)), 200
+            else:
+                return jsonify({"msg": "Registro de venta no encontrado"}), 400
+
+    # Registro de salida de producto por venta
+    if request.method == 'POST':
+        data = request.get_json()
+        if not data["cantidad"]:
+            return jsonify({"msg": "Cantidad del producto no puede estar vacía"}), 400
+        
+        usuario = usuario_actual()
+        if not usuario:
+            return jsonify({"msg": "Usuario no autorizado"}), 401
+        
+        if not data["producto_id"]:
+            return jsonify({"msg": "Producto Id no puede estar vacío"}), 400
+        
+        if not data["documento_venta_id"]:
+            return jsonify({"msg": "Documento de Venta Id no puede estar vacío"}), 400
+
+        salida_inventario = Salida_Inventario()
+        salida_inventario.cantidad = data["cantidad"]  # el costo lo asigna el costeo al guardar
+        salida_inventario.usuario_id = usuario["id"]
+        salida_inventario.producto_id = data["producto_id"]  # revisar porque es una FK
+        salida_inventario.documento_venta_id = data["documento_venta_id"]  # revisar porque es una FK
+        salida_inventario.save()
+
+        return jsonify({"msg": "Venta efectuada exitosamente"}), 201
+
+    if request.method == 'PUT':
+        salida_inventario = Salida_Inventario.query.get(id)
+        if not salida_inventario:
+            return jsonify({"msg": "Salidad de inventario no encontrada"}), 400
+        else:
+            valor_cantidad = request.json.get("cantidad", None)
+            
+            salida_inventario.cantidad = valor_cantidad
+            salida_inventario.costo_total = salida_inventario.genera_costo_total()
+            Stock_Producto.recalcular_costo([salida_inventario.producto_id])
+            Stock_Diario.corregir([salida_inventario.producto_id], salida_inventario.fecha_registro.date())
+            salida_inventario.update()
+
+            return jsonify({"msg": "Salida de inventario modificada exitosamente"}), 201
+
+
+@inventario.route('/api/facturas-compras', methods=['GET', "POST"])
+@inventario.route("/api/facturas-compras/<int:id>", methods=["GET", 'PUT'])
+@jwt_required
+@idempotente
+def facturas_compras(id=None):
+
+    # Devuelve todas las facturas registradas
+    if request.method == 'GET':
+        campos, expandir = leer_campos(Factura_Compra)
+        if id is None:
+            consulta = Factura_Compra.query.options(*opciones_carga(Factura_Compra, campos, expandir))
+            if quiere_stream():
+                return respuesta_stream(consulta, lambda factura_compra: factura_compra.serialize(campos, expandir), Factura_Compra.id)
+            facturas_compras = paginar(consulta, Factura_Compra.id)
+            if facturas_compras.filas or request.args.get("after"):
+                return respuesta_paginada(facturas_compras, lambda factura_compra: factura_compra.serialize(campos, expandir)), 200
+            else:
+                return jsonify({"msg": "No hay datos de facturas"}), 400
+        if id is not None:
+            factura_compra = Factura_Compra.query.options(*opciones_carga(Factura_Compra, campos, expandir)).get(id)
+            if factura_compra:
+                return jsonify(factura_compra.serialize(campos, expandir)), 200
+            else:
+                return jsonify({"msg": "Factura no encontrada"}), 400
+
+    # Ingreso de nueva factura
+    if request.method == 'POST':
+        data = request.get_json()
+
+        if not data["factura"]["folio"]:
+            return jsonify({"msg": "Folio de nueva factura no puede estar vacío"}), 400
+        
+        if not data["factura"]["fecha_emision"]:
+            return jsonify({"msg": "Fecha de emisión de nueva factura no puede estar vacía"}), 400
+        
+        if not data["factura"]["fecha_recepcion"]:
+            return jsonify({"msg": "Fecha de recepción de nueva factura no puede estar vacía"}), 400
+        
+        if not float(data["factura"]["monto_neto"]):
+            return jsonify({"msg": "Monto Neto de nueva factura no puede estar vacío"}), 400
+        
+        if not float(data["factura"]["monto_iva"]):
+            return jsonify({"msg": "Monto IVA de nueva factura no puede estar vacío"}), 400
+        
+        if not float(data["factura"]["monto_otros_impuestos"]) >= 0:
+            return jsonify({"msg": "Monto de otros Impuestos de nueva factura no puede estar vacío"}), 400
+        
+        if not float(data["factura"]["monto_total"]):
+            return jsonify({"msg": "Monto Total de nueva factura no puede estar vacío"}), 400
+        
+        if not data["factura"]["proveedor_id"]:
+            return jsonify({"msg": "Id proveedor no puede estar vacío"}), 400
+
+        # Consulta sobre el índice único (folio, proveedor_id), sin traer filas
+        factura_existe = db.session.query(Factura_Compra.query.filter_by(
+            folio=int(data["factura"]["folio"]), proveedor_id=int(data["factura"]["proveedor_id"])).exists()).scalar()
+        if factura_existe:
+            return jsonify({"msg": "Factura ya existe"}), 400
+
+        timestr = time.strftime(" %H:%M:%S")
+        try:
+            fecha_emision = datetime.datetime.strptime(data["factura"]["fecha_emision"]+timestr, '%Y-%m-%d %H:%M:%S')
+            fecha_recepcion = datetime.datetime.strptime(data["factura"]["fecha_recepcion"]+timestr, '%Y-%m-%d %H:%M:%S')
+        except ValueError:
+            return jsonify({"msg": "Fechas de la factura deben tener formato YYYY-MM-DD"}), 400
+        factura_compra = Factura_Compra()
+        factura_compra.folio = int(data["factura"]["folio"])
+        factura_compra.fecha_emision = fecha_emision
+        factura_compra.fecha_recepcion = fecha_recepcion
+        factura_compra.monto_neto = float(data["factura"]["monto_neto"])
+        factura_compra.monto_iva = float(data["factura"]["monto_iva"])
+        factura_compra.monto_otros_impuestos = float(data["factura"]["monto_otros_impuestos"])
+        factura_compra.monto_total = float(data["factura"]["monto_total"])
+        factura_compra.proveedor_id = int(data["factura"]["proveedor_id"])
+        
+        for entrada_inv in data["factura"]["entradas_inventario"]:
+            entrada_inventario = Entrada_Inventario()
+            entrada_inventario.cantidad = entrada_inv["cantidad"]
+            entrada_inventario.precio_costo_unitario = entrada_inv["precio_costo_unitario"]
+            entrada_inventario.costo_total = entrada_inv["costo_total"]
+            entrada_inventario.usuario_id = entrada_inv["usuario_id"]
+            # entrada_inventario.factura_compra_id = factura_compra.id
+            entrada_inventario.producto_id = entrada_inv["producto_id"]
+
+            factura_compra.entradas_I.append(entrada_inventario)
+
+        try:
+            factura_compra.save()
+        except IntegrityError:
+            # Otra solicitud registró la misma factura entre la consulta y el insert
+            db.session.rollback()
+            return jsonify({"msg": "Factura ya existe"}), 400
+
+        return jsonify({"msg": "Factura creada exitosamente."}), 201
+
+    # Modificacion factura
+    if request.method == 'PUT':
+        data = request.get_json()
+
+        if not data["folio"]:
+            return jsonify({"msg": "Folio de factura no puede estar vacío"}), 400
+
+        if not data["fecha_emision"]:
+            return jsonify({"msg": "Fecha de emisión de factura no puede estar vacía"}), 400
+
+        if not data["fecha_recepcion"]:
+            return jsonify({"msg": "Fecha de recepción de factura no puede estar vacía"}), 400
+
+        if not data["monto_neto"]:
+            return jsonify({"msg": "Monto Neto de factura no puede estar vacío"}), 400
+
+        if not data["monto_iva"]:
+            return jsonify({"msg": "Monto IVA de factura no puede estar vacío"}), 400
+        
+        if not data["monto_otros_impuestos"] and data["monto_otros_impuestos"] != 0:
+            return jsonify({"msg": "Monto de otros Impuestos de factura no puede estar vacío"}), 400
+        
+        if not data["monto_total"]:
+            return jsonify({"msg": "Monto Total de factura no puede estar vacío"}), 400
+
+        if not data["proveedor_id"]:
+            return jsonify({"msg": "Id proveedor no puede estar vacío"}), 400
+
+        timestr = time.strftime(" %H:%M:%S")
+        try:
+            fecha_emision = datetime.datetime.strptime(data["fecha_emision"]+timestr, '%Y-%m-%d %H:%M:%S')
+            fecha_recepcion = datetime.datetime.strptime(data["fecha_recepcion"]+timestr, '%Y-%m-%d %H:%M:%S')
+        except ValueError:
+            return jsonify({"msg": "Fechas de la factura deben tener formato YYYY-MM-DD"}), 400
+
+        factura_a_modificar = Factura_Compra.query.options(db.selectinload(Factura_Compra.entradas_I)).get(id)  # Se busca factura a modificar en DB
+        if not factura_a_modificar:
+            return jsonify({"msg": "Factura no encontrada"}), 400
+        if factura_a_modificar:
+            factura_a_modificar.folio = data["folio"]
+            factura_a_modificar.fecha_emision = fecha_emision
+            factura_a_modificar.fecha_recepcion = fecha_recepcion
+            factura_a_modificar.monto_neto = data["monto_neto"]
+            factura_a_modificar.monto_iva = data["monto_iva"]
+            factura_a_modificar.monto_otros_impuestos = data["monto_otros_impuestos"]
+            factura_a_modificar.monto_total = data["monto_total"]
+            factura_a_modificar.proveedor_id = data['proveedor_id']
+
+            entradas_inventario = Entrada_Inventario.query.filter_by(factura_compra_id=id).all()
+            productos = {entrada_inventario.producto_id for entrada_inventario in entradas_inventario}
+            # Las entradas reemplazadas conservan la fecha en que se registró la compra: el recálculo
+            # del costo y los saldos históricos (as_of) las ubican antes de las ventas posteriores
+            fecha_registro = min((entrada_inventario.fecha_registro for entrada_inventario in entradas_inventario
+                                  if entrada_inventario.fecha_registro), default=None)
+            for entrada_inventario in entradas_inventario:
+                db.session.delete(entrada_inventario)
+
+            for entrada_inv_enviada in data['entradas_inventario']:
+                entrada_inventario = Entrada_Inventario()
+                entrada_inventario.cantidad = entrada_inv_enviada["cantidad"]
+                entrada_inventario.precio_costo_unitario = entrada_inv_enviada["precio_costo_unitario"]
+                entrada_inventario.costo_total = entrada_inv_enviada["costo_total"]
+                entrada_inventario.usuario_id = entrada_inv_enviada["usuario_id"]
+                entrada_inventario.producto_id = entrada_inv_enviada["producto_id"]
+                entrada_inventario.fecha_registro = fecha_registro
+                factura_a_modificar.entradas_I.append(entrada_inventario)
+                productos.add(entrada_inventario.producto_id)
+
+            try:
+                # La compra puede ser anterior a ventas ya costeadas: se recalcula el promedio
+                Stock_Producto.recalcular_costo(productos)
+                if fecha_registro is not None:
+                    Stock_Diario.corregir(productos, fecha_registro.date())
+                factura_a_modificar.update()
+            except IntegrityError:
+                db.session.rollback()
+                return jsonify({"msg": "Ya existe otra factura con ese folio para el proveedor"}), 400
+            return jsonify({"msg": "Factura modificada"}), 200
+
+
+@inventario.route('/api/productos', methods=['GET', "POST", "PUT"])
+@inventario.route("/api/productos/<int:id>", methods=["GET", "DELETE"])
+@jwt_required
+@etag_catalogo("productos")
+def productos(id=None):
+
+    # Devuelve listado de todos los productos
+    if request.method == 'GET':
+        campos, expandir = leer_campos(Producto)
+        if id is None:
+            consulta = Producto.query.options(*opciones_carga(Producto, campos, expandir))
+            if quiere_stream():
+                return respuesta_stream(consulta, lambda producto: producto.serialize(campos, expandir), Producto.id)
+            productos = paginar(consulta, Producto.id)
+            if productos.filas or request.args.get("after"):
+                return respuesta_paginada(productos, lambda producto: producto.serialize(campos, expandir)), 200
+            else:
+                return jsonify({"msg": "No hay datos de productos"}), 400
+        if id is not None:
+            producto = Producto.query.options(*opciones_carga(Producto, campos, expandir)).get(id)
+            if producto:
+                return jsonify(producto.serialize(campos, expandir)), 200
+            else:
+                return jsonify({"msg": "Producto no encontrado"}), 400
+
+    # Creación de un nuevo producto
+    if request.method == 'POST':
+        data = request.get_json()
+        if not str(data["sku"]):
+            return jsonify({"msg": "SKU del producto nuevo no puede estar vacío"}), 400
+        
+        if not data["descripcion"]:
+            return jsonify({"msg": "Descripción del producto nuevo no puede estar vacía"}), 400
+        
+        if not data["codigo_barra"]:
+            return jsonify({"msg": "Código de Barra del producto nuevo no puede estar vacío"}), 400
+        
+        if not data["unidad_entrega"]:
+            return jsonify({"msg": "Unidad de Entrega del producto nuevo no puede estar vacía"}), 400
+        
+        if not data["categoria_id"]:
+            return jsonify({"msg": "Seleccione Categoría"}), 400
+
+        producto_cb = Producto.query.filter_by(codigo_barra=data["codigo_barra"]).first()
+        producto_desc = Producto.query.filter_by(descripcion=data["descripcion"]).first()
+        producto_sku = Producto.query.filter_by(sku=data["sku"]).first()
+
+        if producto_cb:
+            return jsonify({"msg": "Código de barra ya existe"}), 400
+  
+        if producto_sku:
+            return jsonify({"msg": "SKU ya existe"}), 400
+        
+        producto = Producto()
+        producto.sku = data["sku"]
+        producto.descripcion = data["descripcion"].capitalize()
+        producto.codigo_barra = data["codigo_barra"]
+        producto.unidad_entrega = data["unidad_entrega"]
+        producto.precio_venta_unitario = data["precio_venta_unitario"]
+        producto.categoria_id = data["categoria_id"]  # revisar porque es una FK
+        producto.save()
+       
+        return jsonify(producto.serialize()), 200
+
+    # Actualización masiva de productos: una consulta IN, validación en memoria y un solo UPDATE masivo
+    if request.method == 'PUT':
+        inicio = time.perf_counter()
+        data = request.get_json()
+
+        if not data:
+            return jsonify({"msg": f"La solicitud no puede estar vacía"}), 400
+
+        ids = {producto.get("id", None) for producto in data} - {None}
+        # Códigos actuales de los productos de la solicitud, para saber cuáles cambian
+        existentes = {id: (codigo_barra, sku) for id, codigo_barra, sku in
+                      db.session.query(Producto.id, Producto.codigo_barra, Producto.sku).filter(Producto.id.in_(ids))}
+        categorias_solicitud = {producto.get("categoria_id", None) for producto in data} - {None}
+        categorias = {str(id) for (id,) in db.session.query(Categoria.id).filter(Categoria.id.in_(categorias_solicitud))}
+        # Códigos de barra y SKU usados por productos que no vienen en la solicitud; los de los productos
+        # que sí vienen quedan libres, así dos productos pueden intercambiar sus códigos
+        codigos = {producto.get("codigo_barra", None) for producto in data} - {None}
+        skus = {producto.get("sku", None) for producto in data} - {None}
+        ocupados = {codigo for (codigo,) in db.session.query(Producto.codigo_barra)
+                    .filter(Producto.codigo_barra.in_(codigos), Producto.id.notin_(existentes))}
+        skus_ocupados = {sku for (sku,) in db.session.query(Producto.sku)
+                         .filter(Producto.sku.in_(skus), Producto.id.notin_(existentes))}
+
+        resultados = []
+        cambios = []
+        codigos_solicitud = {}
+        skus_solicitud = {}
+        ids_solicitud = set()
+        for producto in data:
+            id = producto.get("id", None)
+            sku = producto.get("sku", None)
+            descripcion = producto.get("descripcion", None)
+            codigo_barra = producto.get("codigo_barra", None)
+            unidad_entrega = producto.get("unidad_entrega", None)
+            categoria_id = producto.get("categoria_id", None)
+            precio_venta_unitario = producto.get("precio_venta_unitario", None)
+
+            error = None
+            if id is not None and id in ids_solicitud:
+                error = f"Producto id {id} repetido en la solicitud"
+            elif not sku:
+                error = f"SKU del producto id {id} no puede estar vacío"
+            elif not descripcion:
+                error = f"Descripción del producto id {id} no puede estar vacía"
+            elif not codigo_barra:
+                error = f"Código de barra del producto id {id} no puede estar vacío"
+            elif not unidad_entrega:
+                error = f"Unidad de entrega del producto id {id} no puede estar vacía"
+            elif not categoria_id:
+                error = f"Categoría del producto id {id} no puede estar vacía"
+            elif str(categoria_id) not in categorias:
+                error = f"Categoría del producto id {id} no existe"
+            elif not precio_venta_unitario:
+                error = f"Precio venta unitario del producto id {id} no puede estar vacío"
+            elif codigo_barra in ocupados or codigos_solicitud.get(codigo_barra, id) != id:
+                error = f"Código de barra del producto id {id} ya existe"
+            elif sku in skus_ocupados or skus_solicitud.get(sku, id) != id:
+                error = f"SKU del producto id {id} ya existe"
+
+            ids_solicitud.add(id)
+            if error:
+                resultados.append({"id": id, "ok": False, "msg": error})
+                continue
+            if id not in existentes:
+                resultados.append({"id": id, "ok": False, "msg": "Producto no encontrado"})
+                continue
+
+            codigos_solicitud[codigo_barra] = id
+            skus_solicitud[sku] = id
+            cambios.append({
+                "id": id,
+                "sku": sku,
+                "descripcion": descripcion.capitalize(),
+                "codigo_barra": codigo_barra,
+                "unidad_entrega": unidad_entrega,
+                "categoria_id": categoria_id,
+                "precio_venta_unitario": precio_venta_unitario
+            })
+            resultados.append({"id": id, "ok": True})
+
+        # Igual que antes, un error de validación no modifica ningún producto
+        if any(not resultado["ok"] and resultado["msg"] != "Producto no encontrado" for resultado in resultados):
+            return jsonify({
+                "msg": "Productos no modificados, revisar errores",
+                "resultados": resultados,
+                "tiempo_ms": round((time.perf_counter() - inicio) * 1000, 2)
+            }), 400
+
+        if cambios:
+            # Los índices únicos se revisan fila a fila: los códigos que cambian pasan primero por un valor
+            # temporal, para que un intercambio entre productos de la solicitud no choque a medio camino
+            temporales = [{"id": cambio["id"], "codigo_barra": f"~{cambio['id']}", "sku": f"~{cambio['id']}"}
+                          for cambio in cambios if existentes[cambio["id"]] != (cambio["codigo_barra"], cambio["sku"])]
+            try:
+                if temporales:
+                    db.session.bulk_update_mappings(Producto, temporales)
+                db.session.bulk_update_mappings(Producto, cambios)
+                db.session.commit()
+            except IntegrityError:
+                # Otro proceso tomó uno de los códigos entre la validación y el UPDATE
+                db.session.rollback()
+                return jsonify({"msg": "Productos no modificados, código de barra o SKU duplicado"}), 400
+            incrementar_version("productos")
+
+        return jsonify({
+            "msg": "Productos modificados exitosamente",
+            "modificados": len(cambios),
+            "resultados": resultados,
+            "tiempo_ms": round((time.perf_counter() - inicio) * 1000, 2)
+        }), 200
+
+    # Elimina un producto
+    if request.method == 'DELETE':
+        producto = Producto.query.options(*CARGA_STOCK).get(id)
+        if producto:
+            producto.delete()
+            return jsonify({"msg": "Producto eliminado exitosamente"}), 200
+        else:
+            return jsonify({"msg": "Producto no encontrado"}), 400
+
+
+@inventario.route("/api/productos/<int:id>/kardex", methods=["GET"])
+@jwt_required
+def kardex_producto(id):
+    # Entradas y salidas del producto en orden, con saldo en cantidad y valor después de cada movimiento
+    if not db.session.query(Producto.query.filter_by(id=id).exists()).scalar():
+        return jsonify({"msg": "Producto no encontrado"}), 400
+    desde, hasta = leer_rango()
+    pagina = kardex(id, desde=desde, hasta=hasta, cursor=request.args.get("after", None))
+    return respuesta_paginada(pagina, lambda movimiento: movimiento), 200
+
+
+@inventario.route("/api/productos/importar", methods=["POST"])
+@jwt_required
+def importar_catalogo():
+    # Recibe un .csv o .xlsx con columnas sku, descripcion, codigo_barra, unidad_entrega, categoria_id
+    # y precio_venta_unitario. Los SKU existentes se actualizan.
+    if 'archivo' not in request.files or not request.files['archivo'].filename:
+        return jsonify({"msg": "Debe adjuntar un archivo"}), 400
+
+    archivo = request.files['archivo']
+    try:
+        resumen = importar_productos(leer_filas(archivo.stream, archivo.filename))
+    except ErrorImportacion as error:
+        return jsonify({"msg": str(error)}), 400
+
+    return jsonify(dict(resumen, msg="Importación finalizada")), 200
+
+
+@inventario.route("/api/productos/barcode/<codigo_barra>", methods=["GET"])
+@jwt_required
+def producto_por_codigo(codigo_barra):
+    # Busca por código de barra o SKU
+    producto = buscar_por_codigo([codigo_barra]).get(codigo_barra)
+    if not producto:
+        return jsonify({"msg": "Producto no encontrado"}), 400
+    return jsonify(producto), 200
+
+
+@inventario.route("/api/productos/barcode:batch", methods=["POST"])
+@jwt_required
+def productos_por_codigo():
+    codigos = request.json.get("codigos", None)
+
+    if not codigos or not isinstance(codigos, list):
+        return jsonify({"msg": "Debe enviar una lista de códigos"}), 400
+    if len(codigos) > current_app.config['PAGINA_MAXIMA']:
+        return jsonify({"msg": f"No se pueden buscar más de {current_app.config['PAGINA_MAXIMA']} códigos"}), 400
+
+    codigos = list(map(str, codigos))
+    encontrados = buscar_por_codigo(codigos)
+    return jsonify({
+        "productos": encontrados,
+        "no_encontrados": [codigo for codigo in codigos if codigo not in encontrados]
+    }), 200
+
+
+@inventario.route("/api/proveedores", methods=['GET', 'POST'])
+@inventario.route("/api/proveedores/<int:id>", methods=['GET', 'PUT', 'DELETE'])
+@jwt_required
+@etag_catalogo("proveedores")
+def proveedores(id=None):
+
+    if request.method == 'GET':
+        campos, expandir = leer_campos(Proveedor)
+        # DEVUELVE LISTADO CON TODOS LOS PROVEEDORES
+        if not id:
+            consulta = Proveedor.query.options(*opciones_carga(Proveedor, campos, expandir))
+            if quiere_stream():
+                return respuesta_stream(consulta, lambda proveedor: proveedor.serialize(campos, expandir), Proveedor.id)
+            proveedores = paginar(consulta, Proveedor.id)
+            if not proveedores.filas and not request.args.get("after"):
+                return jsonify({"msg": "No hay proveedores."})
+            return respuesta_paginada(proveedores, lambda proveedor: proveedor.serialize(campos, expandir)), 200
+
+        # DEVUELVE DETALLE DE PROVEEDOR POR ID
+        if id:
+            proveedor = Proveedor.query.options(*opciones_carga(Proveedor, campos, expandir)).get(id)
+            if proveedor:
+                return jsonify(proveedor.serialize(campos, expandir)), 200
+            else:
+                return jsonify({"msg": "Empresa no se encuentra en el sistema"}), 400
+
+    # PERMITE CREAR NUEVO PROVEEDOR
+    if request.method == 'POST':
+        nombre = request.json.get("nombre", None)
+        rut = request.json.get("rut", None)
+        razon_social = request.json.get("razon_social", None)
+        rubro = request.json.get("rubro", None)
+        direccion = request.json.get("direccion", None)
+        cuenta_corriente = request.json.get("cuenta_corriente", None)
+        banco = request.json.get("banco", None)
+
+        if not nombre:
+            return jsonify({"msg": "Nombre no puede estar vacío"}), 400
+        if not rut:
+            return jsonify({"msg": "Rut no puede estar vacío"}), 400
+        if not razon_social:
+            return jsonify({"msg": "Razon Social no puede estar vacío"}), 400
+        if not rubro:
+            return jsonify({"msg": "Rubro no puede estar vacío"}), 400
+        if not direccion:
+            return jsonify({"msg": "Dirección no puede estar vacío"}), 400
+        
+        check_rut = Proveedor.query.filter_by(rut=rut).first()
+        if check_rut:
+            return jsonify({"msg": "Rut de empresa ya se encuentra registrado"}), 400
+        check_razon_social = Proveedor.query.filter_by(razon_social=razon_social).first()
+        if check_razon_social:
+            return jsonify({"msg": "Razon social de empresa ya se encuentra registrado"}), 400
+
+        proveedor = Proveedor()
+        proveedor.nombre = nombre.capitalize()
+        proveedor.rut = rut
+        proveedor.razon_social = razon_social.capitalize()
+        proveedor.rubro = rubro.capitalize()
+        proveedor.direccion = direccion.capitalize()
+        proveedor.cuenta_corriente = cuenta_corriente
+        proveedor.banco = banco
+
+        proveedor.save()    
+        return jsonify(proveedor.serialize()), 200
+    
+    # PERMITE MODIFICAR PROVEEDOR
+    if request.method == 'PUT':
+        proveedor = Proveedor.query.get(id)
+        if not proveedor:
+            return jsonify({"msg": "Empresa no se encuentra en el sistema"}), 400
+            
+        nombre = request.json.get("nombre", None)
+        rut = request.json.get("rut", None)
+        razon_social = request.json.get("razon_social", None)
+        rubro = request.json.get("rubro", None)
+        direccion = request.json.get("direccion", None)
+        cuenta_corriente = request.json.get("cuenta_corriente", None)
+        banco = request.json.get("banco", None)
+
+        check_rut = Proveedor.query.filter_by(rut=rut).first()
+        if check_rut and check_rut.id != id:
+            return jsonify({"msg": "Rut de empresa ya se encuentra registrado"}), 400
+
+        check_razon_social = Proveedor.query.filter_by(razon_social=razon_social).first()
+        if check_razon_social and check_razon_social.id != id:
+            return jsonify({"msg": "Razon social de empresa ya se encuentra registrada"}), 400
+
+        # check_razon_social = Proveedor.query.filter_by(razon_social = razon_social).first()
+        # if check_razon_social and razon_social is not None:
+        #    return jsonify({"msg":"Razon social de empresa ya se encuentra registrada"}), 400
+
+        if nombre is not None:
+            if not nombre:
+                return jsonify({"msg": "Nombre no puede estar vacío"}), 400
+            proveedor.nombre = nombre.capitalize()
+
+        if rut is not None:
+            if not rut:
+                return jsonify({"msg": "Rut no puede estar vacío"}), 400
+            proveedor.rut = rut
+
+        if razon_social is not None:
+            if not razon_social:
+                return jsonify({"msg": "Razon Social no puede estar vacía"}), 400
+            proveedor.razon_social = razon_social.capitalize()
+        
+        if rubro is not None:
+            if not rubro:
+                return jsonify({"msg": "Rubro no puede estar vacío"}), 400
+            proveedor.rubro = rubro.capitalize()
+        
+        if direccion is not None:
+            if not direccion:
+                return jsonify({"msg": "Dirección no puede estar vacío"}), 400
+            proveedor.direccion = direccion.capitalize()
+
+        if cuenta_corriente is not None:
+            proveedor.cuenta_corriente = cuenta_corriente
+
+        if banco is not None:
+            proveedor.banco = banco
+
+        proveedor.update()
+         
+        return jsonify(proveedor.serialize()), 200
+
+    # PERMITE ELIMINAR PROVEEDOR
+    if request.method == 'DELETE':
+        proveedor = Proveedor.query.get(id)
+        if proveedor:
+            proveedor.delete()
+            return jsonify({"msg": f"Proveedor <{proveedor.nombre}> eliminado exitosamente."}), 200
+        else:
+            return jsonify({"msg": "Proveedor no se encuentra registrado."}), 400
+
+
+@inventario.route('/api/categorias', methods=['GET', "POST"])
+@inventario.route('/api/categorias/<int:id>', methods=["GET", "PUT", "DELETE"])
+@jwt_required
+@etag_catalogo("categorias")
+def categorias(id=None):
+    if request.method == 'GET':
+        campos, expandir = leer_campos(Categoria)
+        if not id:
+            consulta = Categoria.query.options(*opciones_carga(Categoria, campos, expandir))
+            if quiere_stream():
+                return respuesta_stream(consulta, lambda categoria: categoria.serialize(campos, expandir), Categoria.id)
+            categorias = paginar(consulta, Categoria.id)
+            if categorias.filas or request.args.get("after"):
+                return respuesta_paginada(categorias, lambda categoria: categoria.serialize(campos, expandir)), 200
+            return jsonify({"msg": "Actualmente no hay categorías"}), 400
+        if id:
+            categoria = Categoria.query.options(*opciones_carga(Categoria, campos, expandir)).get(id)
+            if categoria:
+                return (categoria.serialize(campos, expandir)), 200
+            else:
+                return jsonify({"msg": "Categoría no encontrada"}), 400
+    
+    if request.method == 'POST':
+        nombre = request.json.get("nombre", None)
+        if not nombre:
+            return jsonify({"msg": "por favor ingresar nombre de categoría válido"})
+        name_overlapped = Categoria.query.filter_by(nombre=nombre).first()
+        if name_overlapped:
+            return jsonify({"msg": "Categoría ya existe"})
+
+        categoria = Categoria()
+        categoria.nombre = nombre.capitalize()
+        
+        categoria.save()    
+        return jsonify(categoria.serialize()), 200
+    
+    if request.method == 'PUT':
+        
+        nombre = request.json.get("nombre", None)
+        
+        if not nombre:
+            return jsonify({"msg": "Categoría no puede estar vacío"}), 400
+                    
+        categoria_update = Categoria.query.get(id)
+        if not categoria_update:
+            return jsonify({"msg": "Categoría no se encuentra en el sistema"}), 400
+        
+        categoria_ocupada = Categoria.query.filter_by(nombre=nombre).first()
+        if categoria_ocupada and categoria_ocupada.id != id:
+            return jsonify({"msg": "Categoría ya se encuentra registrada."}), 400
+        
+        
+        categoria_update.nombre = nombre.capitalize()
+        categoria_update.update()
+        
+        return jsonify(categoria_update.serialize()), 200
+
+
+@inventario.route('/api/stock', methods=['GET'])
+@jwt_required
+def stock():
+    as_of = request.args.get("as_of", None)
+    # ?fields= filtra las llaves de serialize_stock()
+    campos = request.args.get("fields", None)
+    campos = [campo.strip() for campo in campos.split(",") if campo.strip()] if campos else None
+
+    # Stock histórico al cierre del día indicado, calculado desde las fotos diarias
+    if as_of:
+        try:
+            fecha = datetime.datetime.strptime(as_of, "%Y-%m-%d").date()
+        except ValueError:
+            return jsonify({"msg": "Fecha as_of debe tener formato YYYY-MM-DD"}), 400
+        saldos = Stock_Diario.saldos_al(fecha)
+        serializar = lambda producto: filtrar_campos(producto.serialize_stock(saldos.get(producto.id, (0, 0))), campos)
+        if quiere_stream():
+            return respuesta_stream(Producto.query, serializar, Producto.id)
+        productos = paginar(Producto.query, Producto.id)
+        return respuesta_paginada(productos, serializar), 200
+
+    # Un solo SELECT: el saldo viene de stock_productos unido por llave primaria
+    serializar = lambda producto: filtrar_campos(producto.serialize_stock(), campos)
+    if quiere_stream():
+        return respuesta_stream(Producto.query.options(*CARGA_STOCK), serializar, Producto.id)
+    productos = paginar(Producto.query.options(*CARGA_STOCK), Producto.id)
+    return respuesta_paginada(productos, serializar), 200
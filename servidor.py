@@ -0,0 +1,44 @@
+import multiprocessing
+import os
+
+# Parámetros del servidor de producción (gunicorn.conf.py) y del pool de conexiones que usa cada
+# proceso. Se leen de variables de entorno para que ambos calculen lo mismo sin importar la app.
+DB_MAX_CONEXIONES = 150  # max_connections de MySQL es 151 por defecto
+DB_CONEXIONES_RESERVADAS = 10  # para comandos de manage, cron y administración
+DB_POOL_RECYCLE = 280  # segundos, menor que el wait_timeout habitual de los MySQL administrados
+
+
+def _entero(variable, defecto):
+    valor = os.environ.get(variable)
+    return int(valor) if valor else defecto
+
+
+def cantidad_workers():
+    return _entero("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1)
+
+
+def clase_worker():
+    return os.environ.get("GUNICORN_WORKER_CLASS", "gthread")  # gthread o gevent
+
+
+def concurrencia_worker():
+    # Solicitudes simultáneas que puede atender cada proceso
+    if clase_worker() == "gevent":
+        return _entero("GUNICORN_WORKER_CONNECTIONS", 100)
+    return _entero("GUNICORN_THREADS", 4)
+
+
+def opciones_pool():
+    # Reparte el máximo de conexiones de MySQL entre los procesos: cada uno abre como base una
+    # conexión por solicitud simultánea y el overflow cubre lo que quede de su cuota.
+    disponibles = _entero("DB_MAX_CONEXIONES", DB_MAX_CONEXIONES) - \
+        _entero("DB_CONEXIONES_RESERVADAS", DB_CONEXIONES_RESERVADAS)
+    cuota = max(disponibles // cantidad_workers(), 1)
+    pool_size = min(concurrencia_worker(), cuota)
+    return {
+        "pool_size": pool_size,
+        "max_overflow": cuota - pool_size,
+        "pool_timeout": _entero("DB_POOL_TIMEOUT", 10),
+        "pool_recycle": _entero("DB_POOL_RECYCLE", DB_POOL_RECYCLE),
+        "pool_pre_ping": True,
+    }
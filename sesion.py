@@ -0,0 +1,46 @@
+from flask import current_app, g
+from flask_jwt_extended import get_jwt_identity
+
+from cache import LRU
+from models import Usuario
+from versiones import version
+
+CACHE_USUARIOS = 1000
+CACHE_USUARIOS_TTL = 60  # segundos
+CAMPOS_SESION = ("id", "nombre", "apellido", "codigo", "rol", "email", "status", "empresa_id")
+
+_cache = None
+_version_cache = None
+
+
+def _cache_usuarios():
+    # Igual que la caché de códigos en catalogo.py: se vacía cuando cambia la versión de usuarios,
+    # que se incrementa al actualizar o eliminar un usuario en cualquier worker.
+    global _cache, _version_cache
+    if _cache is None:
+        _cache = LRU(current_app.config.get("CACHE_USUARIOS", CACHE_USUARIOS),
+                     ttl=current_app.config.get("CACHE_USUARIOS_TTL", CACHE_USUARIOS_TTL))
+    vigente = version("usuarios")
+    if vigente != _version_cache:
+        _cache.clear()
+        _version_cache = vigente
+    return _cache
+
+
+def usuario_actual():
+    # Usuario del token como diccionario con CAMPOS_SESION, o None si ya no existe o está inactivo.
+    # Se resuelve una vez por solicitud y sin consultar la base de datos mientras esté en caché.
+    if "usuario_actual" in g:
+        return g.usuario_actual
+
+    email = get_jwt_identity()
+    cache = _cache_usuarios()
+    usuario = cache.get(email)
+    if usuario is None and email:
+        encontrado = Usuario.query.filter_by(email=email).first()
+        if encontrado:
+            usuario = encontrado.serialize(CAMPOS_SESION)
+            cache.put(email, usuario)
+
+    g.usuario_actual = usuario if usuario and usuario["status"] else None
+    return g.usuario_actual
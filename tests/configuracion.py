@@ -0,0 +1,12 @@
+# Configuración de las pruebas. Va aparte de conftest.py para poder usarla con
+# APP_CONFIG=tests.configuracion.Pruebas en un intérprete nuevo sin importar pytest.
+
+
+class Pruebas:
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = "sqlite://"
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    JWT_SECRET_KEY = "pruebas"
+    BCRYPT_LOG_ROUNDS = 4
+    MAIL_SUPPRESS_SEND = True
+    MAIL_DEFAULT_SENDER = "pruebas@example.com"
@@ -0,0 +1,24 @@
+import os
+
+import pytest
+
+from arranque import medir_arranque
+
+
+@pytest.fixture(scope="module")
+def medicion():
+    # El intérprete nuevo crea la app con la configuración de pruebas en vez de config.Development
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setenv("APP_CONFIG", "tests.configuracion.Pruebas")
+        monkeypatch.setenv("CARGA_ESTRICTA", "1")
+        yield medir_arranque()
+
+
+# El tiempo de pared depende de la máquina: solo se mide al pedirlo, p. ej. MEDIR_ARRANQUE=1 pytest
+@pytest.mark.skipif(not os.environ.get("MEDIR_ARRANQUE"), reason="MEDIR_ARRANQUE no definido")
+def test_arranque_dentro_del_presupuesto(app, medicion):
+    assert medicion["importar"] + medicion["crear"] <= app.config["ARRANQUE_MAXIMO"], medicion["lentos"]
+
+
+def test_extensiones_diferidas_no_se_importan_al_arrancar(medicion):
+    assert medicion["cargados"] == []
@@ -0,0 +1,71 @@
+import json
+
+import pytest
+
+
+@pytest.fixture
+def factura_id(movimientos, ahora):
+    producto_id = movimientos.producto()
+    return movimientos.compra(producto_id, 10, 5, ahora)
+
+
+def test_fields_limita_las_columnas(cliente, headers, movimientos):
+    movimientos.producto()
+    respuesta = cliente.get("/api/productos?fields=id,sku", headers=headers)
+
+    assert respuesta.status_code == 200
+    assert respuesta.get_json() == [{"id": 1, "sku": "P1"}]
+
+
+def test_expand_anidado_con_fields(cliente, headers, factura_id):
+    respuesta = cliente.get(f"/api/facturas-compras/{factura_id}?fields=id,folio&expand=entradas_inventario.producto",
+                            headers=headers)
+
+    assert respuesta.status_code == 200, respuesta.get_data(as_text=True)
+    datos = respuesta.get_json()
+    assert set(datos) == {"id", "folio", "entradas_inventario"}
+    [entrada] = datos["entradas_inventario"]
+    assert entrada["cantidad"] == 10
+    assert entrada["producto"]["sku"] == "P1"
+
+
+def test_expand_sin_fields_conserva_todas_las_columnas(cliente, headers, factura_id):
+    por_defecto = cliente.get(f"/api/facturas-compras/{factura_id}", headers=headers).get_json()
+    expandida = cliente.get(f"/api/facturas-compras/{factura_id}?expand=entradas_inventario",
+                            headers=headers).get_json()
+
+    assert set(expandida) == set(por_defecto)
+    assert "producto" not in expandida["entradas_inventario"][0]
+
+
+def test_fields_en_respuestas_armadas_a_mano(cliente, headers, factura_id):
+    respuesta = cliente.get("/api/stock?fields=id,inventario_disponible", headers=headers)
+
+    assert respuesta.get_json() == [{"id": 1, "inventario_disponible": 10}]
+
+
+@pytest.mark.parametrize("url, mensaje", [
+    ("/api/productos?fields=id,clave", "Campos no permitidos: clave"),
+    ("/api/facturas-compras?expand=proveedor_secreto", "No se puede expandir proveedor_secreto"),
+    ("/api/facturas-compras?expand=entradas_inventario.factura", "No se puede expandir factura"),
+])
+def test_campos_o_expansiones_desconocidos_son_400(cliente, headers, factura_id, url, mensaje):
+    respuesta = cliente.get(url, headers=headers)
+
+    assert respuesta.status_code == 400
+    assert respuesta.get_json() == {"msg": mensaje}
+
+
+def test_stream_respeta_fields_y_expand_entre_lotes(app, cliente, headers, movimientos, ahora):
+    # Entre lotes se vacía la sesión: cada lote vuelve a cargar sus salidas con el mismo plan
+    app.config["STREAM_LOTE"] = 2
+    producto_id = movimientos.producto()
+    movimientos.compra(producto_id, 10, 5, ahora)
+    ids = [movimientos.venta(producto_id, cantidad, 100, ahora) for cantidad in (1, 2, 3)]
+    respuesta = cliente.get("/api/documentos-venta?fields=id,monto_total&expand=salidas_inventario",
+                            headers=dict(headers, Accept="application/x-ndjson"))
+
+    documentos = [json.loads(linea) for linea in respuesta.get_data(as_text=True).splitlines()]
+    assert [set(documento) for documento in documentos] == [{"id", "monto_total", "salidas_inventario"}] * 3
+    assert [(documento["id"], [salida["cantidad"] for salida in documento["salidas_inventario"]])
+            for documento in documentos] == list(zip(ids, ([1], [2], [3])))
@@ -0,0 +1,50 @@
+import pytest
+import sqlalchemy.exc
+
+import models
+from models import db, Documento_Venta
+
+
+def test_tests_corren_en_modo_estricto():
+    assert models.CARGA_PEREZOSA == "raise_on_sql"
+
+
+def test_relacion_fuera_del_plan_lanza_error(app, movimientos, ahora):
+    producto_id = movimientos.producto()
+    movimientos.compra(producto_id, 10, 5, ahora)
+    id = movimientos.venta(producto_id, 2, 100, ahora)
+    with app.app_context():
+        documento = Documento_Venta.query.get(id)
+        with pytest.raises(sqlalchemy.exc.InvalidRequestError):
+            documento.salidas_I
+
+
+def test_plan_de_carga_cubre_las_expansiones(app, movimientos, ahora):
+    producto_id = movimientos.producto()
+    movimientos.compra(producto_id, 10, 5, ahora)
+    id = movimientos.venta(producto_id, 2, 100, ahora)
+    with app.app_context():
+        campos, expandir = ["id", "numero_documento"], {"salidas_inventario": {}}
+        documento = Documento_Venta.query.options(*models.opciones_carga(Documento_Venta, campos, expandir)).get(id)
+        datos = documento.serialize(campos, expandir)
+        db.session.remove()
+    assert datos["numero_documento"] == 1
+    assert [salida["cantidad"] for salida in datos["salidas_inventario"]] == [2]
+
+
+@pytest.mark.parametrize("url", [
+    "/api/documentos-venta",
+    "/api/documentos-venta/1",
+    "/api/documentos-venta?fields=id,monto_total&expand=salidas_inventario",
+    "/api/facturas-compras",
+    "/api/facturas-compras/1?expand=entradas_inventario.producto",
+    "/api/entradas-inventario",
+    "/api/productos",
+    "/api/stock",
+])
+def test_rutas_no_cargan_relaciones_fuera_del_plan(cliente, headers, movimientos, ahora, url):
+    producto_id = movimientos.producto()
+    movimientos.compra(producto_id, 10, 5, ahora)
+    movimientos.venta(producto_id, 2, 100, ahora)
+    respuesta = cliente.get(url, headers=headers)
+    assert respuesta.status_code == 200, respuesta.get_data(as_text=True)
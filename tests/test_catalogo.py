@@ -0,0 +1,63 @@
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+import catalogo
+from catalogo import NINGUNO, buscar_por_codigo
+from models import db, Producto
+
+
+@contextmanager
+def _consultas():
+    ejecutadas = []
+
+    def contar(conexion, cursor, sentencia, *args):
+        ejecutadas.append(sentencia)
+
+    event.listen(db.engine, "before_cursor_execute", contar)
+    try:
+        yield ejecutadas
+    finally:
+        event.remove(db.engine, "before_cursor_execute", contar)
+
+
+def test_busca_por_codigo_de_barra_o_sku(app, movimientos):
+    movimientos.producto("P1")
+    with app.app_context():
+        encontrados = buscar_por_codigo(["780P1", "P1", "nada"])
+
+    assert {codigo: producto["sku"] for codigo, producto in encontrados.items()} == {"780P1": "P1", "P1": "P1"}
+
+
+def test_codigo_de_barra_tiene_prioridad_sobre_sku(app, movimientos):
+    movimientos.producto("P1")
+    with app.app_context():
+        db.session.add(Producto(sku="780P1", descripcion="Otro", codigo_barra="999", unidad_entrega="unidad",
+                                categoria_id=1))
+        db.session.commit()
+        assert buscar_por_codigo(["780P1"])["780P1"]["sku"] == "P1"
+        assert buscar_por_codigo(["780P1"])["780P1"]["sku"] == "P1"  # también desde la caché
+
+
+def test_codigo_inexistente_queda_en_cache_hasta_la_proxima_escritura(app, movimientos):
+    movimientos.producto("P1")
+    with app.app_context():
+        assert buscar_por_codigo(["780P1", "nada"]).keys() == {"780P1"}
+        with _consultas() as ejecutadas:
+            assert buscar_por_codigo(["780P1", "nada"]).keys() == {"780P1"}
+        assert ejecutadas == []
+        assert catalogo._cache.get(("barra", "nada")) is NINGUNO
+
+        # save() incrementa la versión de productos y la caché se descarta en todos los workers
+        Producto(sku="P2", descripcion="Nuevo", codigo_barra="nada", unidad_entrega="unidad", categoria_id=1).save()
+        assert buscar_por_codigo(["nada"])["nada"]["sku"] == "P2"
+
+
+def test_consulta_por_lote(cliente, headers, movimientos):
+    movimientos.producto("P1")
+    respuesta = cliente.post("/api/productos/barcode:batch", headers=headers, json={"codigos": ["780P1", 123]})
+
+    assert respuesta.status_code == 200
+    datos = respuesta.get_json()
+    assert list(datos["productos"]) == ["780P1"]
+    assert datos["no_encontrados"] == ["123"]
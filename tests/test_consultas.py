@@ -0,0 +1,94 @@
+import json
+from datetime import timedelta
+
+import pytest
+
+from consultas import ErrorConsulta, paginar
+from models import Documento_Venta, Producto
+
+
+@pytest.fixture
+def productos(movimientos):
+    return [movimientos.producto(f"P{numero}") for numero in range(1, 6)]
+
+
+def _recorrer(cliente, headers, url):
+    ids, paginas = [], 0
+    while url:
+        respuesta = cliente.get(url, headers=headers)
+        assert respuesta.status_code == 200, respuesta.get_data(as_text=True)
+        ids += [producto["id"] for producto in respuesta.get_json()]
+        paginas += 1
+        url = respuesta.headers["Link"].split(">")[0].lstrip("<") if "X-Next-Cursor" in respuesta.headers else None
+    return ids, paginas
+
+
+def test_paginas_siguen_el_cursor_hasta_el_final(cliente, headers, productos):
+    primera = cliente.get("/api/productos?limit=2&fields=id", headers=headers)
+    assert [producto["id"] for producto in primera.get_json()] == productos[:2]
+    assert 'rel="next"' in primera.headers["Link"]
+    assert "after=" in primera.headers["Link"] and "fields=id" in primera.headers["Link"]
+
+    assert _recorrer(cliente, headers, "/api/productos?limit=2") == (productos, 3)
+
+
+def test_cursor_no_repite_ni_salta_filas_nuevas(cliente, headers, productos, movimientos):
+    primera = cliente.get("/api/productos?limit=2", headers=headers)
+    nuevo = movimientos.producto("P6")
+    ids, paginas = _recorrer(cliente, headers, f"/api/productos?limit=2&after={primera.headers['X-Next-Cursor']}")
+
+    assert ids == productos[2:] + [nuevo]
+
+
+def test_limite_se_acota_al_maximo(app, cliente, headers, productos):
+    app.config["PAGINA_MAXIMA"] = 3
+    respuesta = cliente.get("/api/productos?limit=1000", headers=headers)
+
+    assert len(respuesta.get_json()) == 3
+    assert "limit=3" in respuesta.headers["Link"]
+
+
+@pytest.mark.parametrize("url, mensaje", [
+    ("/api/productos?limit=cero", "limit debe ser un número entero"),
+    ("/api/productos?limit=0", "limit debe ser mayor a 0"),
+    ("/api/productos?after=no-es-un-cursor", "Cursor after inválido"),
+])
+def test_parametros_invalidos_son_400(cliente, headers, productos, url, mensaje):
+    respuesta = cliente.get(url, headers=headers)
+
+    assert respuesta.status_code == 400
+    assert respuesta.get_json() == {"msg": mensaje}
+
+
+def test_stream_devuelve_la_coleccion_completa_en_lotes(app, cliente, headers, productos):
+    app.config["STREAM_LOTE"] = 2
+    # Cada respuesta se lee completa antes de la siguiente solicitud: el generador conserva el contexto
+    arreglo = cliente.get("/api/productos?stream=1", headers=headers)
+    assert arreglo.mimetype == "application/json"
+    assert [producto["id"] for producto in json.loads(arreglo.get_data(as_text=True))] == productos
+
+    ndjson = cliente.get("/api/productos", headers=dict(headers, Accept="application/x-ndjson"))
+    assert ndjson.mimetype == "application/x-ndjson"
+    assert [json.loads(linea)["id"] for linea in ndjson.get_data(as_text=True).splitlines()] == productos
+
+
+def test_cursor_de_varias_columnas_con_fechas_repetidas(app, movimientos, ahora):
+    producto_id = movimientos.producto()
+    movimientos.compra(producto_id, 100, 5, ahora - timedelta(days=1))
+    fechas = [ahora - timedelta(hours=horas) for horas in (1, 3, 3, 3, 2)]
+    ids = [movimientos.venta(producto_id, 1, 100, fecha) for fecha in fechas]
+    esperado = [id for fecha, id in sorted(zip(fechas, ids))]
+
+    vistos, cursor = [], None
+    with app.test_request_context():
+        while True:
+            pagina = paginar(Documento_Venta.query, Documento_Venta.fecha_emision, Documento_Venta.id,
+                             limite=2, cursor=cursor)
+            vistos += [documento.id for documento in pagina.filas]
+            if not pagina.siguiente:
+                break
+            cursor = pagina.siguiente
+        with pytest.raises(ErrorConsulta):
+            paginar(Producto.query, Producto.id, cursor=cursor)
+
+    assert vistos == esperado
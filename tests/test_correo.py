@@ -0,0 +1,182 @@
+import smtplib
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from correo import encolar_correo, enviar_pendientes, obtener_mail, procesar_cola
+from models import db, Correo_Saliente
+
+
+class ServidorFalso:
+    # Reemplaza la conexión de flask_mail.Mail: rechaza a los destinatarios indicados o toda la conexión.
+    # Message sigue tomando el remitente de la extensión, por eso se inicializa igual.
+    def __init__(self, app, rechazados=(), caido=False):
+        with app.app_context():
+            obtener_mail()
+        self.rechazados = set(rechazados)
+        self.caido = caido
+        self.enviados = []
+
+    @contextmanager
+    def connect(self):
+        if self.caido:
+            raise ConnectionRefusedError("SMTP no disponible")
+        yield self
+
+    def send(self, mensaje):
+        if self.rechazados & set(mensaje.recipients):
+            raise smtplib.SMTPRecipientsRefused({destinatario: (550, b"rechazado") for destinatario in mensaje.recipients})
+        self.enviados.append(mensaje)
+
+
+def _correos(app):
+    with app.app_context():
+        return {correo.destinatarios: (correo.estado, correo.intentos, correo.proximo_intento, correo.ultimo_error)
+                for correo in Correo_Saliente.query}
+
+
+def test_envia_la_cola_con_flask_mail(app):
+    with app.app_context():
+        encolar_correo("Hola", ["a@example.com", "b@example.com"], cuerpo="Texto")
+        with obtener_mail().record_messages() as enviados:
+            resumen = enviar_pendientes()
+        assert [mensaje.recipients for mensaje in enviados] == [["a@example.com", "b@example.com"]]
+        correo = Correo_Saliente.query.one()
+        assert correo.estado == "enviado"
+        assert correo.intentos == 1
+        assert correo.fecha_envio is not None
+    assert resumen == {"enviados": 1, "reintentos": 0, "fallidos": 0}
+
+
+def test_rechazo_reprograma_con_espera_exponencial(app):
+    app.config.update(CORREO_REINTENTO_BASE=30, CORREO_REINTENTO_MAXIMO=3600)
+    servidor = ServidorFalso(app, rechazados={"malo@example.com"})
+    with app.app_context():
+        encolar_correo("Uno", ["malo@example.com"])
+        encolar_correo("Dos", ["bueno@example.com"])
+        antes = datetime.now()
+        resumen = enviar_pendientes(servidor)
+        # El reintento aún no vence: la siguiente pasada no lo vuelve a tomar
+        assert enviar_pendientes(servidor) == {"enviados": 0, "reintentos": 0, "fallidos": 0}
+
+    assert resumen == {"enviados": 1, "reintentos": 1, "fallidos": 0}
+    assert [mensaje.recipients for mensaje in servidor.enviados] == [["bueno@example.com"]]
+    estado, intentos, proximo_intento, ultimo_error = _correos(app)["malo@example.com"]
+    assert (estado, intentos) == ("pendiente", 1)
+    assert antes + timedelta(seconds=29) <= proximo_intento <= datetime.now() + timedelta(seconds=31)
+    assert "rechazado" in ultimo_error
+
+    with app.app_context():
+        correo = Correo_Saliente.query.filter_by(destinatarios="malo@example.com").one()
+        correo.proximo_intento = datetime.now() - timedelta(seconds=1)
+        db.session.commit()
+        enviar_pendientes(servidor)
+    estado, intentos, proximo_intento, ultimo_error = _correos(app)["malo@example.com"]
+    assert (estado, intentos) == ("pendiente", 2)
+    assert proximo_intento >= datetime.now() + timedelta(seconds=59)  # la espera se duplica
+
+
+def test_espera_no_pasa_el_maximo(app):
+    app.config.update(CORREO_REINTENTO_BASE=30, CORREO_REINTENTO_MAXIMO=100, CORREO_MAX_INTENTOS=10)
+    servidor = ServidorFalso(app, rechazados={"malo@example.com"})
+    with app.app_context():
+        correo = encolar_correo("Uno", ["malo@example.com"])
+        correo.intentos = 5
+        db.session.commit()
+        enviar_pendientes(servidor)
+    estado, intentos, proximo_intento, ultimo_error = _correos(app)["malo@example.com"]
+    assert intentos == 6
+    assert datetime.now() + timedelta(seconds=99) <= proximo_intento <= datetime.now() + timedelta(seconds=100)
+
+
+def test_agotados_los_intentos_queda_fallido(app):
+    app.config.update(CORREO_MAX_INTENTOS=3, CORREO_REINTENTO_BASE=0)
+    servidor = ServidorFalso(app, rechazados={"malo@example.com"})
+    with app.app_context():
+        encolar_correo("Uno", ["malo@example.com"])
+        resumenes = list(procesar_cola(servidor))
+
+    assert [resumen["reintentos"] for resumen in resumenes] == [1, 1, 0, 0]
+    assert resumenes[2]["fallidos"] == 1
+    estado, intentos, proximo_intento, ultimo_error = _correos(app)["malo@example.com"]
+    assert (estado, intentos) == ("fallido", 3)
+    assert servidor.enviados == []
+
+
+def test_correo_que_no_se_puede_armar_cuenta_como_intento(app):
+    app.config.update(CORREO_MAX_INTENTOS=2, CORREO_REINTENTO_BASE=0)
+    servidor = ServidorFalso(app)
+    del app.extensions["mail"]  # Message no encuentra el remitente por defecto
+    with app.app_context():
+        encolar_correo("Uno", ["a@example.com"])
+        resumenes = list(procesar_cola(servidor))
+
+    assert [resumen["fallidos"] for resumen in resumenes] == [0, 1, 0]
+    estado, intentos, proximo_intento, ultimo_error = _correos(app)["a@example.com"]
+    assert (estado, intentos) == ("fallido", 2)
+
+
+def test_sin_conexion_reintenta_todo_el_lote(app):
+    app.config.update(CORREO_REINTENTO_BASE=30)
+    with app.app_context():
+        encolar_correo("Uno", ["a@example.com"])
+        encolar_correo("Dos", ["b@example.com"])
+        resumen = enviar_pendientes(ServidorFalso(app, caido=True))
+
+    assert resumen == {"enviados": 0, "reintentos": 2, "fallidos": 0}
+    for estado, intentos, proximo_intento, ultimo_error in _correos(app).values():
+        assert (estado, intentos, ultimo_error) == ("pendiente", 1, "SMTP no disponible")
+
+
+def test_envia_fuera_de_la_transaccion_con_las_filas_reclamadas(app):
+    servidor = ServidorFalso(app)
+    vistos = []
+
+    def enviar(mensaje, enviar=servidor.send):
+        # Otra conexión ve el reclamo ya confirmado y puede escribir: la sesión no retiene bloqueos
+        vistos.append(tuple(db.engine.execute("SELECT estado, reclamado_por FROM correos_salientes").first()))
+        db.engine.execute("UPDATE correos_salientes SET ultimo_error = 'visto'")
+        enviar(mensaje)
+
+    servidor.send = enviar
+    with app.app_context():
+        encolar_correo("Uno", ["a@example.com"])
+        resumen = enviar_pendientes(servidor)
+
+    assert resumen == {"enviados": 1, "reintentos": 0, "fallidos": 0}
+    estado, reclamado_por = vistos[0]
+    assert estado == "enviando" and reclamado_por
+    assert _correos(app)["a@example.com"][:2] == ("enviado", 1)
+
+
+def test_reclamo_vencido_se_retoma_y_el_vigente_se_respeta(app):
+    app.config.update(CORREO_RECLAMO=600)
+    servidor = ServidorFalso(app)
+    with app.app_context():
+        for destinatario, antiguedad in (("caido@example.com", 3600), ("vivo@example.com", 10)):
+            correo = encolar_correo("Uno", [destinatario])
+            correo.estado = "enviando"
+            correo.reclamado_por = "otro-worker"
+            correo.fecha_reclamo = datetime.now() - timedelta(seconds=antiguedad)
+        db.session.commit()
+        resumen = enviar_pendientes(servidor)
+
+    assert resumen == {"enviados": 1, "reintentos": 0, "fallidos": 0}
+    assert [mensaje.recipients for mensaje in servidor.enviados] == [["caido@example.com"]]
+    assert _correos(app)["vivo@example.com"][:2] == ("enviando", 0)
+
+
+def test_no_pisa_un_correo_que_otro_worker_retomo(app):
+    servidor = ServidorFalso(app)
+
+    def enviar(mensaje, enviar=servidor.send):
+        # Este envío tardó más que CORREO_RECLAMO y otro worker ya tomó la fila
+        db.engine.execute("UPDATE correos_salientes SET reclamado_por = 'otro-worker'")
+        enviar(mensaje)
+
+    servidor.send = enviar
+    with app.app_context():
+        encolar_correo("Uno", ["a@example.com"])
+        resumen = enviar_pendientes(servidor)
+
+    assert resumen == {"enviados": 0, "reintentos": 0, "fallidos": 0}
+    assert _correos(app)["a@example.com"][:2] == ("enviando", 0)
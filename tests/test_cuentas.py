@@ -0,0 +1,21 @@
+from flask_jwt_extended import create_access_token
+
+from models import db, Usuario
+
+
+def _token(app, email):
+    with app.app_context():
+        return {"Authorization": f"Bearer {create_access_token(identity=email)}"}
+
+
+def test_metricas_de_claves_solo_para_administradores(app, cliente, headers):
+    with app.app_context():
+        db.session.add(Usuario(nombre="Beto", apellido="Rojas", rut="2-7", rol="Cajero", email="cajero@example.com",
+                               password="-", empresa_id=1, codigo="usr2"))
+        db.session.commit()
+
+    assert cliente.get("/api/metricas/claves", headers=headers).status_code == 200
+    respuesta = cliente.get("/api/metricas/claves", headers=_token(app, "cajero@example.com"))
+    assert respuesta.status_code == 403
+    assert respuesta.get_json() == {"msg": "Usuario no autorizado"}
+    assert cliente.get("/api/metricas/claves", headers=_token(app, "nadie@example.com")).status_code == 401
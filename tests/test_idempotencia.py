@@ -0,0 +1,97 @@
+import hashlib
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import db, Clave_Idempotencia, Documento_Venta
+
+
+@pytest.fixture
+def venta(movimientos):
+    producto_id = movimientos.producto()
+    return {
+        "datosVenta": {"tipo_documento": "boleta", "numero_documento": 1, "monto_neto": 100, "monto_iva": 19,
+                       "monto_total": 119, "forma_pago": "efectivo"},
+        "detalleProductos": [{"cantidad": 1, "precio_venta_unitario": 119, "total": 119, "producto_id": producto_id}],
+    }
+
+
+def _enviar(cliente, headers, venta, clave="clave-1"):
+    return cliente.post("/api/documentos-venta", data=json.dumps(venta), content_type="application/json",
+                        headers=dict(headers, **{"Idempotency-Key": clave}))
+
+
+def _reservar(app, venta, antiguedad, clave="clave-1"):
+    # Reserva como la deja una solicitud que sigue en curso, o cuyo worker murió sin liberarla
+    fecha_registro = datetime.now().replace(microsecond=0) - antiguedad
+    with app.app_context():
+        db.session.add(Clave_Idempotencia(usuario="admin@example.com", clave=clave, ruta="/api/documentos-venta",
+                                          huella=hashlib.sha256(json.dumps(venta).encode()).hexdigest(),
+                                          fecha_registro=fecha_registro,
+                                          fecha_expiracion=fecha_registro + timedelta(days=1)))
+        db.session.commit()
+
+
+def _documentos(app):
+    with app.app_context():
+        return Documento_Venta.query.count()
+
+
+def test_reintento_repite_la_respuesta_guardada(app, cliente, headers, venta):
+    primera = _enviar(cliente, headers, venta)
+    segunda = _enviar(cliente, headers, venta)
+
+    assert primera.status_code == 201
+    assert "Idempotent-Replayed" not in primera.headers
+    assert segunda.status_code == 201
+    assert segunda.get_json() == primera.get_json()
+    assert segunda.headers["Idempotent-Replayed"] == "true"
+    assert _documentos(app) == 1
+
+
+def test_misma_clave_con_otro_cuerpo_es_422(app, cliente, headers, venta):
+    _enviar(cliente, headers, venta)
+    venta["datosVenta"]["numero_documento"] = 2
+    respuesta = _enviar(cliente, headers, venta)
+
+    assert respuesta.status_code == 422
+    assert _documentos(app) == 1
+
+
+def test_solicitud_en_curso_es_409(app, cliente, headers, venta):
+    _reservar(app, venta, timedelta(seconds=5))
+    respuesta = _enviar(cliente, headers, venta)
+
+    assert respuesta.status_code == 409
+    assert _documentos(app) == 0
+
+
+def test_reserva_abandonada_se_retoma(app, cliente, headers, venta):
+    app.config["IDEMPOTENCIA_RESERVA"] = 60
+    _reservar(app, venta, timedelta(minutes=5))
+
+    respuesta = _enviar(cliente, headers, venta)
+    assert respuesta.status_code == 201, respuesta.get_data(as_text=True)
+    repetida = _enviar(cliente, headers, venta)
+    assert repetida.status_code == 201
+    assert repetida.headers["Idempotent-Replayed"] == "true"
+    assert _documentos(app) == 1
+
+
+def test_reserva_abandonada_con_otro_cuerpo_sigue_siendo_422(app, cliente, headers, venta):
+    _reservar(app, venta, timedelta(minutes=5))
+    venta["datosVenta"]["numero_documento"] = 2
+    respuesta = _enviar(cliente, headers, venta)
+
+    assert respuesta.status_code == 422
+    assert _documentos(app) == 0
+
+
+def test_clave_vencida_se_reutiliza_con_otro_cuerpo(app, cliente, headers, venta):
+    _reservar(app, venta, timedelta(days=2))
+    venta["datosVenta"]["numero_documento"] = 2
+    respuesta = _enviar(cliente, headers, venta)
+
+    assert respuesta.status_code == 201
+    assert _documentos(app) == 1
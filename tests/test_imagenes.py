@@ -0,0 +1,174 @@
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from PIL import Image
+from werkzeug.datastructures import FileStorage
+
+import imagenes
+from imagenes import ErrorImagen, VARIANTES, carpeta_imagenes, guardar_imagen, nombre_variante
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    # Pool propio por prueba: al cerrarlo con wait=True terminan las variantes y sus callbacks
+    pool = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(imagenes, "_obtener_pool", lambda: pool)
+    yield pool
+    pool.shutdown(wait=True)
+
+
+def _foto(formato="JPEG", tamano=(2000, 1000), exif=True):
+    imagen = Image.new("RGB", tamano, (200, 30, 30))
+    salida = io.BytesIO()
+    if exif:
+        datos = Image.Exif()
+        datos[0x010F] = "Camara"  # Make
+        datos[0x8825] = {2: (33.0, 27.0, 0.0)}  # GPSInfo, GPSLatitude
+        imagen.save(salida, formato, exif=datos.tobytes())
+    else:
+        imagen.save(salida, formato)
+    return salida.getvalue()
+
+
+def _guardar(app, contenido, nombre="foto.jpg"):
+    with app.test_request_context():
+        return guardar_imagen(FileStorage(io.BytesIO(contenido), filename=nombre))
+
+
+def _archivos(app):
+    with app.app_context():
+        carpeta = carpeta_imagenes()
+    return sorted(os.listdir(carpeta)) if os.path.isdir(carpeta) else []
+
+
+def test_variantes_se_guardan_como_jpeg_sin_metadatos(app, pool):
+    nombre = _guardar(app, _foto())
+    pool.shutdown(wait=True)
+
+    assert _archivos(app) == sorted(nombre_variante(nombre, variante) for variante in VARIANTES)
+    with app.app_context():
+        carpeta = carpeta_imagenes()
+    for variante, lado in VARIANTES.items():
+        with Image.open(os.path.join(carpeta, nombre_variante(nombre, variante))) as imagen:
+            assert imagen.format == "JPEG"
+            assert max(imagen.size) == lado
+            assert not imagen.getexif()
+
+
+def test_png_con_transparencia_se_guarda_como_jpeg(app, pool):
+    imagen = Image.new("RGBA", (50, 50), (0, 0, 0, 0))
+    contenido = io.BytesIO()
+    imagen.save(contenido, "PNG")
+    nombre = _guardar(app, contenido.getvalue(), "foto.png")
+    pool.shutdown(wait=True)
+
+    with app.app_context():
+        with Image.open(os.path.join(carpeta_imagenes(), nombre)) as guardada:
+            assert (guardada.format, guardada.getpixel((0, 0))) == ("JPEG", (255, 255, 255))
+
+
+def test_archivo_que_no_es_imagen_se_rechaza(app, pool):
+    with pytest.raises(ErrorImagen):
+        _guardar(app, b"no soy una imagen")
+    assert _archivos(app) == []
+
+
+@pytest.mark.filterwarnings("ignore::PIL.Image.DecompressionBombWarning")
+def test_imagen_demasiado_grande_se_rechaza_al_subirla(app, pool, monkeypatch):
+    monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", 1000)
+    with pytest.raises(ErrorImagen, match="demasiado grande"):
+        _guardar(app, _foto(tamano=(40, 30)))
+    assert _archivos(app) == []
+
+
+def test_falla_en_segundo_plano_no_guarda_el_original(app, pool, monkeypatch):
+    procesar = imagenes._procesar
+
+    def procesar_a_medias(contenido, carpeta, nombre):
+        # Alcanza a escribir las variantes y falla después, como con el disco lleno
+        procesar(contenido, carpeta, nombre)
+        raise OSError("No queda espacio en el dispositivo")
+
+    monkeypatch.setattr(imagenes, "_procesar", procesar_a_medias)
+    _guardar(app, _foto())
+    pool.shutdown(wait=True)
+
+    assert _archivos(app) == []
+
+
+def test_pool_cerrado_procesa_en_la_solicitud_o_rechaza(app, pool, monkeypatch):
+    pool.shutdown(wait=True)
+    nombre = _guardar(app, _foto(exif=False))
+    assert nombre_variante(nombre, "-thumb") in _archivos(app)
+
+    monkeypatch.setattr(imagenes, "_procesar", lambda contenido, carpeta, nombre: 1 / 0)
+    with pytest.raises(ErrorImagen, match="No se pudo procesar"):
+        _guardar(app, _foto(formato="PNG"), "otra.png")
+    assert len(_archivos(app)) == len(VARIANTES)
+
+
+@pytest.fixture
+def guardada(app):
+    # Una variante ya procesada, con nombre por hash, y la foto por defecto
+    nombre = "a" * 64 + "-thumb.jpg"
+    with app.app_context():
+        carpeta = carpeta_imagenes()
+    os.makedirs(carpeta, exist_ok=True)
+    with open(os.path.join(carpeta, nombre), "wb") as archivo:
+        archivo.write(_foto(tamano=(96, 48), exif=False))
+    with open(os.path.join(carpeta, "without-photo.png"), "wb") as archivo:
+        archivo.write(b"\x89PNG foto por defecto")
+    return nombre
+
+
+def test_variante_por_hash_se_sirve_inmutable(cliente, guardada):
+    respuesta = cliente.get(f"/api/images/{guardada}")
+
+    assert respuesta.status_code == 200
+    assert respuesta.mimetype == "image/jpeg"
+    assert respuesta.headers["Cache-Control"] == "public, max-age=31536000, immutable"
+    assert respuesta.headers["ETag"] == f'"{guardada}"'
+    assert respuesta.headers["Accept-Ranges"] == "bytes"
+    assert "Expires" not in respuesta.headers
+
+    repetida = cliente.get(f"/api/images/{guardada}", headers={"If-None-Match": f'"{guardada}"'})
+    assert repetida.status_code == 304
+    assert repetida.get_data() == b""
+
+
+def test_range_devuelve_el_trozo_pedido(cliente, guardada):
+    completa = cliente.get(f"/api/images/{guardada}").get_data()
+    respuesta = cliente.get(f"/api/images/{guardada}", headers={"Range": "bytes=0-9"})
+
+    assert respuesta.status_code == 206
+    assert respuesta.get_data() == completa[:10]
+    assert respuesta.headers["Content-Range"] == f"bytes 0-9/{len(completa)}"
+
+
+def test_otros_nombres_se_revalidan(cliente, guardada):
+    respuesta = cliente.get("/api/images/without-photo.png")
+
+    assert respuesta.status_code == 200
+    assert respuesta.headers["Cache-Control"] == "public, no-cache"
+    etag = respuesta.headers["ETag"]
+    assert cliente.get("/api/images/without-photo.png", headers={"If-None-Match": etag}).status_code == 304
+
+
+@pytest.mark.parametrize("nombre", ["no-existe.jpg", "..%2Fconfig.py"])
+def test_archivo_inexistente_o_fuera_de_la_carpeta_es_404(cliente, guardada, nombre):
+    assert cliente.get(f"/api/images/{nombre}").status_code == 404
+
+
+def test_x_accel_redirect_deja_el_envio_a_nginx(app, cliente, guardada):
+    app.config["IMAGENES_ACCEL_REDIRECT"] = "/protegido/imagenes/"
+    respuesta = cliente.get(f"/api/images/{guardada}")
+
+    assert respuesta.headers["X-Accel-Redirect"] == f"/protegido/imagenes/{guardada}"
+    assert respuesta.get_data() == b""
+    assert respuesta.mimetype == "image/jpeg"
+    assert respuesta.headers["Cache-Control"] == "public, max-age=31536000, immutable"
+    repetida = cliente.get(f"/api/images/{guardada}", headers={"If-None-Match": f'"{guardada}"'})
+    assert repetida.status_code == 304
+    assert "X-Accel-Redirect" not in repetida.headers
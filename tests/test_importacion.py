@@ -0,0 +1,90 @@
+import pytest
+
+from importacion import importar_productos
+from models import db, Producto
+
+
+def _fila(sku, codigo_barra, descripcion=None):
+    return {"sku": sku, "descripcion": descripcion or f"Producto {sku}", "codigo_barra": codigo_barra,
+            "unidad_entrega": "unidad", "categoria_id": "1", "precio_venta_unitario": "990"}
+
+
+def _codigos(app):
+    with app.app_context():
+        return dict(db.session.query(Producto.sku, Producto.codigo_barra))
+
+
+@pytest.fixture
+def catalogo(movimientos):
+    return [movimientos.producto(sku) for sku in ("P1", "P2")]
+
+
+def test_inserta_y_actualiza_por_sku(app, catalogo):
+    with app.app_context():
+        resumen = importar_productos([_fila("P1", "780P1", "Nuevo nombre"), _fila("P3", "780P3")])
+        assert Producto.query.filter_by(sku="P1").one().descripcion == "Nuevo nombre"
+
+    assert (resumen["insertados"], resumen["actualizados"], resumen["con_error"]) == (1, 1, 0)
+    assert _codigos(app) == {"P1": "780P1", "P2": "780P2", "P3": "780P3"}
+
+
+def test_dos_productos_intercambian_codigo_de_barra(app, catalogo):
+    with app.app_context():
+        resumen = importar_productos([_fila("P1", "780P2"), _fila("P2", "780P1")])
+
+    assert (resumen["actualizados"], resumen["con_error"]) == (2, 0)
+    assert _codigos(app) == {"P1": "780P2", "P2": "780P1"}
+
+
+def test_codigo_liberado_lo_toma_un_producto_nuevo(app, catalogo):
+    with app.app_context():
+        resumen = importar_productos([_fila("P3", "780P1"), _fila("P1", "780P9")])
+
+    assert (resumen["insertados"], resumen["actualizados"], resumen["con_error"]) == (1, 1, 0)
+    assert _codigos(app) == {"P1": "780P9", "P2": "780P2", "P3": "780P1"}
+
+
+def test_fila_rechazada_no_libera_su_codigo(app, catalogo):
+    # P1 pide el código de P2, que no cambia: P1 conserva 780P1 y P3 ya no puede tomarlo
+    with app.app_context():
+        resumen = importar_productos([_fila("P1", "780P2"), _fila("P3", "780P1")])
+
+    assert resumen["errores"] == [
+        {"fila": 2, "msg": "Código de barra 780P2 ya existe en SKU P2"},
+        {"fila": 3, "msg": "Código de barra 780P1 ya existe en SKU P1"},
+    ]
+    assert _codigos(app) == {"P1": "780P1", "P2": "780P2"}
+
+
+def test_codigo_o_descripcion_de_otro_producto_es_error_de_fila(app, catalogo):
+    with app.app_context():
+        resumen = importar_productos([_fila("P3", "780P1"), _fila("P2", "780P2", "Vino tinto"),
+                                      _fila("P4", "780P4", "Vino tinto"), _fila("P5", "780P5"), _fila("P5", "780P6")])
+
+    assert (resumen["insertados"], resumen["actualizados"]) == (1, 1)
+    assert resumen["errores"] == [
+        {"fila": 2, "msg": "Código de barra 780P1 ya existe en SKU P1"},
+        {"fila": 4, "msg": "Descripción Vino tinto ya existe en SKU P2"},
+        {"fila": 6, "msg": "SKU P5 repetido en el archivo"},
+    ]
+
+
+def test_lote_fallido_devuelve_los_codigos_a_sus_duenos(app, catalogo):
+    def filas():
+        # Otro proceso toma el código NUEVO antes de que se guarde el primer lote
+        with app.app_context():
+            db.engine.execute(Producto.__table__.insert().values(
+                sku="X1", descripcion="Otro", codigo_barra="NUEVO", unidad_entrega="unidad", categoria_id=1))
+        yield _fila("P1", "NUEVO")
+        # Con el lote anterior sin guardar, 780P1 sigue siendo de P1
+        yield _fila("P2", "780P1")
+        yield _fila("P3", "780P3")
+
+    with app.app_context():
+        resumen = importar_productos(filas(), lote=1)
+
+    assert resumen["errores"][0]["fila"] == 2
+    assert resumen["errores"][0]["msg"].startswith("Lote no guardado por un conflicto de llaves únicas")
+    assert resumen["errores"][1:] == [{"fila": 3, "msg": "Código de barra 780P1 ya existe en SKU P1"}]
+    assert (resumen["insertados"], resumen["actualizados"]) == (1, 0)
+    assert _codigos(app) == {"P1": "780P1", "P2": "780P2", "X1": "NUEVO", "P3": "780P3"}
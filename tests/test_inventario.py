@@ -0,0 +1,201 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import db, Capa_Costo, Entrada_Inventario, Salida_Inventario, Stock_Producto, Stock_Diario, Venta_Diaria, Sesion_Caja
+
+
+@pytest.fixture
+def ayer():
+    return (datetime.now() - timedelta(days=1)).replace(hour=9, minute=0, second=0, microsecond=0)
+
+
+def _stock(app, producto_id):
+    with app.app_context():
+        stock = Stock_Producto.query.get(producto_id)
+        return stock.cantidad, stock.costo_promedio
+
+
+def _ventas_diarias(app):
+    with app.app_context():
+        return {(fila.fecha, fila.producto_id, fila.forma_pago): (fila.cantidad, fila.venta_neta, fila.costo)
+                for fila in Venta_Diaria.query}
+
+
+def _salida(app, documento_id):
+    with app.app_context():
+        salida = Salida_Inventario.query.filter_by(documento_venta_id=documento_id).one()
+        return salida.precio_costo_unitario, salida.costo_total
+
+
+def test_stock_sigue_entradas_y_salidas(app, movimientos, ayer):
+    producto_id = movimientos.producto()
+    movimientos.compra(producto_id, 10, 5, ayer)
+    documento_id = movimientos.venta(producto_id, 3, 100, ayer + timedelta(hours=1))
+    assert _stock(app, producto_id)[0] == 7
+
+    with app.app_context():
+        salida = Salida_Inventario.query.filter_by(documento_venta_id=documento_id).one()
+        salida.cantidad = 4
+        db.session.commit()
+        assert Stock_Producto.query.get(producto_id).cantidad == 6
+        db.session.delete(salida)
+        db.session.commit()
+        assert Stock_Producto.query.get(producto_id).cantidad == 10
+        assert Stock_Producto.verificar() == []
+
+
+def test_salidas_se_costean_al_promedio_ponderado(app, movimientos, ayer):
+    producto_id = movimientos.producto()
+    movimientos.compra(producto_id, 10, 5, ayer)
+    movimientos.compra(producto_id, 30, 9, ayer + timedelta(hours=1))
+    documento_id = movimientos.venta(producto_id, 4, 100, ayer + timedelta(hours=2))
+
+    assert _stock(app, producto_id) == (36, 8)
+    assert _salida(app, documento_id) == (8, 32)
+
+
+def test_ventas_diarias_acumulan_por_dia_y_forma_de_pago(app, movimientos, ayer):
+    producto_id = movimientos.producto()
+    movimientos.compra(producto_id, 100, 5, ayer - timedelta(days=1))
+    movimientos.venta(producto_id, 2, 100, ayer)
+    movimientos.venta(producto_id, 3, 100, ayer + timedelta(hours=1))
+    movimientos.venta(producto_id, 1, 100, ayer, forma_pago="tarjeta")
+    documento_id = movimientos.venta(producto_id, 4, 100, ayer + timedelta(days=1))
+
+    esperado = {
+        (ayer.date(), producto_id, "efectivo"): (5, 500, 25),
+        (ayer.date(), producto_id, "tarjeta"): (1, 100, 5),
+        ((ayer + timedelta(days=1)).date(), producto_id, "efectivo"): (4, 400, 20),
+    }
+    assert _ventas_diarias(app) == esperado
+
+    with app.app_context():
+        db.session.delete(Salida_Inventario.query.filter_by(documento_venta_id=documento_id).one())
+        db.session.commit()
+    esperado[((ayer + timedelta(days=1)).date(), producto_id, "efectivo")] = (0, 0, 0)
+    assert _ventas_diarias(app) == esperado
+
+    with app.app_context():
+        Venta_Diaria.reconstruir()
+    del esperado[((ayer + timedelta(days=1)).date(), producto_id, "efectivo")]
+    assert _ventas_diarias(app) == esperado
+
+
+def test_venta_suma_al_turno_abierto(app, movimientos, ayer):
+    producto_id = movimientos.producto()
+    movimientos.compra(producto_id, 10, 5, ayer)
+    with app.app_context():
+        db.session.add(Sesion_Caja(usuario_id=1, admin_id=1, fecha_apertura=ayer))
+        db.session.commit()
+    movimientos.venta(producto_id, 1, 100, ayer + timedelta(hours=1))
+    movimientos.venta(producto_id, 1, 100, ayer + timedelta(hours=1), forma_pago="Tarjeta")
+    # Emitida antes de la apertura: llega tarde desde una caja sin conexión y no es del turno
+    movimientos.venta(producto_id, 1, 100, ayer - timedelta(hours=1))
+
+    with app.app_context():
+        sesion = Sesion_Caja.abierta(1)
+        assert (sesion.monto_efectivo, sesion.monto_tarjeta, sesion.cantidad_ventas) == (119, 119, 2)
+        assert sesion.esperado() == sesion.esperado_por_consulta()
+
+
+def _editar_factura(cliente, headers, factura_id, producto_id, cantidad, costo, fecha):
+    return cliente.put(f"/api/facturas-compras/{factura_id}", headers=headers, json={
+        "folio": factura_id, "fecha_emision": fecha.strftime("%Y-%m-%d"), "fecha_recepcion": fecha.strftime("%Y-%m-%d"),
+        "monto_neto": cantidad * costo, "monto_iva": cantidad * costo * 0.19, "monto_otros_impuestos": 0,
+        "monto_total": cantidad * costo * 1.19, "proveedor_id": 1,
+        "entradas_inventario": [{"cantidad": cantidad, "precio_costo_unitario": costo, "costo_total": cantidad * costo,
+                                 "usuario_id": 1, "producto_id": producto_id}],
+    })
+
+
+def test_editar_factura_recostea_ventas_posteriores(app, cliente, headers, movimientos, ayer):
+    producto_id = movimientos.producto()
+    factura_id = movimientos.compra(producto_id, 10, 5, ayer)
+    movimientos.compra(producto_id, 10, 7, ayer + timedelta(hours=1))
+    documento_id = movimientos.venta(producto_id, 12, 100, ayer + timedelta(hours=2))
+    with app.app_context():
+        Stock_Diario.cerrar(ayer.date())
+    assert _salida(app, documento_id) == (6, 72)
+
+    respuesta = _editar_factura(cliente, headers, factura_id, producto_id, 10, 3, ayer)
+    assert respuesta.status_code == 200, respuesta.get_data(as_text=True)
+
+    # La compra corregida sigue antes de la venta: promedio (10 * 3 + 10 * 7) / 20 = 5
+    assert _salida(app, documento_id) == (5, 60)
+    assert _ventas_diarias(app) == {(ayer.date(), producto_id, "efectivo"): (12, 1200, 60)}
+    assert _stock(app, producto_id) == (8, 5)
+    with app.app_context():
+        assert Stock_Producto.verificar() == []
+
+    saldo = cliente.get(f"/api/stock?as_of={ayer.date()}", headers=headers).get_json()
+    assert [(producto["inventario_disponible"], producto["valor_inventario"]) for producto in saldo] == [(8, 40)]
+
+
+def _capas(app, producto_id):
+    with app.app_context():
+        return [(capa.costo_unitario, capa.cantidad_inicial, capa.cantidad_restante)
+                for capa in Capa_Costo.query.filter_by(producto_id=producto_id).order_by(Capa_Costo.fecha, Capa_Costo.id)]
+
+
+def test_fifo_consume_las_capas_mas_antiguas(app, movimientos, ayer):
+    app.config["VALORIZACION_INVENTARIO"] = "fifo"
+    producto_id = movimientos.producto()
+    movimientos.compra(producto_id, 10, 5, ayer)
+    movimientos.compra(producto_id, 10, 7, ayer + timedelta(hours=1))
+    documento_id = movimientos.venta(producto_id, 12, 100, ayer + timedelta(hours=2))
+
+    assert _salida(app, documento_id) == (pytest.approx(64 / 12), 64)
+    assert _capas(app, producto_id) == [(5, 10, 0), (7, 10, 8)]
+
+
+def test_fifo_editar_factura_rearma_capas_y_recostea(app, cliente, headers, movimientos, ayer):
+    app.config["VALORIZACION_INVENTARIO"] = "fifo"
+    producto_id = movimientos.producto()
+    factura_id = movimientos.compra(producto_id, 10, 5, ayer)
+    movimientos.compra(producto_id, 10, 7, ayer + timedelta(hours=1))
+    documento_id = movimientos.venta(producto_id, 12, 100, ayer + timedelta(hours=2))
+    with app.app_context():
+        Stock_Diario.cerrar(ayer.date())
+
+    respuesta = _editar_factura(cliente, headers, factura_id, producto_id, 10, 3, ayer)
+    assert respuesta.status_code == 200, respuesta.get_data(as_text=True)
+
+    # La venta sigue consumiendo primero la compra corregida: 10 a 3 y 2 a 7
+    assert _salida(app, documento_id) == (pytest.approx(44 / 12), pytest.approx(44))
+    assert _capas(app, producto_id) == [(3, 10, 0), (7, 10, 8)]
+    assert _ventas_diarias(app) == {(ayer.date(), producto_id, "efectivo"): (12, 1200, pytest.approx(44))}
+    saldo = cliente.get(f"/api/stock?as_of={ayer.date()}", headers=headers).get_json()
+    assert [(producto["inventario_disponible"], producto["valor_inventario"]) for producto in saldo] == \
+        [(8, pytest.approx(56))]
+
+    # Una venta nueva sigue con lo que queda de la capa de 7
+    documento_id = movimientos.venta(producto_id, 3, 100, datetime.now())
+    assert _salida(app, documento_id) == (7, 21)
+
+
+def _foto(app, fecha, producto_id):
+    with app.app_context():
+        foto = Stock_Diario.query.filter_by(fecha=fecha, producto_id=producto_id).one()
+        return foto.cantidad, foto.valor
+
+
+def test_editar_movimientos_corrige_fotos_cerradas(app, cliente, headers, movimientos, ayer):
+    producto_id = movimientos.producto()
+    factura_id = movimientos.compra(producto_id, 10, 5, ayer)
+    documento_id = movimientos.venta(producto_id, 3, 100, ayer + timedelta(hours=1))
+    with app.app_context():
+        Stock_Diario.cerrar(ayer.date())
+        entrada_id = Entrada_Inventario.query.filter_by(factura_compra_id=factura_id).one().id
+        salida_id = Salida_Inventario.query.filter_by(documento_venta_id=documento_id).one().id
+    assert _foto(app, ayer.date(), producto_id) == (7, 35)
+
+    respuesta = cliente.put(f"/api/entradas-inventario/{entrada_id}", headers=headers, json={"cantidad": 20})
+    assert respuesta.status_code == 200, respuesta.get_data(as_text=True)
+    assert _foto(app, ayer.date(), producto_id) == (17, 85)
+
+    respuesta = cliente.put(f"/api/salidas-inventario/{salida_id}", headers=headers, json={"cantidad": 5})
+    assert respuesta.status_code == 201, respuesta.get_data(as_text=True)
+    assert _foto(app, ayer.date(), producto_id) == (15, 75)
+    with app.app_context():
+        assert Stock_Producto.verificar() == []
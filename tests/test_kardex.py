@@ -0,0 +1,62 @@
+from datetime import timedelta
+
+import pytest
+
+
+@pytest.fixture(params=[True, False], ids=["ventanas", "python"])
+def ventanas(app, request):
+    # Con False se usa el respaldo que acumula en Python, como en MySQL 5.7
+    app.config["KARDEX_VENTANAS"] = request.param
+    return request.param
+
+
+@pytest.fixture
+def producto_id(movimientos, ahora):
+    inicio = (ahora - timedelta(days=3)).replace(hour=9, minute=0, second=0)
+    producto_id = movimientos.producto()
+    movimientos.compra(producto_id, 10, 5, inicio)
+    movimientos.venta(producto_id, 3, 100, inicio + timedelta(hours=1))
+    movimientos.compra(producto_id, 5, 8, inicio + timedelta(days=1))
+    movimientos.venta(producto_id, 4, 100, inicio + timedelta(days=1, hours=1))
+    movimientos.venta(producto_id, 1, 100, inicio + timedelta(days=2))
+    return producto_id
+
+
+def _paginas(cliente, headers, url):
+    paginas = []
+    while url:
+        respuesta = cliente.get(url, headers=headers)
+        assert respuesta.status_code == 200, respuesta.get_data(as_text=True)
+        paginas.append(respuesta.get_json())
+        cursor = respuesta.headers.get("X-Next-Cursor")
+        url = respuesta.headers["Link"].split(">")[0].lstrip("<") if cursor else None
+    return paginas
+
+
+def _saldos(movimientos):
+    return [(movimiento["tipo"], movimiento["saldo_cantidad"], movimiento["saldo_valor"]) for movimiento in movimientos]
+
+
+SALDOS = [("entrada", 10, 50), ("salida", 7, 35), ("entrada", 12, 75), ("salida", 8, 50), ("salida", 7, 43.75)]
+
+
+def test_saldo_acumulado_se_arrastra_entre_paginas(cliente, headers, producto_id, ventanas):
+    paginas = _paginas(cliente, headers, f"/api/productos/{producto_id}/kardex?limit=2")
+
+    assert [len(pagina) for pagina in paginas] == [2, 2, 1]
+    assert _saldos(sum(paginas, [])) == SALDOS
+
+
+def test_pagina_unica_coincide_con_la_paginada(cliente, headers, producto_id, ventanas):
+    completa = cliente.get(f"/api/productos/{producto_id}/kardex?limit=100", headers=headers).get_json()
+    paginada = sum(_paginas(cliente, headers, f"/api/productos/{producto_id}/kardex?limit=1"), [])
+
+    assert completa == paginada
+    assert _saldos(completa) == SALDOS
+
+
+def test_desde_parte_del_saldo_anterior(cliente, headers, producto_id, ventanas, ahora):
+    desde = (ahora - timedelta(days=2)).date()
+    paginas = _paginas(cliente, headers, f"/api/productos/{producto_id}/kardex?limit=2&desde={desde}")
+
+    assert _saldos(sum(paginas, [])) == SALDOS[2:]
@@ -0,0 +1,56 @@
+from models import db, Producto
+
+
+def _producto(id, sku, codigo_barra=None):
+    return {"id": id, "sku": sku, "descripcion": f"producto {sku}", "codigo_barra": codigo_barra or f"780{sku}",
+            "unidad_entrega": "unidad", "categoria_id": 1, "precio_venta_unitario": 990}
+
+
+def _codigos(app):
+    with app.app_context():
+        return {id: (sku, codigo_barra) for id, sku, codigo_barra in
+                db.session.query(Producto.id, Producto.sku, Producto.codigo_barra)}
+
+
+def test_put_masivo_intercambia_codigos_y_skus(app, cliente, headers, movimientos):
+    uno, dos = movimientos.producto("P1"), movimientos.producto("P2")
+    respuesta = cliente.put("/api/productos", headers=headers,
+                            json=[_producto(uno, "P2", "780P2"), _producto(dos, "P1", "780P1")])
+
+    assert respuesta.status_code == 200, respuesta.get_data(as_text=True)
+    assert respuesta.get_json()["modificados"] == 2
+    assert _codigos(app) == {uno: ("P2", "780P2"), dos: ("P1", "780P1")}
+
+
+def test_put_masivo_informa_ids_inexistentes_y_guarda_el_resto(app, cliente, headers, movimientos):
+    uno = movimientos.producto("P1")
+    respuesta = cliente.put("/api/productos", headers=headers,
+                            json=[_producto(999, "P9"), _producto(uno, "P1", "780NUEVO")])
+
+    assert respuesta.status_code == 200, respuesta.get_data(as_text=True)
+    assert respuesta.get_json()["resultados"] == [{"id": 999, "ok": False, "msg": "Producto no encontrado"},
+                                                  {"id": uno, "ok": True}]
+    assert _codigos(app) == {uno: ("P1", "780NUEVO")}
+
+
+def test_put_masivo_rechaza_ids_repetidos(app, cliente, headers, movimientos):
+    uno = movimientos.producto("P1")
+    respuesta = cliente.put("/api/productos", headers=headers,
+                            json=[_producto(uno, "P1", "780A"), _producto(uno, "P1", "780B")])
+
+    assert respuesta.status_code == 400
+    assert respuesta.get_json()["resultados"] == [
+        {"id": uno, "ok": True},
+        {"id": uno, "ok": False, "msg": f"Producto id {uno} repetido en la solicitud"},
+    ]
+    assert _codigos(app) == {uno: ("P1", "780P1")}
+
+
+def test_put_masivo_rechaza_codigo_de_otro_producto(app, cliente, headers, movimientos):
+    uno, dos = movimientos.producto("P1"), movimientos.producto("P2")
+    respuesta = cliente.put("/api/productos", headers=headers, json=[_producto(uno, "P1", "780P2")])
+
+    assert respuesta.status_code == 400
+    assert respuesta.get_json()["resultados"] == [
+        {"id": uno, "ok": False, "msg": f"Código de barra del producto id {uno} ya existe"}]
+    assert _codigos(app) == {uno: ("P1", "780P1"), dos: ("P2", "780P2")}
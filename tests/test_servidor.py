@@ -0,0 +1,60 @@
+import pytest
+
+import servidor
+from servidor import cantidad_workers, concurrencia_worker, opciones_pool
+
+VARIABLES = ("WEB_CONCURRENCY", "GUNICORN_WORKER_CLASS", "GUNICORN_THREADS", "GUNICORN_WORKER_CONNECTIONS",
+             "DB_MAX_CONEXIONES", "DB_CONEXIONES_RESERVADAS", "DB_POOL_TIMEOUT", "DB_POOL_RECYCLE")
+
+
+@pytest.fixture
+def entorno(monkeypatch):
+    # Parte de los valores por defecto aunque la máquina tenga estas variables definidas
+    for variable in VARIABLES:
+        monkeypatch.delenv(variable, raising=False)
+
+    def definir(**valores):
+        for variable, valor in valores.items():
+            monkeypatch.setenv(variable, str(valor))
+    return definir
+
+
+def test_workers_por_defecto_segun_cpus(entorno, monkeypatch):
+    monkeypatch.setattr(servidor.multiprocessing, "cpu_count", lambda: 2)
+    assert cantidad_workers() == 5
+    entorno(WEB_CONCURRENCY=3)
+    assert cantidad_workers() == 3
+
+
+def test_concurrencia_segun_clase_de_worker(entorno):
+    assert concurrencia_worker() == 4
+    entorno(GUNICORN_THREADS=8)
+    assert concurrencia_worker() == 8
+    entorno(GUNICORN_WORKER_CLASS="gevent")
+    assert concurrencia_worker() == 100
+
+
+@pytest.mark.parametrize("variables, pool_size, max_overflow", [
+    # 140 conexiones disponibles: cuota de 28 por worker, el pool cubre los threads y el resto es overflow
+    ({"WEB_CONCURRENCY": 5}, 4, 24),
+    # gevent con 100 conexiones por worker: el pool queda limitado a la cuota de 15
+    ({"WEB_CONCURRENCY": 9, "GUNICORN_WORKER_CLASS": "gevent"}, 15, 0),
+    # Más workers que conexiones disponibles: al menos una por worker
+    ({"WEB_CONCURRENCY": 200}, 1, 0),
+    ({"WEB_CONCURRENCY": 4, "DB_MAX_CONEXIONES": 50, "DB_CONEXIONES_RESERVADAS": 2}, 4, 8),
+])
+def test_pool_reparte_las_conexiones_entre_workers(entorno, variables, pool_size, max_overflow):
+    entorno(**variables)
+    opciones = opciones_pool()
+
+    assert (opciones["pool_size"], opciones["max_overflow"]) == (pool_size, max_overflow)
+    disponibles = int(variables.get("DB_MAX_CONEXIONES", 150)) - int(variables.get("DB_CONEXIONES_RESERVADAS", 10))
+    if cantidad_workers() <= disponibles:
+        assert cantidad_workers() * (pool_size + max_overflow) <= disponibles
+
+
+def test_pool_timeout_y_recycle(entorno):
+    assert {clave: opciones_pool()[clave] for clave in ("pool_timeout", "pool_recycle", "pool_pre_ping")} == \
+        {"pool_timeout": 10, "pool_recycle": 280, "pool_pre_ping": True}
+    entorno(DB_POOL_TIMEOUT=3, DB_POOL_RECYCLE=60)
+    assert (opciones_pool()["pool_timeout"], opciones_pool()["pool_recycle"]) == (3, 60)
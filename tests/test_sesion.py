@@ -0,0 +1,72 @@
+import pytest
+from flask_jwt_extended import create_access_token
+
+import cache
+import sesion
+from models import db, Usuario
+
+
+class Reloj:
+    # Reemplaza al módulo time en cache.py para adelantar el vencimiento sin esperar
+    def __init__(self):
+        self.ahora = 1000.0
+
+    def monotonic(self):
+        return self.ahora
+
+
+@pytest.fixture
+def reloj(monkeypatch):
+    reloj = Reloj()
+    monkeypatch.setattr(cache, "time", reloj)
+    monkeypatch.setattr(sesion, "_cache", None)  # se vuelve a crear con la configuración de la prueba
+    return reloj
+
+
+@pytest.fixture
+def jefe(app):
+    with app.app_context():
+        usuario = Usuario(nombre="Jefe", apellido="Soto", rut="3-5", rol="Admin", email="jefe@example.com",
+                          password="-", empresa_id=1, codigo="usr2")
+        db.session.add(usuario)
+        db.session.commit()
+        return usuario.id, {"Authorization": f"Bearer {create_access_token(identity='jefe@example.com')}"}
+
+
+def _estado(cliente, headers):
+    return cliente.get("/api/metricas/claves", headers=headers).status_code
+
+
+def test_usuario_desactivado_por_la_api_pierde_acceso_de_inmediato(cliente, headers, jefe, reloj):
+    jefe_id, headers_jefe = jefe
+    assert _estado(cliente, headers_jefe) == 200
+
+    respuesta = cliente.put(f"/api/usuarios/{jefe_id}", headers=headers, data={"status": "false"})
+    assert respuesta.status_code == 200, respuesta.get_data(as_text=True)
+    assert _estado(cliente, headers_jefe) == 401
+
+    cliente.put(f"/api/usuarios/{jefe_id}", headers=headers, data={"status": "true", "rol": "cajero"})
+    assert _estado(cliente, headers_jefe) == 403
+
+
+def test_cambio_directo_en_la_base_se_ve_al_vencer_el_ttl(app, cliente, jefe, reloj):
+    app.config["CACHE_USUARIOS_TTL"] = 60
+    jefe_id, headers_jefe = jefe
+    assert _estado(cliente, headers_jefe) == 200
+
+    # Sin Usuario.update() no cambia la versión de usuarios: se sigue usando la copia en caché
+    with app.app_context():
+        db.engine.execute(Usuario.__table__.update().where(Usuario.id == jefe_id).values(status=False))
+    reloj.ahora += 59
+    assert _estado(cliente, headers_jefe) == 200
+    reloj.ahora += 2
+    assert _estado(cliente, headers_jefe) == 401
+
+
+def test_usuario_eliminado_pierde_acceso(app, cliente, jefe, reloj):
+    jefe_id, headers_jefe = jefe
+    assert _estado(cliente, headers_jefe) == 200
+    with app.app_context():
+        Usuario.query.get(jefe_id).delete()
+
+    assert _estado(cliente, headers_jefe) == 401
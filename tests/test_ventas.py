@@ -0,0 +1,134 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import ventas
+from models import db, Documento_Venta, Salida_Inventario, Stock_Diario, Venta_Diaria
+
+
+@pytest.fixture
+def producto_id(movimientos, ahora):
+    producto_id = movimientos.producto()
+    movimientos.compra(producto_id, 100, 5, ahora - timedelta(days=3))
+    return producto_id
+
+
+def _documento(numero, producto_id, cantidad=1, **datos_venta):
+    return {
+        "datosVenta": dict({"tipo_documento": "boleta", "numero_documento": numero, "monto_neto": 100 * cantidad,
+                            "monto_iva": 19 * cantidad, "monto_total": 119 * cantidad, "forma_pago": "efectivo"},
+                           **datos_venta),
+        "detalleProductos": [{"cantidad": cantidad, "precio_venta_unitario": 119, "total": 119 * cantidad,
+                              "producto_id": producto_id}],
+    }
+
+
+def _lote(cliente, headers, documentos):
+    respuesta = cliente.post("/api/documentos-venta/lote", headers=headers, json=documentos)
+    assert respuesta.status_code == 200, respuesta.get_data(as_text=True)
+    return respuesta.get_json()
+
+
+def _estados(respuesta):
+    return [(resultado["indice"], resultado["estado"]) for resultado in respuesta["resultados"]]
+
+
+def _numeros(app):
+    with app.app_context():
+        return sorted(numero for (numero,) in db.session.query(Documento_Venta.numero_documento))
+
+
+def test_lote_devuelve_un_resultado_por_documento(app, cliente, headers, producto_id):
+    app.config["LOTE_VENTAS"] = 2
+    respuesta = _lote(cliente, headers, [_documento(numero, producto_id) for numero in range(1, 6)])
+
+    assert (respuesta["creados"], respuesta["rechazados"]) == (5, 0)
+    assert _estados(respuesta) == [(indice, "creado") for indice in range(5)]
+    with app.app_context():
+        ids = {documento.numero_documento: documento.id for documento in Documento_Venta.query}
+        assert Salida_Inventario.query.count() == 5
+    assert [(resultado["numero_documento"], resultado["id"]) for resultado in respuesta["resultados"]] == \
+        sorted(ids.items())
+
+
+def test_lote_rechaza_duplicados_del_lote_y_de_la_base(app, cliente, headers, producto_id):
+    _lote(cliente, headers, [_documento(1, producto_id)])
+    respuesta = _lote(cliente, headers, [_documento(1, producto_id), _documento(2, producto_id),
+                                         _documento(2, producto_id)])
+
+    assert _estados(respuesta) == [(0, "duplicado"), (1, "creado"), (2, "error")]
+    assert respuesta["resultados"][2]["msg"] == "Documento repetido en el lote"
+    assert _numeros(app) == [1, 2]
+
+
+def test_lote_rechaza_productos_inexistentes_y_datos_invalidos(app, cliente, headers, producto_id):
+    respuesta = _lote(cliente, headers, [_documento(1, 999), _documento(2, producto_id, monto_total="mucho"),
+                                         _documento(3, producto_id)])
+
+    assert _estados(respuesta) == [(0, "error"), (1, "error"), (2, "creado")]
+    assert respuesta["resultados"][0]["msg"] == "Producto id 999 no existe"
+    assert respuesta["resultados"][1]["msg"] == "monto_total debe ser un número"
+    assert _numeros(app) == [3]
+
+
+def test_lote_reintenta_de_a_uno_si_otra_caja_gana_la_carrera(app, cliente, headers, producto_id, monkeypatch):
+    # Otra caja registra el número 2 después de la consulta de duplicados y antes del insert del lote
+    consultar = ventas.productos_inexistentes
+
+    def otra_caja(documentos):
+        with app.app_context():
+            db.engine.execute(Documento_Venta.__table__.insert().values(
+                tipo_documento="boleta", numero_documento=2, fecha_emision=datetime.now(), monto_neto=100,
+                monto_iva=19, monto_total=119, forma_pago="efectivo", usuario_id=1))
+        return consultar(documentos)
+
+    monkeypatch.setattr(ventas, "productos_inexistentes", otra_caja)
+    respuesta = _lote(cliente, headers, [_documento(numero, producto_id) for numero in (1, 2, 3)])
+
+    assert _estados(respuesta) == [(0, "creado"), (1, "duplicado"), (2, "creado")]
+    assert _numeros(app) == [1, 2, 3]
+    with app.app_context():
+        # Solo las salidas de los documentos guardados por el lote
+        assert Salida_Inventario.query.count() == 2
+
+
+def test_lote_usa_la_fecha_de_emision_de_la_caja(app, cliente, headers, producto_id, ahora):
+    ayer = (ahora - timedelta(days=1)).replace(hour=15, minute=30, second=0, microsecond=0)
+    with app.app_context():
+        Stock_Diario.cerrar(ayer.date())
+    respuesta = _lote(cliente, headers, [_documento(1, producto_id, cantidad=4, fecha_emision=ayer.isoformat())])
+
+    assert _estados(respuesta) == [(0, "creado")]
+    with app.app_context():
+        documento = Documento_Venta.query.one()
+        assert documento.fecha_emision == ayer
+        assert Salida_Inventario.query.one().fecha_registro == ayer
+        assert [(fila.fecha, fila.cantidad) for fila in Venta_Diaria.query] == [(ayer.date(), 4)]
+        # La foto de ayer ya cerrada incluye la venta
+        foto = Stock_Diario.query.filter_by(fecha=ayer.date(), producto_id=producto_id).one()
+        assert (foto.cantidad, foto.valor) == (96, 480)
+
+
+@pytest.mark.parametrize("fecha_emision, mensaje", [
+    ("18/10/2026", "fecha_emision debe tener formato ISO (AAAA-MM-DDTHH:MM:SS)"),
+    (20261018, "fecha_emision debe tener formato ISO (AAAA-MM-DDTHH:MM:SS)"),
+    ((datetime.now() + timedelta(hours=1)).isoformat(), "fecha_emision no puede ser futura"),
+])
+def test_lote_rechaza_fecha_de_emision_invalida(app, cliente, headers, producto_id, fecha_emision, mensaje):
+    respuesta = _lote(cliente, headers, [_documento(1, producto_id, fecha_emision=fecha_emision)])
+
+    assert _estados(respuesta) == [(0, "error")]
+    assert respuesta["resultados"][0]["msg"] == mensaje
+    assert _numeros(app) == []
+
+
+def test_post_individual_acepta_montos_como_texto(app, cliente, headers, producto_id):
+    documento = _documento(1, producto_id, monto_neto="100", monto_iva="19", monto_total="119")
+    documento["detalleProductos"][0].update(cantidad="1", precio_venta_unitario="119", total="119")
+    respuesta = cliente.post("/api/documentos-venta", headers=headers, json=documento)
+
+    assert respuesta.status_code == 201, respuesta.get_data(as_text=True)
+    with app.app_context():
+        assert Documento_Venta.query.one().monto_total == 119
+        salida = Salida_Inventario.query.one()
+        assert (salida.cantidad, salida.venta_total) == (1, pytest.approx(100))
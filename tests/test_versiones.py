@@ -0,0 +1,74 @@
+from importacion import importar_productos
+
+
+def _get(cliente, headers, url, etag=None):
+    return cliente.get(url, headers=dict(headers, **({"If-None-Match": etag} if etag else {})))
+
+
+def test_get_condicional_responde_304_sin_cuerpo(cliente, headers, movimientos):
+    movimientos.producto()
+    primera = _get(cliente, headers, "/api/productos")
+    etag = primera.headers["ETag"]
+    segunda = _get(cliente, headers, "/api/productos", etag)
+
+    assert primera.status_code == 200
+    assert primera.headers["Cache-Control"] == "private, no-cache"
+    assert segunda.status_code == 304
+    assert segunda.get_data() == b""
+    assert segunda.headers["ETag"] == etag
+
+
+def test_otros_parametros_son_otra_representacion(cliente, headers, movimientos):
+    movimientos.producto()
+    etag = _get(cliente, headers, "/api/productos").headers["ETag"]
+    respuesta = _get(cliente, headers, "/api/productos?fields=id,sku", etag)
+
+    assert respuesta.status_code == 200
+    assert respuesta.headers["ETag"] != etag
+
+
+def test_escrituras_invalidan_el_etag(app, cliente, headers, movimientos):
+    producto_id = movimientos.producto()
+    etag = _get(cliente, headers, "/api/productos").headers["ETag"]
+
+    # POST de la API
+    respuesta = cliente.post("/api/productos", headers=headers, json={
+        "sku": "P2", "descripcion": "otro", "codigo_barra": "780P2", "unidad_entrega": "unidad",
+        "categoria_id": 1, "precio_venta_unitario": 990})
+    assert respuesta.status_code == 200
+    respuesta = _get(cliente, headers, "/api/productos", etag)
+    assert respuesta.status_code == 200
+    assert [producto["sku"] for producto in respuesta.get_json()] == ["P1", "P2"]
+    etag = respuesta.headers["ETag"]
+
+    # PUT masivo
+    respuesta = cliente.put("/api/productos", headers=headers, json=[{
+        "id": producto_id, "sku": "P1", "descripcion": "renombrado", "codigo_barra": "780P1",
+        "unidad_entrega": "unidad", "categoria_id": 1, "precio_venta_unitario": 990}])
+    assert respuesta.status_code == 200
+    respuesta = _get(cliente, headers, "/api/productos", etag)
+    assert respuesta.status_code == 200
+    etag = respuesta.headers["ETag"]
+
+    # Importación, que escribe con bulk_update_mappings sin pasar por Producto.update()
+    with app.app_context():
+        importar_productos([{"sku": "P3", "descripcion": "tercero", "codigo_barra": "780P3", "unidad_entrega": "unidad",
+                             "categoria_id": "1", "precio_venta_unitario": ""}])
+    assert _get(cliente, headers, "/api/productos", etag).status_code == 200
+
+
+def test_cada_catalogo_tiene_su_version(cliente, headers, movimientos):
+    movimientos.producto()
+    etag = _get(cliente, headers, "/api/categorias").headers["ETag"]
+    cliente.post("/api/productos", headers=headers, json={
+        "sku": "P2", "descripcion": "otro", "codigo_barra": "780P2", "unidad_entrega": "unidad",
+        "categoria_id": 1, "precio_venta_unitario": 990})
+
+    assert _get(cliente, headers, "/api/categorias", etag).status_code == 304
+
+
+def test_respuestas_con_error_no_llevan_etag(cliente, headers):
+    respuesta = _get(cliente, headers, "/api/productos")
+
+    assert respuesta.status_code == 400
+    assert "ETag" not in respuesta.headers
@@ -0,0 +1,227 @@
+import math
+from datetime import date, datetime
+
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+
+from models import db, Documento_Venta, Producto, Salida_Inventario, Stock_Diario
+
+LOTE_VENTAS = 100
+CAMPOS_OBLIGATORIOS = (
+    ("tipo_documento", "Tipo de Documento no puede estar vacío"),
+    ("numero_documento", "Numero de Documento no puede estar vacío"),
+    ("monto_neto", "Monto Neto no puede estar vacío"),
+    ("monto_iva", "Monto IVA no puede estar vacío"),
+    ("monto_total", "Monto Total no puede estar vacío"),
+    ("forma_pago", "Forma de Pago no puede estar vacío"),
+)
+CAMPOS_NUMERICOS = ("monto_neto", "monto_iva", "monto_total")
+CAMPOS_NUMERICOS_DETALLE = ("cantidad", "precio_venta_unitario", "total")
+DOCUMENTO_DUPLICADO = "Numero de Documento y Tipo de Documento ya se encuentra ingresado"
+
+
+def _es_numero(valor):
+    # Como siempre aceptó el POST de a uno: números o textos numéricos ("1190"), que armar_documento convierte
+    if isinstance(valor, bool):
+        return False
+    try:
+        return math.isfinite(float(valor))
+    except (TypeError, ValueError):
+        return False
+
+
+def _fecha_emision(datos_venta):
+    # Fecha opcional en que la caja emitió el documento (ISO 8601). Con zona horaria se pasa a la hora
+    # local del servidor, que es como se guardan las fechas. Lanza ValueError si no es válida.
+    fecha_emision = datos_venta.get("fecha_emision")
+    if fecha_emision is None:
+        return None
+    if not isinstance(fecha_emision, str):
+        raise ValueError
+    fecha_emision = datetime.fromisoformat(fecha_emision)
+    if fecha_emision.tzinfo is not None:
+        fecha_emision = fecha_emision.astimezone().replace(tzinfo=None)
+    return fecha_emision
+
+
+def validar_documento(data):
+    # Devuelve el mensaje del primer error o None si el documento se puede registrar
+    if not isinstance(data, dict) or not isinstance(data.get("datosVenta"), dict):
+        return "Falta datosVenta"
+    for campo, mensaje in CAMPOS_OBLIGATORIOS:
+        if not data["datosVenta"].get(campo):
+            return mensaje
+    try:
+        int(data["datosVenta"]["numero_documento"])
+    except (TypeError, ValueError):
+        return "Numero de Documento debe ser un número entero"
+    for campo in CAMPOS_NUMERICOS:
+        if not _es_numero(data["datosVenta"][campo]):
+            return f"{campo} debe ser un número"
+    try:
+        fecha_emision = _fecha_emision(data["datosVenta"])
+    except ValueError:
+        return "fecha_emision debe tener formato ISO (AAAA-MM-DDTHH:MM:SS)"
+    if fecha_emision is not None and fecha_emision > datetime.now():
+        return "fecha_emision no puede ser futura"
+    detalle = data.get("detalleProductos")
+    if not isinstance(detalle, list):
+        return "Falta detalleProductos"
+    for detalle_producto in detalle:
+        if not isinstance(detalle_producto, dict) or \
+                any(detalle_producto.get(campo) is None for campo in ("cantidad", "precio_venta_unitario", "total", "producto_id")):
+            return "Cada producto debe tener cantidad, precio_venta_unitario, total y producto_id"
+        for campo in CAMPOS_NUMERICOS_DETALLE:
+            if not _es_numero(detalle_producto[campo]):
+                return f"{campo} de cada producto debe ser un número"
+        try:
+            int(detalle_producto["producto_id"])
+        except (TypeError, ValueError):
+            return "producto_id de cada producto debe ser un número entero"
+    return None
+
+
+def productos_inexistentes(documentos):
+    # Ids de producto de los documentos (ya validados) que no están en la base, con una sola consulta
+    ids = {int(detalle_producto["producto_id"]) for data in documentos for detalle_producto in data["detalleProductos"]}
+    if not ids:
+        return set()
+    return ids - {id for (id,) in db.session.query(Producto.id).filter(Producto.id.in_(ids))}
+
+
+def error_productos(data, inexistentes):
+    # Mensaje para el primer producto del documento que no existe, o None
+    for detalle_producto in data["detalleProductos"]:
+        if int(detalle_producto["producto_id"]) in inexistentes:
+            return f"Producto id {detalle_producto['producto_id']} no existe"
+    return None
+
+
+def conflicto(data, error):
+    # Después del rollback de un IntegrityError: solo es duplicado si el documento quedó registrado
+    # por otra caja; cualquier otra llave (foránea, única de otra tabla) se informa tal cual
+    if documento_existe(data["datosVenta"]["tipo_documento"], data["datosVenta"]["numero_documento"]):
+        return "duplicado", DOCUMENTO_DUPLICADO
+    return "error", f"Documento de venta no guardado: {error.orig}"
+
+
+def armar_documento(data, usuario_id):
+    # Documento de venta con sus salidas de inventario, sin guardar. Costo, stock, ventas diarias y
+    # turno de caja se actualizan al hacer flush (ver los before_flush de models.py).
+    documento_venta = Documento_Venta()
+    documento_venta.tipo_documento = data['datosVenta']["tipo_documento"]
+    documento_venta.numero_documento = int(data['datosVenta']["numero_documento"])
+    documento_venta.monto_neto = float(data['datosVenta']["monto_neto"])
+    documento_venta.monto_iva = float(data['datosVenta']["monto_iva"])
+    documento_venta.monto_total = float(data['datosVenta']["monto_total"])
+    documento_venta.forma_pago = data['datosVenta']["forma_pago"]
+    documento_venta.usuario_id = usuario_id
+    # Venta que una caja sin conexión emitió antes: sin fecha_emision queda la hora del servidor
+    fecha_emision = _fecha_emision(data['datosVenta'])
+    if fecha_emision is not None:
+        documento_venta.fecha_emision = fecha_emision
+
+    for detalle_producto in data['detalleProductos']:
+        salida_inventario = Salida_Inventario()
+        salida_inventario.cantidad = float(detalle_producto['cantidad'])
+        salida_inventario.precio_venta_unitario = float(detalle_producto['precio_venta_unitario']) / 1.19  # ELIMINAR DECIMALES?
+        salida_inventario.venta_total = float(detalle_producto['total']) / 1.19  # ELIMINAR DECIMALES?
+        if fecha_emision is not None:
+            salida_inventario.fecha_registro = fecha_emision
+        salida_inventario.usuario_id = usuario_id
+        salida_inventario.producto_id = int(detalle_producto['producto_id'])
+        documento_venta.salidas_I.append(salida_inventario)
+    return documento_venta
+
+
+def corregir_fotos(documentos):
+    # Las ventas con fecha de días anteriores caen en fotos de Stock_Diario ya cerradas. Hace flush
+    # (la consulta de corregir) y no hace commit.
+    anteriores = [documento for documento in documentos
+                  if documento.fecha_emision is not None and documento.fecha_emision.date() < date.today()]
+    if anteriores:
+        productos = {salida.producto_id for documento in anteriores for salida in documento.salidas_I}
+        Stock_Diario.corregir(productos, min(documento.fecha_emision for documento in anteriores).date())
+
+
+def documento_existe(tipo_documento, numero_documento):
+    # Consulta sobre el índice único (tipo_documento, numero_documento), sin traer filas
+    return db.session.query(Documento_Venta.query.filter_by(
+        tipo_documento=tipo_documento, numero_documento=int(numero_documento)).exists()).scalar()
+
+
+def registrar_lote(documentos, usuario_id, lote=None):
+    # Registra varios documentos con una sola consulta de duplicados y un commit por cada 'lote'.
+    # Devuelve un resultado por documento, en el mismo orden.
+    lote = lote or current_app.config.get("LOTE_VENTAS", LOTE_VENTAS)
+    resultados = []
+    validos = []
+    vistos = set()
+    for indice, data in enumerate(documentos):
+        error = validar_documento(data)
+        resultado = {"indice": indice}
+        if not error:
+            llave = (data["datosVenta"]["tipo_documento"], int(data["datosVenta"]["numero_documento"]))
+            resultado.update(tipo_documento=llave[0], numero_documento=llave[1])
+            if llave in vistos:
+                error = "Documento repetido en el lote"
+            vistos.add(llave)
+        if error:
+            resultado.update(estado="error", msg=error)
+        else:
+            validos.append((resultado, data))
+        resultados.append(resultado)
+
+    existentes = set()
+    if validos:
+        tipos = {resultado["tipo_documento"] for resultado, data in validos}
+        numeros = {resultado["numero_documento"] for resultado, data in validos}
+        existentes = set(db.session.query(Documento_Venta.tipo_documento, Documento_Venta.numero_documento)
+                         .filter(Documento_Venta.tipo_documento.in_(tipos),
+                                 Documento_Venta.numero_documento.in_(numeros)))
+
+    inexistentes = productos_inexistentes([data for resultado, data in validos])
+    pendientes = []
+    for resultado, data in validos:
+        error = error_productos(data, inexistentes)
+        if error:
+            resultado.update(estado="error", msg=error)
+        elif (resultado["tipo_documento"], resultado["numero_documento"]) in existentes:
+            resultado.update(estado="duplicado", msg=DOCUMENTO_DUPLICADO)
+        else:
+            pendientes.append((resultado, data))
+
+    for inicio in range(0, len(pendientes), lote):
+        _guardar_lote(pendientes[inicio:inicio + lote], usuario_id)
+    return resultados
+
+
+def _guardar_lote(pendientes, usuario_id):
+    documentos = [armar_documento(data, usuario_id) for resultado, data in pendientes]
+    db.session.add_all(documentos)
+    try:
+        corregir_fotos(documentos)
+        db.session.commit()  # un flush: stock y costos se bloquean y actualizan una vez por producto
+    except IntegrityError:
+        # Otra caja registró alguno entre la consulta y el insert, o cambió algo que el lote usa:
+        # se reintentan de a uno para saber cuál falló
+        db.session.rollback()
+        for resultado, data in pendientes:
+            _guardar_uno(resultado, data, usuario_id)
+        return
+    for (resultado, data), documento in zip(pendientes, documentos):
+        resultado.update(estado="creado", id=documento.id)
+
+
+def _guardar_uno(resultado, data, usuario_id):
+    documento = armar_documento(data, usuario_id)
+    db.session.add(documento)
+    try:
+        corregir_fotos([documento])
+        db.session.commit()
+    except IntegrityError as error:
+        db.session.rollback()
+        estado, msg = conflicto(data, error)
+        resultado.update(estado=estado, msg=msg)
+        return
+    resultado.update(estado="creado", id=documento.id)
@@ -0,0 +1,63 @@
+import functools
+import hashlib
+import os
+import uuid
+
+from flask import current_app, make_response, request
+
+# Versión de los catálogos (productos, categorías, proveedores) para responder GET condicionales.
+# Se guarda en un archivo por recurso para que todos los workers del servidor vean el mismo valor
+# sin consultar la base de datos.
+
+
+def _ruta(recurso):
+    carpeta = current_app.config.get("VERSIONES_FOLDER") or os.path.join(current_app.instance_path, "versiones")
+    return carpeta, os.path.join(carpeta, recurso)
+
+
+def version(recurso):
+    carpeta, ruta = _ruta(recurso)
+    try:
+        with open(ruta) as archivo:
+            return archivo.read().strip() or incrementar_version(recurso)
+    except FileNotFoundError:
+        return incrementar_version(recurso)
+
+
+def incrementar_version(recurso):
+    carpeta, ruta = _ruta(recurso)
+    token = uuid.uuid4().hex
+    os.makedirs(carpeta, exist_ok=True)
+    temporal = f"{ruta}.{token}"
+    with open(temporal, "w") as archivo:
+        archivo.write(token)
+    os.replace(temporal, ruta)
+    return token
+
+
+def etag_recurso(recurso):
+    # La misma versión con otros parámetros (página, fields) es otra representación
+    consulta = hashlib.sha1(request.full_path.encode("utf-8")).hexdigest()[:16]
+    return f"{version(recurso)}-{consulta}"
+
+
+def etag_catalogo(recurso):
+    # Para GET: responde 304 si If-None-Match coincide, sin llamar a la vista ni tocar la base de datos
+    def decorador(vista):
+        @functools.wraps(vista)
+        def envoltura(*args, **kwargs):
+            if request.method != "GET":
+                return vista(*args, **kwargs)
+
+            etag = etag_recurso(recurso)
+            if etag in request.if_none_match:
+                respuesta = make_response("", 304)
+            else:
+                respuesta = make_response(vista(*args, **kwargs))
+                if respuesta.status_code != 200:
+                    return respuesta
+            respuesta.set_etag(etag)
+            respuesta.headers["Cache-Control"] = "private, no-cache"
+            return respuesta
+        return envoltura
+    return decorador
@@ -0,0 +1,5 @@
+# Punto de entrada WSGI para gunicorn (ver gunicorn.conf.py); runserver queda para desarrollo
+from app import create_app
+
+app = create_app()
+application = app